@@ -1,40 +1,42 @@
 # company_rag/agent.py
-from langchain_core.agents import create_tool_calling_agent, AgentExecutor
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.tools import tool
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-import chromadb
-from langchain_ollama import ChatOllama
-
+# langchain, chromadb and MiniLM load through tools.registry: in the background
+# while the prompt is up, or on the first question if that comes sooner.
+from tools.registry import REGISTRY
 from tools.sql_tool import run_sql
 
-# === LLM ===
-llm = ChatOllama(model="llama3.1:8b", temperature=0)
 
-# === Vector DB ===
-embed = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-client = chromadb.PersistentClient(path="chroma_db")
-coll = client.get_collection("company_schema")
+# === AGENT ===
+def build_executor():
+    from langchain_core.agents import create_tool_calling_agent, AgentExecutor
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain.tools import tool
+    from langchain_ollama import ChatOllama
+    from tools.llm_client import KEEP_ALIVE
+
+    # === LLM ===
+    llm = ChatOllama(model="llama3.1:8b", temperature=0, keep_alive=KEEP_ALIVE)  # No reload between questions
+
+    # === TOOLS ===
+    retriever = REGISTRY.get("retriever")  # NumPy + BM25, Chroma fallback
 
-# === TOOLS ===
-@tool
-def retrieve_schema(query: str) -> str:
-    """Search for relevant tables and sample data"""
-    results = coll.query(query_texts=[query], n_results=3)
-    docs = results["documents"][0]
-    return "\n\n---\n\n".join(docs)
+    @tool
+    def retrieve_schema(query: str) -> str:
+        """Search for relevant tables and sample data. Separate alternative phrasings with ' | '."""
+        rewrites = [q.strip() for q in query.split("|") if q.strip()]
+        if len(rewrites) > 1:
+            return retriever.retrieve_merged(rewrites, n_results=3)  # One batched embedding pass
+        return retriever.retrieve(query, n_results=3)
 
-@tool
-def execute_sql(sql: str) -> str:
-    """Run SQL on the database and return JSON result"""
-    return run_sql(sql)
+    @tool
+    def execute_sql(sql: str) -> str:
+        """Run SQL on the database and return JSON result"""
+        return run_sql(sql)
 
-tools = [retrieve_schema, execute_sql]
+    tools = [retrieve_schema, execute_sql]
 
-# === PROMPT ===
-prompt = ChatPromptTemplate.from_messages([
-    ("system", """You are an intelligent business analyst robot for the company database.
+    # === PROMPT ===
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", """You are an intelligent business analyst robot for the company database.
 You MUST:
 1. Use 'retrieve_schema' to find relevant tables
 2. Write valid SQL using exact column names
@@ -46,13 +48,16 @@ NEVER hallucinate tables or columns.
 If unsure, say "I need more data" and use tools.
 
 Answer in clear, professional English."""),
-    ("human", "{input}"),
-    ("placeholder", "{agent_scratchpad}"),
-])
+        ("human", "{input}"),
+        ("placeholder", "{agent_scratchpad}"),
+    ])
 
-# === AGENT ===
-agent = create_tool_calling_agent(llm, tools, prompt)
-executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+    agent = create_tool_calling_agent(llm, tools, prompt)
+    return AgentExecutor(agent=agent, tools=tools, verbose=True)
+
+
+REGISTRY.register("agent_executor", build_executor)
+REGISTRY.prewarm("agent_executor", "embedding_model")
 
 # === LIVE CHAT ===
 print("🤖 INTELLIGENT ROBOT ONLINE")
@@ -68,7 +73,7 @@ while True:
 
     print("\n🤖 Thinking...\n")
     try:
-        result = executor.invoke({"input": user_input})
+        result = REGISTRY.get("agent_executor").invoke({"input": user_input})
         print(f"💬 {result['output']}\n")
     except Exception as e:
         print(f"⚠️ Agent error: {e}\n")
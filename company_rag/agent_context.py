@@ -0,0 +1,184 @@
+# company_rag/agent_context.py
+# Compact, budgeted replacement for agent_2's raw `history +=` string.
+import csv
+import io
+import json
+import re
+
+SEPARATOR = "\n\n---\n\n"  # Between schema entries in retrieve_schema output
+TOKEN_BUDGET = 2000  # Max estimated tokens of tool history sent per LLM call
+MAX_CELL_CHARS = 40  # Sample values longer than this are cut
+CHARS_PER_TOKEN = 4  # Rough estimate; good enough for budgeting English + SQL
+
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+[\"`\[]?(\w+)", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def parse_schema_chunk(chunk: str) -> dict:
+    """Split an extract.py chunk into table, columns and sample rows."""
+    entry = {"table": None, "columns": [], "rows": [], "text": chunk.strip()}
+    lines = chunk.strip().split("\n")
+    in_rows = False
+    for line in lines:
+        if line.startswith("TABLE:"):
+            entry["table"] = line[len("TABLE:"):].strip()
+        elif line.startswith("COLUMNS:"):
+            entry["columns"] = [c.strip() for c in line[len("COLUMNS:"):].split(",")]
+        elif line.startswith("SAMPLE ROWS:"):
+            in_rows = True
+        elif in_rows and line.strip():
+            entry["rows"].append(line.split(" | "))
+    return entry
+
+
+def _cell(value) -> str:
+    if isinstance(value, float):
+        return format(value, ".10g")  # 523.0600000000003 -> 523.06
+    text = "" if value is None else str(value)
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 1] + "…"
+
+
+def _csv(columns, rows) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows([[_cell(v) for v in row] for row in rows])
+    return buf.getvalue().rstrip("\n")
+
+
+class AgentContext:
+    """Tool results for one turn, kept structured and rendered compactly.
+
+    - SQL results become CSV rows instead of indent=2 JSON with repeated keys.
+    - A schema table is shown in full once; later hits only point back to it,
+      and tables already used in successful SQL are shown as columns only.
+    - Entries are rendered once, when added, so the history only ever grows
+      at the end (which keeps the prompt prefix stable between iterations).
+    - When the rendered history exceeds `token_budget`, the oldest entries are
+      dropped and replaced by a one-line note. A "(shown above)" pointer whose
+      full table was dropped is expanded again at its first kept occurrence.
+    """
+
+    def __init__(self, token_budget: int = TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.entries = []  # {"tool", "args", "data", "text"}
+        self.shown_tables = set()
+        self.table_text = {}  # table -> its full rendering, for re-expanding pointers
+        self.sql_tables = set()
+        self.raw_chars = 0  # What the old raw history would have been
+        self.metrics = []
+
+    # === ADD ===
+    def add(self, tool: str, args: str, result: str) -> dict:
+        self.raw_chars += len(f"\n\nTool {tool} returned:\n{result}\n")
+        shows, refs = set(), set()
+        if tool == "retrieve_schema":
+            data = [parse_schema_chunk(c) for c in result.split(SEPARATOR) if c.strip()]
+            body = self._render_schema(data, shows, refs)
+        elif tool == "execute_sql" and not result.startswith("SQL ERROR"):
+            data = self._parse_sql_result(result)
+            body = self._render_sql(data) if data else result
+            self.sql_tables.update(t.lower() for t in _TABLE_RE.findall(args))
+        else:
+            data, body = None, result
+        entry = {"tool": tool, "args": args, "data": data, "shows": shows, "refs": refs,
+                 "text": f"\n\nTool {tool} returned:\n{body}\n"}
+        self.entries.append(entry)
+        return entry
+
+    def _render_schema(self, chunks, shows: set, refs: set) -> str:
+        parts = []
+        for c in chunks:
+            table = c["table"]
+            if table is None:
+                parts.append(c["text"])  # e.g. the JOIN PATHS section
+                continue
+            if table in self.shown_tables:
+                parts.append(f"TABLE: {table} (shown above)")
+                refs.add(table)
+                continue
+            self.shown_tables.add(table)
+            shows.add(table)
+            cols = ", ".join(c["columns"])
+            if table.lower() in self.sql_tables or not c["rows"]:
+                self.table_text[table] = f"TABLE: {table}\nCOLUMNS: {cols}"
+            else:
+                rows = "\n".join(" | ".join(_cell(v) for v in row) for row in c["rows"])
+                self.table_text[table] = f"TABLE: {table}\nCOLUMNS: {cols}\nSAMPLE ROWS:\n{rows}"
+            parts.append(self.table_text[table])
+        return "\n\n".join(parts)
+
+    @staticmethod
+    def _parse_sql_result(result: str):
+        try:
+            payload = json.loads(result)
+        except ValueError:
+            return None
+        if "columns" in payload:  # Already columnar
+            return {"columns": payload["columns"], "rows": payload["rows"],
+                    "count": payload.get("count", len(payload["rows"])),
+                    "total": payload.get("total"), "truncated": payload.get("truncated", False)}
+        rows = payload.get("data", [])
+        columns = list(rows[0].keys()) if rows else []
+        return {"columns": columns, "rows": [[r.get(c) for c in columns] for r in rows],
+                "count": payload.get("count", len(rows)), "total": payload.get("total"),
+                "truncated": payload.get("truncated", False)}
+
+    @staticmethod
+    def _render_sql(data) -> str:
+        if data["truncated"] and data["total"] is not None:
+            shown = f"{data['count']} of {data['total']} rows"
+        else:
+            shown = f"{data['count']} rows" + (", more rows exist" if data["truncated"] else "")
+        if not data["rows"]:
+            return shown
+        return f"{shown}:\n{_csv(data['columns'], data['rows'])}"
+
+    # === RENDER ===
+    def render(self) -> str:
+        """History string within the token budget (newest entries win)."""
+        kept, used = [], 0
+        for entry in reversed(self.entries):
+            cost = estimate_tokens(entry["text"])
+            if kept and used + cost > self.token_budget:
+                break
+            kept.append(entry)
+            used += cost
+        kept.reverse()
+        while True:
+            texts = self._expand(self.entries[:len(self.entries) - len(kept)], kept)
+            # Re-expanded pointers cost tokens too; drop more history until it fits
+            if len(kept) == 1 or sum(map(estimate_tokens, texts)) <= self.token_budget:
+                break
+            kept.pop(0)
+        dropped = len(self.entries) - len(kept)
+        prefix = f"\n\n[{dropped} earlier tool result(s) omitted to fit the context budget]\n" if dropped else ""
+        return prefix + "".join(texts)
+
+    def _expand(self, dropped, kept) -> list:
+        """Texts of `kept`, with pointers to tables shown only in `dropped` expanded once."""
+        missing = set().union(*(e["shows"] for e in dropped))
+        texts = []
+        for entry in kept:
+            text = entry["text"]
+            for table in sorted(entry["refs"] & missing):
+                text = text.replace(f"TABLE: {table} (shown above)", self.table_text[table], 1)
+                missing.discard(table)
+            texts.append(text)
+        return texts
+
+    def record(self, iteration: int, question: str, system_prompt: str = "") -> dict:
+        """Prompt-size metrics for the LLM call about to be made."""
+        history = self.render()
+        metric = {
+            "iteration": iteration,
+            "history_tokens": estimate_tokens(history),
+            "prompt_tokens": estimate_tokens(system_prompt + question + history),
+            "raw_history_tokens": (self.raw_chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN,
+            "entries": len(self.entries),
+        }
+        self.metrics.append(metric)
+        return metric
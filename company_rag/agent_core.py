@@ -0,0 +1,613 @@
+# company_rag/agent_core.py
+# agent_2's TOOL:/ARGS: loop as a coroutine, shared by the console REPL
+# (agent_2.py) and the multi-session server (server.py).
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from agent_context import AgentContext, TOKEN_BUDGET, estimate_tokens
+from tools.registry import REGISTRY
+from tools.speculative import Speculator, schema_tables
+from tools.sql_tool import DB_PATH, MAX_ROWS, get_connection, run_sql, data_stamp
+from tools.tracing import TRACER, span
+
+MODEL = "qwen2.5-coder:7b"
+MAX_ITERATIONS = 5
+MAX_PARALLEL_TOOLS = 4  # Tool blocks taken from one response and run together
+RETRIEVAL_BATCH = 32  # Most retrieve_schema queries embedded and searched in one pass
+
+# Per-backend concurrency limits (overridable from the environment)
+LLM_CONCURRENCY = int(os.environ.get("AGENT_LLM_CONCURRENCY", 4))
+SQL_CONCURRENCY = int(os.environ.get("AGENT_SQL_CONCURRENCY", 8))
+EMBED_CONCURRENCY = int(os.environ.get("AGENT_EMBED_CONCURRENCY", 2))
+RESULT_FORMAT = "columnar"  # SQL results as AgentContext reads them (it renders them as CSV)
+
+SYSTEM_PROMPT = """You are an expert SQL analyst with access to a Chinook database.
+
+Available tools:
+1. retrieve_schema - Search for table schemas and sample data
+2. execute_sql - Execute SQL queries and get real results
+
+TOOL CALLING FORMAT (you MUST use this exact format):
+TOOL: tool_name
+ARGS: your_argument_here
+
+Independent calls (e.g. schema for two subject areas) can go in one response,
+one TOOL/ARGS block each, separated by a blank line; they run together.
+
+Example 1 - Retrieve schema:
+TOOL: retrieve_schema
+ARGS: sales revenue invoice
+
+Example 2 - Execute SQL:
+TOOL: execute_sql
+ARGS: SELECT strftime('%Y', InvoiceDate) as Year, SUM(Total) as Revenue FROM Invoice GROUP BY Year ORDER BY Year DESC LIMIT 5
+
+PROCESS (follow strictly):
+1. First, call retrieve_schema to find relevant tables
+2. After seeing schema results, write ONE valid SQLite query
+3. Call execute_sql with that exact query
+4. After getting real data, provide analysis with 3 numbered suggestions
+
+IMPORTANT RULES:
+- Use strftime('%Y', column_name) for extracting years from dates
+- NEVER give analysis without executing SQL first
+- Database has data up to 2013, NOT 2024
+- Always wait for tool results before proceeding
+- Each tool call must be on separate lines
+
+Tables: Invoice, InvoiceLine, Customer, Track, Album, Genre, Artist, Employee, Playlist, PlaylistTrack, MediaType
+
+"""
+
+
+# === LLM ===
+def build_chain(model: str = MODEL):
+    """system / user / assistant-history messages to Ollama, as agent_2 has always sent them.
+
+    tools.llm_client keeps SYSTEM_PROMPT as a byte-identical prefix (Ollama
+    reuses its KV cache for it across iterations and turns), sends keep_alive
+    so the model stays loaded, and serves repeated temperature-0 prompts
+    from its on-disk response cache.
+    """
+    from tools.llm_client import LLMClient, OllamaChain
+    return OllamaChain(LLMClient(model), SYSTEM_PROMPT)
+
+
+def _warm_llm(model: str):
+    """Load the model and prefill SYSTEM_PROMPT, so the first question only evaluates itself."""
+    return REGISTRY.get(f"chain:{model}").client.warm(SYSTEM_PROMPT)
+
+
+# === SETUP ===
+def open_retriever():
+    return REGISTRY.get("retriever")
+
+
+def _answer_cache():
+    from tools.answer_cache import EntityExtractor, SemanticAnswerCache
+    return SemanticAnswerCache(REGISTRY.get("embeddings"), stamp_fn=data_stamp,
+                               entities_fn=EntityExtractor(get_connection()))
+
+
+REGISTRY.register("answer_cache", _answer_cache)
+
+
+def resources(model: str = MODEL):
+    """Registry names an agent for `model` uses, in the order worth prewarming them."""
+    name = f"chain:{model}"
+    if name not in REGISTRY:
+        REGISTRY.register(name, lambda: build_chain(model))
+        REGISTRY.register(f"llm_warm:{model}", lambda: _warm_llm(model))
+    # Model load last: it can take seconds and the others don't depend on it
+    return [name, "retriever", "answer_cache", "embedding_model", f"llm_warm:{model}"]
+
+
+def build_agent(model: str = MODEL, prewarm: bool = True, **limits) -> "Agent":
+    """Agent whose chain, retriever and answer cache load on first use.
+
+    Construction is instant; with `prewarm` the Ollama client, Chroma
+    collection and MiniLM load on a background thread while the caller
+    shows its prompt, and then the model is loaded with the system prompt
+    prefilled.
+    """
+    names = resources(model)
+    if prewarm:
+        REGISTRY.prewarm(*names)
+    chain, retriever, answer_cache = (REGISTRY.lazy(n) for n in names[:3])
+    return Agent(chain, retriever, answer_cache, **limits)
+
+
+# === TOOL PARSING ===
+def parse_tool_calls(response: str, max_calls: int = MAX_PARALLEL_TOOLS) -> list:
+    """Every (tool_name, args) block in a complete response, by the same rules as streaming."""
+    parser = ToolStreamParser(max_calls)
+    events = parser.feed(response) + parser.close()
+    return [e[1:] for e in events if e[0] == "tool"]
+
+
+class ToolStreamParser:
+    """Incremental TOOL:/ARGS: parser for streamed LLM output.
+
+    feed() returns events as soon as they can be decided:
+    ("text", s) for output that cannot be part of a tool block, forwarded
+    while its line is still being generated, and ("tool", name, args) as
+    each block closes. A block closes at a blank line outside a ``` fence,
+    at the next TOOL: line, or at end of stream (close()). A TOOL: line
+    whose next non-blank line is not ARGS: was prose after all, and is
+    forwarded as text along with that line.
+
+    Up to `max_calls` consecutive blocks are read. Once a block has closed,
+    anything other than blank lines and another TOOL: line ends the
+    response (`done`), since the model is then writing past its tool calls.
+    """
+
+    MARKERS = ("TOOL:", "ARGS:")
+
+    def __init__(self, max_calls: int = 1):
+        self.max_calls = max_calls
+        self.calls = 0
+        self.parts = []
+        self.done = False
+        self._line = ""
+        self._line_is_text = False
+        self._in_tool = False
+        self._capturing = False
+        self._tool_name = None
+        self._args_lines = []
+        self._fenced = False  # Inside a ``` fence in the args, where blank lines do not close the block
+        self._held = ""  # TOOL: header (and blank lines) waiting for its ARGS:
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def _could_be_marker(self, line: str) -> bool:
+        return any(m.startswith(line) or line.startswith(m) for m in self.MARKERS)
+
+    def _block(self):
+        event = ("tool", self._tool_name, " ".join(self._args_lines))
+        self.calls += 1
+        self.done = self.calls >= self.max_calls
+        self._in_tool = self._capturing = self._fenced = False
+        self._tool_name, self._args_lines = None, []
+        self._held = ""
+        return event
+
+    def _release(self) -> str:
+        """Drop a TOOL: header that got no ARGS: and return its text, which was prose after all."""
+        held = self._held
+        self._in_tool, self._tool_name, self._held = False, None, ""
+        return held
+
+    def _end_line(self, out):
+        line, forwarded = self._line, self._line_is_text
+        self._line, self._line_is_text = "", False
+        if line.startswith("TOOL:"):
+            if self._capturing:
+                out.append(self._block())
+                if self.done:
+                    return
+            self._tool_name = line.replace("TOOL:", "").strip()
+            self._in_tool = True
+            self._held = line + "\n"
+        elif line.startswith("ARGS:") and self._in_tool:
+            self._args_lines.append(line.replace("ARGS:", "").strip())
+            self._capturing = True
+            self._fenced = line.count("```") % 2 == 1
+        elif self._capturing and (line.strip() or self._fenced):
+            if line.strip():
+                self._args_lines.append(line.strip())
+                self._fenced ^= line.count("```") % 2 == 1
+        elif self._capturing:
+            out.append(self._block())
+        elif self._in_tool and not line.strip():
+            self._held += "\n"
+        elif self._in_tool:
+            held = self._release()
+            if self.calls:
+                self.done = True
+            else:
+                out.append(("text", held + line + "\n"))
+        elif self.calls:
+            if line.strip():
+                self.done = True  # Prose after the tool calls
+        else:
+            out.append(("text", ("" if forwarded else line) + "\n"))
+
+    def feed(self, chunk: str) -> list:
+        out = []
+        if self.done:
+            return out
+        self.parts.append(chunk)
+        pieces = chunk.split("\n")
+        for i, piece in enumerate(pieces):
+            if self._line_is_text:
+                if piece:
+                    out.append(("text", piece))
+                self._line += piece
+            else:
+                self._line += piece
+                if not self._capturing and self._line and not self._could_be_marker(self._line):
+                    held = self._release()
+                    if self.calls:
+                        self.done = True  # Prose after the tool calls; no need to see the rest
+                        break
+                    # Plain prose: forward what was held back and stream the rest
+                    out.append(("text", held + self._line))
+                    self._line_is_text = True
+            if i < len(pieces) - 1:
+                self._end_line(out)
+                if self.done:
+                    break
+        return out
+
+    def close(self) -> list:
+        """End of stream: settle the last line and any open block."""
+        out = []
+        if self.done:
+            return out
+        if self._line:
+            line, forwarded = self._line, self._line_is_text
+            self._end_line(out)
+            if out and out[-1] == ("text", "\n") and forwarded:
+                out.pop()  # No trailing newline was generated
+            elif out and out[-1][0] == "text" and not forwarded:
+                out[-1] = ("text", out[-1][1][:-1])
+        if not self.done and self._capturing and self._args_lines:
+            out.append(self._block())
+        elif not self.done and self._in_tool and not self._capturing:
+            held = self._release()
+            if not self.calls:
+                out.append(("text", held if self.text.endswith("\n") else held[:-1]))
+        return out
+
+
+@dataclass
+class TurnResult:
+    question: str
+    answer: str = None
+    sql: str = None  # Last successful execute_sql of the turn
+    data: str = None
+    iterations: int = 0
+    cached: bool = False
+    elapsed: float = 0.0
+    ttft: float = None  # Seconds to the first streamed token of the turn
+    tool_timings: list = field(default_factory=list)
+    context_metrics: list = field(default_factory=list)  # Prompt size per iteration
+
+
+def _ignore(kind, **payload):
+    pass
+
+
+def _cancel(calls):
+    for call in calls:
+        if call["task"] is not None and not call["task"].done():
+            call["task"].cancel()
+
+
+class RetrievalBatcher:
+    """Coalesces concurrent retrieve_schema calls into one batched retrieve_many().
+
+    Calls arriving in the same event-loop tick, or while the previous batch
+    waits for an embed slot, share one embedding pass and one top-k.
+    Duplicate queries in a batch are retrieved once.
+    """
+
+    def __init__(self, agent, max_batch: int = RETRIEVAL_BATCH):
+        self.agent = agent
+        self.max_batch = max_batch
+        self._pending = []  # (query, future)
+        self._scheduled = False
+        self._tasks = set()  # Flushes in flight; the loop only keeps weak references to tasks
+        self.batches = 0
+        self.queries = 0
+
+    async def retrieve(self, query: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((query, future))
+        if not self._scheduled:
+            self._scheduled = True
+            self._schedule()
+        return await future
+
+    def _schedule(self):
+        # The task's first step runs next tick, so calls made in this tick join its batch
+        task = asyncio.ensure_future(self._flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self):
+        agent = self.agent
+        batch = []
+        try:
+            async with agent.embed_limit:
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                self._scheduled = bool(self._pending)
+                if self._pending:
+                    self._schedule()
+                if not batch:
+                    return
+                unique = list(dict.fromkeys(q for q, _ in batch))
+                self.batches += 1
+                self.queries += len(batch)
+                ctx = contextvars.copy_context()
+                # agent.retriever may be a LazyResource: resolve it on the worker, not the loop
+                results = await asyncio.get_running_loop().run_in_executor(
+                    agent.embed_pool, ctx.run, lambda: agent.retriever.retrieve_many(unique))
+            found = dict(zip(unique, results))
+            for query, future in batch:
+                if not future.done():
+                    future.set_result(found[query])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Cancelled by close(): nobody may be left waiting on this batch
+            for _, future in batch:
+                future.cancel()
+
+    def close(self):
+        """Cancel queued and in-flight batches (from the loop thread, or once it has stopped)."""
+        for task in list(self._tasks):
+            task.cancel()
+        for _, future in self._pending:
+            future.cancel()
+        self._pending, self._scheduled = [], False
+
+
+# === AGENT ===
+class Agent:
+    """Runs agent_2's tool loop for one question at a time per caller.
+
+    A single Agent is shared by every session: LLM calls go through the
+    chain's async API under an LLM semaphore, while SQL and embedding work
+    (retrieval, answer-cache lookups) run on bounded thread pools under their
+    own semaphores. Progress is reported through `on_event(kind, **payload)`.
+    """
+
+    def __init__(self, chain, retriever, answer_cache=None, max_iterations: int = MAX_ITERATIONS,
+                 stream: bool = True, token_budget: int = TOKEN_BUDGET, llm_concurrency: int = LLM_CONCURRENCY, sql_concurrency: int = SQL_CONCURRENCY,
+                 embed_concurrency: int = EMBED_CONCURRENCY, max_parallel_tools: int = MAX_PARALLEL_TOOLS,
+                 speculate: bool = True, max_rows: int = MAX_ROWS, result_format: str = RESULT_FORMAT):
+        self.chain = chain
+        self.retriever = retriever
+        self.answer_cache = answer_cache
+        self.max_iterations = max_iterations
+        self.max_parallel_tools = max_parallel_tools
+        self.stream = stream
+        self.token_budget = token_budget
+        self.max_rows = max_rows
+        self.result_format = result_format
+        self.llm_limit = asyncio.Semaphore(llm_concurrency)
+        self.sql_limit = asyncio.Semaphore(sql_concurrency)
+        self.embed_limit = asyncio.Semaphore(embed_concurrency)
+        self.sql_pool = ThreadPoolExecutor(max_workers=sql_concurrency, thread_name_prefix="sql")
+        self.embed_pool = ThreadPoolExecutor(max_workers=embed_concurrency, thread_name_prefix="embed")
+        self.retrieval = RetrievalBatcher(self)
+        # Runs likely SQL for retrieved tables while the LLM writes its own, through the
+        # same run_sql settings, so a speculative result is exactly what execute_sql returns
+        self.speculator = Speculator(self._run_sql, DB_PATH, stamp_fn=data_stamp) if speculate else None
+
+    async def _offload(self, limit, pool, fn, *args):
+        async with limit:
+            return await self._in_pool(pool, fn, *args)
+
+    @staticmethod
+    async def _in_pool(pool, fn, *args):
+        # Carry the current span into the worker thread so tool spans nest under the turn
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(pool, ctx.run, fn, *args)
+
+    def _run_sql(self, sql: str) -> str:
+        return run_sql(sql, fmt=self.result_format, max_rows=self.max_rows)
+
+    # === TOOLS ===
+    async def retrieve_schema(self, query: str) -> str:
+        """Schema for `query`; "a | b" retrieves both phrasings and merges them."""
+        rewrites = [q.strip() for q in query.split("|") if q.strip()]
+        if len(rewrites) > 1:
+            return await self._offload(self.embed_limit, self.embed_pool,
+                                       lambda: self.retriever.retrieve_merged(rewrites))
+        return await self.retrieval.retrieve(query)
+
+    async def execute_sql(self, sql: str) -> str:
+        # A speculative hit counts against sql_limit like any other statement
+        async with self.sql_limit:
+            future = self.speculator.pending(sql) if self.speculator is not None else None
+            if future is not None:
+                with span("speculative_hit"):
+                    return await asyncio.wrap_future(future)
+            return await self._in_pool(self.sql_pool, self._run_sql, sql)
+
+    async def call_llm(self, question: str, history: str) -> str:
+        async with self.llm_limit:
+            return await self.chain.ainvoke({"input": question, "history": history})
+
+    async def stream_llm(self, question: str, history: str, on_event=_ignore):
+        """Stream one completion, forwarding prose as "token" events.
+
+        Returns (response_text, calls, ttft), where calls are the in-flight
+        tool calls from _dispatch. Each TOOL:/ARGS: block is dispatched as
+        soon as it closes, so tools run while the model is still writing
+        the next block. Generation is cancelled once the parser is done
+        (max_parallel_tools blocks, or prose after the blocks).
+        """
+        parser = ToolStreamParser(self.max_parallel_tools)
+        calls = []
+        ttft = None
+        parse_time = 0.0
+        start = time.perf_counter()
+
+        def handle(events):
+            for event in events:
+                if event[0] == "text":
+                    on_event("token", text=event[1])
+                else:
+                    calls.append(self._dispatch(event[1], event[2], on_event))
+
+        try:
+            async with self.llm_limit:
+                stream = self.chain.astream({"input": question, "history": history})
+                try:
+                    async for chunk in stream:
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                        parse_start = time.perf_counter()
+                        events = parser.feed(chunk)
+                        parse_time += time.perf_counter() - parse_start
+                        handle(events)
+                        if parser.done:
+                            break
+                finally:
+                    await stream.aclose()  # Drops the HTTP stream; Ollama stops generating
+        except BaseException:
+            _cancel(calls)  # Nobody will collect tools dispatched from a failed stream
+            raise
+        handle(parser.close())
+        TRACER.record("tool_parse", parse_time, streamed=True, calls=len(calls))
+        return parser.text, calls, ttft
+
+    def _dispatch(self, tool_name: str, args: str, on_event=_ignore) -> dict:
+        """Start one tool call now; the task resolves to (result, finished_at).
+
+        A block without a tool name or arguments gets no task.
+        """
+        async def run():
+            result = await self.call_tool(tool_name, args)
+            return result, time.perf_counter()
+
+        call = {"tool": tool_name, "args": args, "dispatched": time.perf_counter(), "task": None}
+        if tool_name and args:
+            on_event("tool_call", tool=tool_name, args=args)
+            call["task"] = asyncio.ensure_future(run())
+        return call
+
+    async def call_tool(self, tool_name: str, args: str) -> str:
+        # Includes waiting for a pool slot, unlike the schema_retrieval/sql spans inside
+        with span("tool_call", tool=tool_name) as sp:
+            if tool_name == "retrieve_schema":
+                result = await self.retrieve_schema(args)
+                if self.speculator is not None:
+                    self.speculator.speculate(schema_tables(result))
+            elif tool_name == "execute_sql":
+                result = await self.execute_sql(args)
+            else:
+                result = f"Unknown tool: {tool_name}"
+            sp.set(result_chars=len(result))
+            return result
+
+    # === LOOP ===
+    async def run_turn(self, question: str, on_event=_ignore) -> TurnResult:
+        """Answer one question; the whole turn is one trace in tools.tracing.TRACER."""
+        with TRACER.trace("turn") as sp:
+            turn = await self._run_turn(question, on_event)
+            sp.set(iterations=turn.iterations, cached=turn.cached, answered=turn.answer is not None,
+                   tool_calls=len(turn.tool_timings))
+            return turn
+
+    async def _run_turn(self, question: str, on_event) -> TurnResult:
+        turn = TurnResult(question)
+        start = time.perf_counter()
+
+        stamp = None
+        if self.answer_cache is not None:
+            # Near-identical question answered earlier against the same data?
+            with span("answer_cache") as sp:
+                try:
+                    # Attribute access on a LazyResource may build it; keep that off the loop thread
+                    stamp = await self._offload(self.embed_limit, self.embed_pool,
+                                                lambda: self.answer_cache.current_stamp())
+                    hit = await self._offload(self.embed_limit, self.embed_pool,
+                                              lambda: self.answer_cache.lookup(question))
+                except Exception as e:
+                    # Model load, registry build or SQLite failure: answer without the cache
+                    sp.set(error=type(e).__name__)
+                    stamp = hit = None
+                sp.set(cache_hit=hit is not None)
+            if hit:
+                cached, similarity = hit
+                turn.answer, turn.sql, turn.data, turn.cached = cached.answer, cached.sql, cached.data, True
+                turn.elapsed = time.perf_counter() - start
+                on_event("cache_hit", entry=cached, similarity=similarity)
+                on_event("answer", text=cached.answer)
+                return turn
+
+        context = AgentContext(self.token_budget)
+        turn.context_metrics = context.metrics
+        for iteration in range(self.max_iterations):
+            turn.iterations = iteration + 1
+            on_event("iteration", n=iteration + 1, total=self.max_iterations)
+            history = context.render()
+            metric = context.record(iteration + 1, question, SYSTEM_PROMPT)
+            on_event("context", **metric)
+            try:
+                llm_start = time.perf_counter()
+                with span("llm_call", streamed=self.stream, prompt_tokens=metric["prompt_tokens"]) as sp:
+                    if self.stream:
+                        response, calls, ttft = await self.stream_llm(question, history, on_event)
+                        if turn.ttft is None:
+                            turn.ttft = ttft
+                        sp.set(ttft_ms=round(ttft * 1e3, 3) if ttft is not None else None)
+                    else:
+                        response = await self.call_llm(question, history)
+                        with span("tool_parse", streamed=False):
+                            parsed = parse_tool_calls(response, self.max_parallel_tools)
+                        calls = [self._dispatch(name, args, on_event) for name, args in parsed]
+                    sp.set(completion_tokens=estimate_tokens(response), tool_calls=len(calls))
+                if not calls:
+                    # Final answer
+                    turn.answer = response
+                    on_event("answer", text=response, streamed=self.stream)
+                    break
+
+                calls = [c for c in calls if c["task"] is not None]
+                if not calls:
+                    break
+                # Blocks from one response cannot see each other's results, so they are
+                # independent: they already run concurrently; collect them in order
+                with span("tool_batch", calls=len(calls)):
+                    try:
+                        finished = await asyncio.gather(*(c["task"] for c in calls))
+                    finally:
+                        _cancel(calls)  # The rest of the batch, if one call failed
+                for call, (result, done) in zip(calls, finished):
+                    tool_name, args = call["tool"], call["args"]
+                    if tool_name == "execute_sql" and not result.startswith("SQL ERROR"):
+                        turn.sql, turn.data = args, result
+                        if self.speculator is not None:
+                            self.speculator.record(args)
+                    # Measured from the start of the LLM call that asked for the tool
+                    timing = {"tool": tool_name, "to_dispatch": round(call["dispatched"] - llm_start, 4),
+                              "to_result": round(done - llm_start, 4), "batch": len(calls)}
+                    turn.tool_timings.append(timing)
+                    on_event("tool_result", tool=tool_name, result=result, timing=timing)
+                    context.add(tool_name, args, result)
+            except Exception as e:
+                on_event("error", message=str(e))
+                break
+        else:
+            on_event("max_iterations", total=self.max_iterations)
+
+        turn.elapsed = time.perf_counter() - start
+        # Only answers grounded in executed SQL are worth reusing
+        if self.answer_cache is not None and turn.answer and turn.sql:
+            with span("answer_cache_store") as sp:
+                try:
+                    await self._offload(self.embed_limit, self.embed_pool, lambda: self.answer_cache.store(
+                        question, turn.answer, sql=turn.sql, data=turn.data, latency=turn.elapsed, stamp=stamp))
+                except Exception as e:
+                    sp.set(error=type(e).__name__)  # The answer stands; it just isn't cached
+        return turn
+
+    def close(self):
+        self.retrieval.close()
+        if self.speculator is not None:
+            self.speculator.close()
+        self.sql_pool.shutdown(wait=False)
+        self.embed_pool.shutdown(wait=False)
@@ -0,0 +1,113 @@
+# company_rag/bench_llm.py
+# Prefill saved by the prefix-stable prompt layout and the response cache in
+# tools/llm_client.py, measured against stub_ollama.py (fully offline: the
+# stub simulates Ollama's prefix cache, prefill/decode cost and model load).
+# Retrieval is BM25 over chunks.jsonl, so no embedding model is needed.
+#   python bench_llm.py [--questions N] [--prefill-ms 0.5] [--decode-ms 2] [--out bench_llm.json]
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from agent_context import SEPARATOR
+from agent_core import SYSTEM_PROMPT, Agent
+from stub_ollama import serve
+from tools.lexical_index import INDEX_PATH, load_index
+from tools.llm_client import LLMClient, OllamaChain, ResponseCache
+from tools.tracing import TRACER
+
+EVAL_PATH = "retrieval_eval.json"
+CHUNKS_PATH = "chunks.jsonl"
+OUT_PATH = "bench_llm.json"
+MODEL = "stub-model"
+
+
+class ChunkRetriever:
+    """retrieve_many() from the BM25 index and chunks.jsonl (no Chroma, no MiniLM)."""
+
+    def __init__(self, k: int = 3, chunks_path: str = CHUNKS_PATH, index_path: str = INDEX_PATH):
+        self.k = k
+        self.lexical = load_index(index_path)
+        with open(chunks_path) as f:
+            self.docs = {c["table"]: c["text"] for c in map(json.loads, f)}
+
+    def retrieve_many(self, queries):
+        return [SEPARATOR.join(self.docs[t] for t, _ in self.lexical.search(q, self.k) if t in self.docs)
+                for q in queries]
+
+
+class UnstableChain(OllamaChain):
+    """The layout this replaces at its worst: something per-call at the top of the system block."""
+
+    def messages(self, inputs: dict) -> list:
+        messages = super().messages(inputs)
+        messages[0] = {"role": "system", "content": f"Request time: {time.time():.6f}\n{self.system}"}
+        return messages
+
+
+def run(url, layout, questions, cache) -> dict:
+    client = LLMClient(MODEL, host=url, cache=cache, use_cache=cache is not None)
+    chain = (UnstableChain if layout == "unstable" else OllamaChain)(client, SYSTEM_PROMPT)
+    agent = Agent(chain, ChunkRetriever(), speculate=False)
+
+    async def turns():
+        for q in questions:
+            await agent.run_turn(q)
+
+    TRACER.reset()
+    start = time.perf_counter()
+    try:
+        asyncio.run(turns())
+    finally:
+        agent.close()
+    elapsed = time.perf_counter() - start
+    stats = client.stats()
+    ollama = TRACER.summary().get("ollama", {})
+    return {"turns": len(questions), "elapsed_s": round(elapsed, 3),
+            "ms_per_turn": round(elapsed / len(questions) * 1e3, 2),
+            "llm_p50_ms": ollama.get("p50_ms"), "llm_p95_ms": ollama.get("p95_ms"), **stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prefix reuse and the LLM response cache")
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--prefill-ms", type=float, default=0.5)
+    parser.add_argument("--decode-ms", type=float, default=2.0)
+    parser.add_argument("--load-s", type=float, default=0.5)
+    parser.add_argument("--out", default=OUT_PATH)
+    args = parser.parse_args()
+
+    with open(EVAL_PATH) as f:
+        questions = [c["question"] for c in json.load(f)][:args.questions]
+
+    report = {"meta": {"questions": len(questions), "prefill_ms_per_token": args.prefill_ms,
+                       "decode_ms_per_token": args.decode_ms, "load_s": args.load_s}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, layout, cached in (("unstable_prefix", "unstable", False), ("stable_prefix", "stable", False),
+                                     ("response_cache_cold", "stable", True), ("response_cache_warm", "stable", True)):
+            # Fresh stub per run, except the warm cache run which repeats the cold one
+            if name != "response_cache_warm":
+                server, url = serve(0, prefill_ms=args.prefill_ms, decode_ms=args.decode_ms, load_s=args.load_s)
+            cache = ResponseCache(os.path.join(tmp, "llm_cache.db")) if cached else None
+            report[name] = run(url, layout, questions, cache)
+            if name != "response_cache_cold":
+                server.shutdown()
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'run':<20} {'ms/turn':>9} {'calls':>6} {'cached':>7} {'prefix reuse':>13} "
+          f"{'prefill ms':>11} {'saved ms/call':>14} {'loads':>6}")
+    print("-" * 92)
+    for name, r in report.items():
+        if name == "meta":
+            continue
+        print(f"{name:<20} {r['ms_per_turn']:>9.1f} {r['calls']:>6} {r['cached']:>7} {r['prefix_reuse']:>13.1%} "
+              f"{r['prefill_s'] * 1e3:>11.1f} {r['prefill_saved_ms_per_call']:>14.2f} {r['loads']:>6}")
+    print(f"\n✅ Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
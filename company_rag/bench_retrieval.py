@@ -0,0 +1,187 @@
+# company_rag/bench_retrieval.py
+# Retrieval quality and latency over the labeled set in retrieval_eval.json.
+# Run from company_rag/ after extract.py + build_db.py (fully offline: the
+# embedding model must already be in the local cache, the LLM is StubChain):
+#   python bench_retrieval.py [--iterations N] [--batch-sizes 1,8,32] [--out bench_retrieval.json]
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import time
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")  # Never reach for the network
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import chromadb
+
+from agent_core import Agent
+from stub_llm import StubChain
+from tools.embeddings import ChromaEmbeddingFunction, get_service
+from tools.lexical_index import load_index
+from tools.schema_graph import load_graph
+from tools.schema_tool import SchemaRetriever
+from tools.tracing import percentiles
+
+EVAL_PATH = "retrieval_eval.json"
+OUT_PATH = "bench_retrieval.json"
+KS = (1, 3, 5)
+BATCH_SIZES = (1, 8, 32, 64)
+
+
+def timed(fn, iterations: int):
+    """(last result, [seconds per call])."""
+    samples, result = [], None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+def score(ranked, expected, ks=KS) -> dict:
+    """recall@k for each k and the reciprocal rank of the first expected table."""
+    expected = set(expected)
+    metrics = {f"recall@{k}": len(expected & set(ranked[:k])) / len(expected) for k in ks}
+    metrics["rr"] = next((1.0 / i for i, t in enumerate(ranked, start=1) if t in expected), 0.0)
+    return metrics
+
+
+def tables_of(results) -> list:
+    return [m["table"] for m in results["metadatas"][0] if m and "table" in m]
+
+
+# === BACKENDS ===
+def backends(coll, service, lexical, depth):
+    """name -> fn(question) returning ranked table names."""
+    chroma = SchemaRetriever(coll, service, max_index_bytes=0)  # Always collection.query
+    vector = SchemaRetriever(coll, service)
+    found = {
+        "chroma": lambda q: tables_of(chroma.query(q, depth)),
+        "numpy": lambda q: tables_of(vector.query(q, depth)),
+    }
+    if lexical is not None:
+        hybrid = SchemaRetriever(coll, service, lexical=lexical)
+        found["bm25"] = lambda q: [t for t, _ in lexical.search(q, depth)]
+        found["hybrid"] = lambda q: tables_of(hybrid.query(q, depth))
+    return found
+
+
+def bench_backends(cases, fns, iterations: int) -> dict:
+    report = {}
+    for name, fn in fns.items():
+        totals, samples = {}, []
+        for case in cases:
+            ranked, times = timed(lambda: fn(case["question"]), iterations)
+            samples.extend(times)
+            for key, value in score(ranked, case["tables"]).items():
+                totals[key] = totals.get(key, 0.0) + value
+        quality = {k: round(v / len(cases), 4) for k, v in totals.items()}
+        quality["mrr"] = quality.pop("rr")
+        report[name] = {**quality, "latency": percentiles(samples)}
+    return report
+
+
+def bench_embedding(service, questions, batch_sizes, iterations: int) -> dict:
+    """Raw encoder latency per batch size, plus the cached path retrieval actually uses."""
+    report = {}
+    model = service.model
+    for size in batch_sizes:
+        batch = (questions * math.ceil(size / len(questions)))[:size]
+        _, samples = timed(lambda: model.encode(batch, batch_size=size, convert_to_numpy=True,
+                                                normalize_embeddings=True, show_progress_bar=False),
+                           iterations)
+        per_batch = percentiles(samples)
+        report[f"batch_{size}"] = {**per_batch,
+                                   "texts_per_s": round(size / (per_batch["mean_ms"] / 1e3), 1)}
+    service.embed(questions)
+    _, samples = timed(lambda: service.embed_one(questions[0]), iterations)
+    report["cached_embed_one"] = percentiles(samples)
+    return report
+
+
+def bench_batched(coll, service, lexical, questions, batch_sizes, iterations: int) -> dict:
+    """retrieve_many() latency per batch and per query, for each batch size."""
+    retriever = SchemaRetriever(coll, service, graph=load_graph(), lexical=lexical)
+    report = {}
+    for size in batch_sizes:
+        batch = (questions * math.ceil(size / len(questions)))[:size]
+        _, samples = timed(lambda: retriever.retrieve_many(batch), iterations)
+        per_batch = percentiles(samples)
+        report[f"batch_{size}"] = {**per_batch, "per_query_ms": round(per_batch["mean_ms"] / size, 4)}
+    return report
+
+
+def bench_end_to_end(coll, service, lexical, questions, iterations: int) -> dict:
+    """retrieve_schema through Agent.call_tool, and a whole stub-LLM turn."""
+    retriever = SchemaRetriever(coll, service, graph=load_graph(), lexical=lexical)
+    agent = Agent(StubChain(), retriever)
+
+    async def run():
+        tool, turn = [], []
+        for _ in range(iterations):
+            for q in questions:
+                start = time.perf_counter()
+                await agent.call_tool("retrieve_schema", q)
+                tool.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                await agent.run_turn(q)
+                turn.append(time.perf_counter() - start)
+        return tool, turn
+
+    try:
+        tool, turn = asyncio.run(run())
+    finally:
+        agent.close()
+    return {"tool_call": percentiles(tool), "stub_turn": percentiles(turn)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark schema retrieval quality and latency")
+    parser.add_argument("--eval", default=EVAL_PATH)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--batch-sizes", default=",".join(map(str, BATCH_SIZES)))
+    parser.add_argument("--out", default=OUT_PATH)
+    args = parser.parse_args()
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    with open(args.eval) as f:
+        cases = json.load(f)
+    questions = [c["question"] for c in cases]
+    service = get_service()
+    client = chromadb.PersistentClient(path="chroma_db")
+    coll = client.get_collection("company_schema", embedding_function=ChromaEmbeddingFunction(service))
+    lexical = load_index()
+    service.embed(questions)  # Measure retrieval, not first-time encoding
+
+    report = {
+        "meta": {"questions": len(cases), "iterations": args.iterations, "collection": coll.count(),
+                 "model": service.model_name, "python": platform.python_version(),
+                 "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "retrieval": bench_backends(cases, backends(coll, service, lexical, max(KS)), args.iterations),
+        "embedding": bench_embedding(service, questions, batch_sizes, args.iterations),
+        "batched_retrieval": bench_batched(coll, service, lexical, questions, batch_sizes, args.iterations),
+        "end_to_end": bench_end_to_end(coll, service, lexical, questions, max(1, args.iterations // 5)),
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'backend':<8} {'R@1':>6} {'R@3':>6} {'R@5':>6} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print("-" * 64)
+    for name, r in report["retrieval"].items():
+        lat = r["latency"]
+        print(f"{name:<8} {r['recall@1']:>6.3f} {r['recall@3']:>6.3f} {r['recall@5']:>6.3f} {r['mrr']:>6.3f} "
+              f"{lat['p50_ms']:>8.3f} {lat['p95_ms']:>8.3f} {lat['p99_ms']:>8.3f}")
+    for name, r in report["embedding"].items():
+        rate = f", {r['texts_per_s']} texts/s" if "texts_per_s" in r else ""
+        print(f"🧮 {name}: {r['p50_ms']} ms p50, {r['p99_ms']} ms p99{rate}")
+    for name, r in report["batched_retrieval"].items():
+        print(f"📦 retrieve_many {name}: {r['p50_ms']} ms p50, {r['per_query_ms']} ms/query")
+    for name, r in report["end_to_end"].items():
+        print(f"🔁 {name}: {r['p50_ms']} ms p50, {r['p95_ms']} ms p95, {r['p99_ms']} ms p99")
+    print(f"\n✅ Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# company_rag/bench_scale.py
+# How each stage scales with data size, on synth_data.py databases: a rows sweep
+# (Chinook copied --scales times) and a tables sweep (--tables tables, cloned
+# schemas). Per database: extract.py (chunks, schema graph, BM25 index),
+# build_db.py's Chroma sync, retrieve_schema, run_sql and the summaries.py
+# rollups. Each stage gets a growth exponent between neighbouring sizes
+# (1 = linear in rows / tables, 0 = flat, >1 = worse than linear); with
+# --baseline a previous report is the reference and slower stages fail the run.
+# Run from company_rag/ (the embedding model must already be in the local cache):
+#   python bench_scale.py [--scales 1,10,100] [--tables 11,110,330] [--no-embed]
+#                         [--baseline bench_scale.json] [--tolerance 0.5] [--out bench_scale.json]
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")  # Never reach for the network
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+from bench_llm import ChunkRetriever
+from bench_sql import QUERIES
+from extract import extract, load_chunks
+from synth_data import generate
+from tools import lexical_index, sql_tool
+from tools.schema_graph import SchemaGraph
+from tools.tracing import percentiles
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rag-not_used"))
+from aggregates import AggregateStore  # noqa: E402  (rag-not_used/ is not a package)
+
+EVAL_PATH = "retrieval_eval.json"
+OUT_PATH = "bench_scale.json"
+SCALES = (1, 10, 100)
+TABLES = (11, 110, 330)
+TOLERANCE = 0.5  # A stage may be this much slower than the baseline before it counts as a regression
+MIN_SECONDS = 0.005  # Stages faster than this are too noisy to compare or fit
+# Analyst-style aggregates on top of bench_sql's scan / join / group-by
+SCALE_QUERIES = {
+    **QUERIES,
+    "genre_revenue": """SELECT g.Name, SUM(il.UnitPrice * il.Quantity) AS Revenue
+                        FROM InvoiceLine il JOIN Track t ON t.TrackId = il.TrackId
+                        JOIN Genre g ON g.GenreId = t.GenreId GROUP BY g.Name ORDER BY Revenue DESC LIMIT 5""",
+    "country_sales": "SELECT BillingCountry, SUM(Total) AS Sales FROM Invoice GROUP BY BillingCountry "
+                     "ORDER BY Sales DESC LIMIT 10",
+    "customer_lookup": "SELECT * FROM Invoice WHERE CustomerId = 42",
+}
+
+
+def timed(fn, iterations: int = 1):
+    """(last result, [seconds per call])."""
+    samples, result = [], None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+# === STAGES ===
+def bench_extract(db, tmp) -> dict:
+    paths = {"chunks": os.path.join(tmp, "chunks.jsonl"), "graph": os.path.join(tmp, "schema_graph.json"),
+             "lexical": os.path.join(tmp, "schema_bm25.idx")}
+    (n_chunks, _), (extract_s,) = timed(lambda: extract(db, paths["chunks"]))
+    graph, (graph_s,) = timed(lambda: SchemaGraph.from_chunks(load_chunks(paths["chunks"])))
+    graph.save(paths["graph"])
+    _, (lexical_s,) = timed(lambda: lexical_index.build(load_chunks(paths["chunks"]), paths["lexical"]))
+    return {"paths": paths, "chunks": n_chunks, "join_paths": len(graph.paths),
+            "stages": {"extract": extract_s, "schema_graph": graph_s, "lexical_index": lexical_s}}
+
+
+def bench_build_db(paths, tmp):
+    """build_db.py's sync into a fresh Chroma store; (collection, service, seconds)."""
+    import chromadb
+    from build_db import sync
+    from tools.embeddings import ChromaEmbeddingFunction, get_service
+    from tools.registry import COLLECTION
+
+    service = get_service()
+    client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma_db"))
+    collection = client.get_or_create_collection(COLLECTION, embedding_function=ChromaEmbeddingFunction(service))
+    _, (seconds,) = timed(lambda: sync(collection, list(load_chunks(paths["chunks"]))))
+    return collection, service, seconds
+
+
+def retriever_for(paths, collection=None, service=None):
+    if collection is None:
+        return ChunkRetriever(chunks_path=paths["chunks"], index_path=paths["lexical"])
+    from tools.schema_graph import load_graph
+    from tools.schema_tool import SchemaRetriever
+    return SchemaRetriever(collection, service, graph=load_graph(paths["graph"]),
+                           lexical=lexical_index.load_index(paths["lexical"]))
+
+
+def bench_retrieve(retriever, questions, iterations: int) -> dict:
+    retriever.retrieve_many(questions[:1])  # Index load / model warm-up is not per query
+    samples = []
+    for _ in range(iterations):
+        for q in questions:
+            samples += timed(lambda: retriever.retrieve_many([q]))[1]
+    return percentiles(samples)
+
+
+def bench_run_sql(db, iterations: int) -> dict:
+    sql_tool.DB_PATH = db
+    report = {}
+    for name, sql in SCALE_QUERIES.items():
+        result, samples = timed(lambda: sql_tool.run_sql(sql, use_cache=False), iterations)
+        report[name] = {**percentiles(samples), "error": result[:120] if result.startswith("SQL ERROR") else None}
+    return report
+
+
+def bench_aggregates(db, tmp) -> dict:
+    store = AggregateStore(db, os.path.join(tmp, "summary_store.db"))
+    try:
+        added, (rebuild_s,) = timed(store.rebuild)
+        _, (fresh_s,) = timed(store.ensure_fresh)
+        _, (snapshot_s,) = timed(store.snapshot)
+    finally:
+        store.close()
+    return {"invoices": added, "stages": {"aggregates_rebuild": rebuild_s, "aggregates_noop_refresh": fresh_s,
+                                          "aggregates_snapshot": snapshot_s}}
+
+
+def bench_db(scale, tables, questions, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "synthetic.db")
+        info = generate(db, scale=scale, tables=tables)
+        extracted = bench_extract(db, tmp)
+        stages = {"generate": info["seconds"], **extracted["stages"]}
+
+        collection = service = None
+        if not args.no_embed:
+            collection, service, stages["build_db"] = bench_build_db(extracted["paths"], tmp)
+        retrieval = bench_retrieve(retriever_for(extracted["paths"], collection, service), questions, args.iterations)
+        stages["retrieve_schema"] = retrieval["p50_ms"] / 1e3
+
+        sql = bench_run_sql(db, args.iterations)
+        for name, r in sql.items():
+            stages[f"run_sql:{name}"] = r["p50_ms"] / 1e3
+        aggregates = bench_aggregates(db, tmp)
+        stages.update(aggregates["stages"])
+        sql_tool.close_all()  # Pooled connections to a file about to be deleted
+    return {"scale": scale, "tables": info["tables"], "rows": info["rows"], "invoice_lines": info["invoice_lines"],
+            "mib": round(info["bytes"] / 2 ** 20, 2), "chunks": extracted["chunks"],
+            "join_paths": extracted["join_paths"], "invoices": aggregates["invoices"],
+            "retrieve_schema": retrieval, "run_sql": sql,
+            "stages": {k: round(v, 6) for k, v in stages.items()}}
+
+
+# === ANALYSIS ===
+def growth(runs, size_key: str) -> dict:
+    """Per stage, log-log slope of seconds vs `size_key` between neighbouring runs."""
+    report = {}
+    for stage in runs[0]["stages"]:
+        slopes = []
+        for a, b in zip(runs, runs[1:]):
+            ta, tb = a["stages"].get(stage), b["stages"].get(stage)
+            if ta is None or tb is None or max(ta, tb) < MIN_SECONDS or b[size_key] == a[size_key]:
+                slopes.append(None)
+                continue
+            slopes.append(round(math.log(max(tb, 1e-9) / max(ta, 1e-9)) / math.log(b[size_key] / a[size_key]), 3))
+        report[stage] = slopes
+    return report
+
+
+def regressions(report, baseline, tolerance: float) -> list:
+    """(run, stage, baseline s, now s) for every stage slower than baseline * (1 + tolerance)."""
+    slower = []
+    for sweep in ("rows", "tables"):
+        old = {r["scale" if sweep == "rows" else "tables"]: r for r in baseline.get(sweep, {}).get("runs", [])}
+        for run in report[sweep]["runs"]:
+            ref = old.get(run["scale" if sweep == "rows" else "tables"])
+            if ref is None:
+                continue
+            for stage, seconds in run["stages"].items():
+                before = ref["stages"].get(stage)
+                if before is not None and max(before, seconds) >= MIN_SECONDS and seconds > before * (1 + tolerance):
+                    slower.append((f"{sweep}={run['scale' if sweep == 'rows' else 'tables']}", stage, before, seconds))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic data at growing scale")
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="Row scale factors (11 tables)")
+    parser.add_argument("--tables", default=",".join(map(str, TABLES)), help="Table counts (scale 1)")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--no-embed", action="store_true", help="Skip build_db; retrieve_schema is BM25 only")
+    parser.add_argument("--baseline", help="Earlier bench_scale.json to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--out", default=OUT_PATH)
+    args = parser.parse_args()
+
+    with open(EVAL_PATH) as f:
+        questions = [c["question"] for c in json.load(f)]
+    # Read before --out may overwrite it
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    report = {"meta": {"iterations": args.iterations, "embed": not args.no_embed, "questions": len(questions),
+                       "cpus": os.cpu_count(), "python": platform.python_version(),
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S")}}
+    default_db = sql_tool.DB_PATH
+    try:
+        for sweep, values, size_key in (("rows", args.scales, "rows"), ("tables", args.tables, "tables")):
+            runs = []
+            for value in (int(v) for v in values.split(",") if v):
+                scale, tables = (value, None) if sweep == "rows" else (1, value)
+                run = bench_db(scale, tables, questions, args)
+                runs.append(run)
+                print(f"📈 {sweep}: scale {run['scale']}, {run['tables']} tables, {run['rows']:,} rows "
+                      f"({run['mib']} MiB) — extract {run['stages']['extract']:.2f}s, "
+                      f"retrieve p50 {run['retrieve_schema']['p50_ms']:.2f} ms, "
+                      f"rollups {run['stages']['aggregates_rebuild']:.2f}s")
+            report[sweep] = {"runs": runs, "growth": growth(runs, size_key) if len(runs) > 1 else {}}
+    finally:
+        sql_tool.DB_PATH = default_db
+
+    slower = regressions(report, baseline, args.tolerance) if baseline else []
+    report["regressions"] = [{"run": r, "stage": s, "baseline_s": b, "now_s": n} for r, s, b, n in slower]
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for sweep in ("rows", "tables"):
+        runs = report[sweep]["runs"]
+        if not runs:
+            continue
+        sizes = [f"{r[sweep]:,}" for r in runs]
+        print(f"\n{sweep + ' →':<30} " + " ".join(f"{s:>12}" for s in sizes) + f" {'growth':>14}")
+        print("-" * (31 + 13 * len(runs) + 15))
+        for stage in runs[0]["stages"]:
+            slopes = report[sweep]["growth"].get(stage, [])
+            cells = " ".join(f"{r['stages'][stage] * 1e3:>10.2f}ms" for r in runs)
+            fitted = [s for s in slopes if s is not None]
+            print(f"{stage:<30} {cells} {max(fitted) if fitted else '-':>14}")
+    for r in report["regressions"]:
+        print(f"🐢 [REGRESSION] {r['run']} {r['stage']}: {r['baseline_s'] * 1e3:.2f} ms → {r['now_s'] * 1e3:.2f} ms")
+    print(f"\n✅ Wrote {args.out}")
+    if slower:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
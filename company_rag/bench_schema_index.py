@@ -0,0 +1,71 @@
+# company_rag/bench_schema_index.py
+# Latency of the in-process NumPy index vs Chroma's coll.query (n_results=3).
+# Run from company_rag/ after build_db.py:  python bench_schema_index.py [iterations]
+import statistics
+import sys
+import time
+
+import chromadb
+
+from tools.embeddings import ChromaEmbeddingFunction, get_service
+from tools.schema_tool import SchemaRetriever
+from tools.vector_index import VectorIndex
+
+QUESTIONS = [
+    "employees and their information",
+    "sales and revenue data",
+    "customer details and contacts",
+    "products and inventory",
+    "which genre sells the most tracks",
+    "invoice totals by billing country",
+]
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    service = get_service()
+    client = chromadb.PersistentClient(path="chroma_db")
+    coll = client.get_collection("company_schema", embedding_function=ChromaEmbeddingFunction(service))
+
+    start = time.perf_counter()
+    index = VectorIndex.from_collection(coll)
+    load_ms = (time.perf_counter() - start) * 1e3
+    print(f"📦 Loaded {len(index)} vectors ({index.nbytes / 1024:.1f} KiB) in {load_ms:.1f} ms\n")
+
+    # Pre-embed so both sides measure search only; embeddings are cached anyway
+    query_vecs = service.embed(QUESTIONS)
+    retriever = SchemaRetriever(coll, service)
+
+    print(f"{'question':<40} {'chroma p50':>11} {'numpy p50':>10} {'p95 c/n (µs)':>16} {'same top-3':>11}")
+    print("-" * 92)
+    for question, vec in zip(QUESTIONS, query_vecs):
+        chroma = coll.query(query_embeddings=[vec.tolist()], n_results=3)
+        ours = index.query(vec, n_results=3)
+        same = chroma["ids"][0] == ours["ids"][0]
+
+        c50, c95 = timed(lambda: coll.query(query_embeddings=[vec.tolist()], n_results=3), iterations)
+        n50, n95 = timed(lambda: index.query(vec, n_results=3), iterations)
+        print(f"{question[:40]:<40} {c50:>11.1f} {n50:>10.1f} {c95:>7.1f}/{n95:<8.1f} {str(same):>11}")
+
+    # Batched multi-query search: one matrix product for every question
+    b50, _ = timed(lambda: index.search(query_vecs, 3), iterations)
+    print(f"\n⚡ Batched search of {len(QUESTIONS)} queries: {b50:.1f} µs p50 "
+          f"({b50 / len(QUESTIONS):.1f} µs/query)")
+
+    # End to end through retrieve_schema's backend (embedding served from cache)
+    r50, r95 = timed(lambda: retriever.retrieve(QUESTIONS[0]), iterations)
+    print(f"🔍 retriever.retrieve: {r50:.1f} µs p50, {r95:.1f} µs p95")
+
+
+if __name__ == "__main__":
+    main()
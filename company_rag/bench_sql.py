@@ -0,0 +1,81 @@
+# company_rag/bench_sql.py
+# Compare the old connect-per-call run_sql with the pooled, read-only one,
+# with and without the query-result cache.
+# Run from company_rag/:  python bench_sql.py [iterations] [threads]
+import sqlite3
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tools import sql_tool
+from tools.sql_tool import run_sql
+
+QUERIES = {
+    "full_scan": "SELECT * FROM InvoiceLine",
+    "join": """SELECT t.Name, il.UnitPrice, il.Quantity
+               FROM InvoiceLine il JOIN Track t ON t.TrackId = il.TrackId""",
+    "aggregate": "SELECT strftime('%Y', InvoiceDate) AS Year, SUM(Total) AS Revenue FROM Invoice GROUP BY Year",
+}
+
+
+# === OLD PATH (verbatim copy of the previous run_sql) ===
+def run_sql_legacy(sql: str) -> str:
+    try:
+        conn = sqlite3.connect(sql_tool.DB_PATH)
+        conn.row_factory = sqlite3.Row
+        cur = conn.cursor()
+        cur.execute(sql)
+        rows = cur.fetchall()
+        cols = [desc[0] for desc in cur.description]
+        result = [dict(zip(cols, row)) for row in rows][:20]
+        conn.close()
+        return json.dumps({
+            "data": result,
+            "count": len(result),
+            "truncated": len(result) == 20
+        }, indent=2)
+    except Exception as e:
+        return f"SQL ERROR: {str(e)}"
+
+
+def bench(fn, sql, iterations, threads):
+    def work(_):
+        fn(sql)
+
+    start = time.perf_counter()
+    if threads == 1:
+        for i in range(iterations):
+            work(i)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(work, range(iterations)))
+    elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1e6  # µs per call
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    print(f"📏 {iterations} calls per query, {threads} thread(s), DB: {sql_tool.DB_PATH}\n")
+    print(f"{'query':<12} {'old µs':>10} {'pooled µs':>10} {'cached µs':>10} {'speedup':>9}")
+    print("-" * 55)
+    for name, sql in QUERIES.items():
+        # Same rows on both paths (truncated may differ since the old path
+        # flagged any 20-row result as truncated; new results are columnar)
+        old, new = json.loads(run_sql_legacy(sql)), json.loads(run_sql(sql, use_cache=False, fmt="columnar"))
+        new_data = [dict(zip(new["columns"], row)) for row in new["rows"]]
+        assert old["data"] == new_data and old["count"] == new["count"], name
+
+        old_us = bench(run_sql_legacy, sql, iterations, threads)
+        new_us = bench(lambda q: run_sql(q, use_cache=False, fmt="columnar"), sql, iterations, threads)
+        cached_us = bench(lambda q: run_sql(q, fmt="columnar"), sql, iterations, threads)
+        print(f"{name:<12} {old_us:>10.1f} {new_us:>10.1f} {cached_us:>10.1f} {old_us / new_us:>8.1f}x")
+
+    print(f"\n🗃️ Cache: {sql_tool.QUERY_CACHE.stats()}")
+    sql_tool.close_all()
+
+
+if __name__ == "__main__":
+    main()
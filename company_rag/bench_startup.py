@@ -0,0 +1,102 @@
+# company_rag/bench_startup.py
+# Startup cost of the CLI entry points: `python -X importtime` per module and
+# wall-clock time until each REPL shows its prompt.
+# Run from company_rag/:  python bench_startup.py [--runs N] [--out bench_startup.json]
+import argparse
+import json
+import os
+import select
+import statistics
+import subprocess
+import sys
+import time
+
+# Our modules first; the heavy third-party ones show what lazy loading avoids
+MODULES = ["agent_core", "agent_2", "tools.registry", "tools.schema_tool", "tools.embeddings",
+           "chromadb", "sentence_transformers", "langchain_ollama"]
+# script -> text that means the prompt is on screen
+REPLS = {"agent_2.py": "👤 You: ", "agent.py": "You: "}
+TOP_N = 10
+PROMPT_TIMEOUT = 120.0
+
+
+def importtime(module: str) -> dict:
+    """Cumulative import time of `module` and its slowest dependencies, from -X importtime."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append({"name": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us),
+                        "top_level": not name[1:].startswith(" ")})
+    total = sum(e["cumulative_us"] for e in entries if e["top_level"])
+    slowest = sorted(entries, key=lambda e: e["self_us"], reverse=True)[:TOP_N]
+    return {"total_ms": round(total / 1e3, 2), "modules": len(entries),
+            "slowest_self_ms": {e["name"]: round(e["self_us"] / 1e3, 2) for e in slowest}}
+
+
+def time_to_prompt(script: str, marker: str) -> float:
+    """Seconds from spawning `script` until `marker` is printed; then the REPL is told to quit."""
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, script], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, env=env)
+    seen, wanted = b"", marker.encode("utf-8")
+    try:
+        while wanted not in seen:
+            remaining = PROMPT_TIMEOUT - (time.perf_counter() - start)
+            ready, _, _ = select.select([proc.stdout], [], [], max(remaining, 0))
+            chunk = os.read(proc.stdout.fileno(), 4096) if ready else b""
+            if not chunk:
+                raise RuntimeError(f"{script} exited or timed out before showing its prompt")
+            seen += chunk
+        elapsed = time.perf_counter() - start
+        proc.stdin.write(b"quit\n")
+        proc.stdin.flush()
+        proc.wait(timeout=30)
+        return elapsed
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI import and time-to-prompt")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", default="bench_startup.json")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "runs": args.runs, "importtime": {}, "time_to_prompt": {}}
+    print(f"{'module':<24} {'import ms':>10} {'modules':>8}")
+    print("-" * 44)
+    for module in MODULES:
+        r = importtime(module)
+        report["importtime"][module] = r
+        if "error" in r:
+            print(f"{module:<24} {'n/a':>10} {'':>8}  ({r['error'][:60]})")
+        else:
+            print(f"{module:<24} {r['total_ms']:>10.1f} {r['modules']:>8}")
+
+    print()
+    for script, marker in REPLS.items():
+        try:
+            samples = [time_to_prompt(script, marker) for _ in range(args.runs)]
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            report["time_to_prompt"][script] = {"error": str(e)}
+            print(f"⏱️ {script}: {e}")
+            continue
+        report["time_to_prompt"][script] = {"median_ms": round(statistics.median(samples) * 1e3, 1),
+                                            "min_ms": round(min(samples) * 1e3, 1)}
+        print(f"⏱️ {script}: prompt after {statistics.median(samples) * 1e3:.0f} ms (median of {args.runs})")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
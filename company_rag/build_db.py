@@ -1,27 +1,54 @@
 # company_rag/build_db.py
-import json
-import chromadb
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
-
-# Load chunks
-with open("chunks.json") as f:
-    chunks = json.load(f)
-
-# Embedding model (local, fast)
-ef = SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-
-# Chroma DB
-client = chromadb.PersistentClient(path="chroma_db")
-collection = client.create_collection(
-    name="company_schema",
-    embedding_function=ef
-)
-
-# Add chunks
-collection.add(
-    documents=[c["text"] for c in chunks],
-    metadatas=[{"table": c["table"]} for c in chunks],
-    ids=[f"chunk_{i}" for i in range(len(chunks))]
-)
-
-print(f"✅ Vector DB built: {collection.count()} chunks in 'chroma_db/'")
\ No newline at end of file
+import hashlib
+
+from extract import load_chunks
+from tools.embeddings import ChromaEmbeddingFunction
+from tools.registry import COLLECTION, REGISTRY
+
+
+def chunk_id(chunk: dict) -> str:
+    """Stable id: table name + hash of the chunk text. Inserting a table never shifts other ids."""
+    digest = hashlib.sha1(chunk["text"].encode("utf-8")).hexdigest()[:16]
+    return f"{chunk['table']}:{digest}"
+
+
+def sync(collection, chunks):
+    """Make `collection` match `chunks`, embedding only what is new or changed.
+
+    A changed chunk gets a new id, so it shows up as one add plus one delete.
+    Dropped tables and legacy positional `chunk_{i}` ids fall out as deletes.
+    """
+    wanted = {chunk_id(c): c for c in chunks}
+    existing = set(collection.get(include=[])["ids"])
+
+    to_add = [i for i in wanted if i not in existing]
+    to_delete = [i for i in existing if i not in wanted]
+
+    if to_add:
+        collection.add(
+            documents=[wanted[i]["text"] for i in to_add],
+            metadatas=[{"table": wanted[i]["table"], "content_hash": i.split(":")[-1]} for i in to_add],
+            ids=to_add,
+        )
+    if to_delete:
+        collection.delete(ids=to_delete)
+    return len(to_add), len(to_delete), len(wanted) - len(to_add)
+
+
+if __name__ == "__main__":
+    # Load chunks
+    chunks = list(load_chunks())
+
+    # Embedding model (local, fast; shared, batched and cached on disk)
+    ef = ChromaEmbeddingFunction(REGISTRY.get("embeddings"))
+
+    # Chroma DB
+    client = REGISTRY.get("chroma_client")
+    collection = client.get_or_create_collection(
+        name=COLLECTION,
+        embedding_function=ef
+    )
+
+    added, deleted, unchanged = sync(collection, chunks)
+    print(f"✅ Vector DB synced: +{added} / -{deleted} / ={unchanged} → "
+          f"{collection.count()} chunks in 'chroma_db/'")
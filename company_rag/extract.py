@@ -1,41 +1,159 @@
 # company_rag/extract.py
-import sqlite3
+import argparse
 import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from tools import lexical_index
+from tools.schema_graph import GRAPH_PATH, SchemaGraph
+from tools.sql_guard import quote
+from tools.sql_tool import ConnectionPool, get_connection
 
 DB_PATH = "../data/Chinook.db"  # ← CHANGE TO YOUR REAL DB LATER
+OUT_PATH = "chunks.jsonl"
+LEGACY_PATH = "chunks.json"  # Pre-JSONL output, still read by load_chunks()
 CHUNK_SIZE = 3  # Sample rows per chunk
+WORKERS = min(8, (os.cpu_count() or 1) + 2)
+
+
+# === TABLE INTROSPECTION ===
+def iter_tables(db_path: str = DB_PATH):
+    """Stream user table names from sqlite_master without materializing the list."""
+    cur = get_connection(db_path).execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )
+    for (name,) in cur:
+        yield name
+
 
-conn = sqlite3.connect(DB_PATH)
-cur = conn.cursor()
-
-# Get all tables (limit 100 for now)
-cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
-tables = [row[0] for row in cur.fetchall()][:100]
-
-chunks = []
-for table in tables:
-    # Get columns
-    cur.execute(f"PRAGMA table_info({table})")
-    columns = [row[1] for row in cur.fetchall()]
-    
-    # Get sample rows
-    cur.execute(f"SELECT * FROM {table} LIMIT {CHUNK_SIZE}")
-    rows = cur.fetchall()
+def estimate_rows(conn: sqlite3.Connection, table: str):
+    """Cheap row-count estimate: ANALYZE stats if present, else max(rowid)."""
+    try:
+        row = conn.execute(
+            "SELECT stat FROM sqlite_stat1 WHERE tbl = ? ORDER BY idx IS NOT NULL LIMIT 1", (table,)
+        ).fetchone()
+        if row and row[0]:
+            return int(row[0].split()[0])
+    except sqlite3.OperationalError:
+        pass  # No sqlite_stat1 until ANALYZE has run
+    try:
+        # Seeks to the last b-tree entry; O(log n) instead of COUNT(*)'s full scan
+        return conn.execute(f"SELECT max(rowid) FROM {quote(table)}").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return None  # WITHOUT ROWID table
+
+
+def describe_table(table: str, db_path: str = DB_PATH, conns: ConnectionPool = None):
+    """Build one schema chunk. Runs on a worker thread with its own read-only connection
+    (from `conns` if given, else the shared pool)."""
+    conn = conns.get() if conns is not None else get_connection(db_path)
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({quote(table)})")]
+
+    rows = conn.execute(f"SELECT * FROM {quote(table)} LIMIT {CHUNK_SIZE}").fetchall()
     if not rows:
-        continue
-    
-    # Build chunk text
+        return None
+
+    foreign_keys = [
+        {"from": fk[3], "table": fk[2], "to": fk[4]}
+        for fk in conn.execute(f"PRAGMA foreign_key_list({quote(table)})")
+    ]
+    indexes = []
+    for idx in conn.execute(f"PRAGMA index_list({quote(table)})"):
+        name, unique = idx[1], bool(idx[2])
+        cols = [info[2] for info in conn.execute(f"PRAGMA index_info({quote(name)})")]
+        indexes.append({"name": name, "columns": cols, "unique": unique})
+
+    # Build chunk text (unchanged format, so existing embeddings stay valid)
     sample_text = "\n".join([" | ".join(map(str, row)) for row in rows])
     chunk_text = f"TABLE: {table}\nCOLUMNS: {', '.join(columns)}\nSAMPLE ROWS:\n{sample_text}"
-    
-    chunks.append({
+
+    return {
         "text": chunk_text,
-        "table": table
-    })
+        "table": table,
+        "columns": columns,
+        "foreign_keys": foreign_keys,
+        "indexes": indexes,
+        "row_estimate": estimate_rows(conn, table),
+    }
+
+
+# === STREAMING EXTRACT ===
+def extract(db_path: str = DB_PATH, out_path: str = OUT_PATH, workers: int = WORKERS):
+    """Describe every table on a thread pool and write the chunks to `out_path` in table order.
+
+    At most `workers * 4` tables are in flight, so memory stays flat no matter
+    how many tables the database has. The worker threads' connections come
+    from a pool of their own, closed once the threads are done.
+    """
+    n_tables = n_chunks = 0
+    tmp_path = out_path + ".tmp"
+    conns = ConnectionPool(db_path)
+    try:
+        with open(tmp_path, "w") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+
+            def write_next():
+                nonlocal n_chunks
+                try:
+                    chunk = pending.popleft().result()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Skipped table: {e}")
+                    return
+                if chunk is not None:
+                    out.write(json.dumps(chunk) + "\n")
+                    n_chunks += 1
+
+            for table in iter_tables(db_path):
+                n_tables += 1
+                pending.append(pool.submit(describe_table, table, db_path, conns))
+                if len(pending) >= workers * 4:
+                    write_next()  # Oldest first, so the file follows iter_tables' order
+            while pending:
+                write_next()
+    finally:
+        conns.close_all()
+    os.replace(tmp_path, out_path)  # Readers never see a half-written file
+    return n_chunks, n_tables
+
+
+def load_chunks(path: str = OUT_PATH):
+    """Yield chunks from a JSON Lines file (or the legacy chunks.json array)."""
+    if not os.path.exists(path) and os.path.exists(LEGACY_PATH):
+        with open(LEGACY_PATH) as f:
+            yield from json.load(f)
+        return
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract schema chunks from a SQLite database")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--out", default=OUT_PATH)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--graph", default=GRAPH_PATH)
+    parser.add_argument("--lexical", default=lexical_index.INDEX_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    n_chunks, n_tables = extract(args.db, args.out, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Extracted {n_chunks} chunks from {n_tables} tables in {elapsed:.2f}s → {args.out}")
 
-# Save
-with open("chunks.json", "w") as f:
-    json.dump(chunks, f, indent=2)
+    # Join-path index from the foreign keys just recorded
+    start = time.perf_counter()
+    graph = SchemaGraph.from_chunks(load_chunks(args.out))
+    graph.save(args.graph)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Schema graph: {len(graph.paths)} join paths in {elapsed:.2f}s → {args.graph}")
 
-print(f"✅ Extracted {len(chunks)} chunks from {len(tables)} tables")
-conn.close()
\ No newline at end of file
+    # BM25 index over the same chunks for hybrid retrieval
+    start = time.perf_counter()
+    n_docs = lexical_index.build(load_chunks(args.out), args.lexical)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Lexical index: {n_docs} chunks in {elapsed:.2f}s → {args.lexical}")
@@ -0,0 +1,262 @@
+# company_rag/load_test.py
+# Offline load test of agent_2's tool loop: simulated analyst sessions replay a
+# question corpus through Agent concurrently, against ../data/Chinook.db and
+# chroma_db, with StubChain scripting retrieve_schema -> execute_sql -> answer
+# at a configurable LLM latency. Reports QPS, per-stage latency percentiles
+# (tools.tracing), peak RSS and how long calls queued for the LLM, SQL and
+# embedding limits, per concurrency level.
+# Run from company_rag/ after extract.py + build_db.py:
+#   python load_test.py [--concurrency 1,4,16] [--requests 200] [--llm-latency 0.2]
+#                       [--retriever chroma|bm25] [--out load_test.json]
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import time
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")  # Never reach for the network
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+from agent_core import Agent, EMBED_CONCURRENCY, LLM_CONCURRENCY, SQL_CONCURRENCY
+from stub_llm import StubChain
+from tools import sql_tool
+from tools.registry import REGISTRY
+from tools.speculative import SQLHistory, schema_tables
+from tools.sql_templates import TEMPLATES, TemplateMatcher
+from tools.tracing import TRACER, percentiles
+
+EVAL_PATH = "retrieval_eval.json"
+OUT_PATH = "load_test.json"
+CONCURRENCY = (1, 4, 16)
+FALLBACK_SQL = "SELECT * FROM {table}"  # Questions no SQL template answers
+SAMPLE_INTERVAL = 0.05  # Seconds between RSS samples
+# Spans reported per stage, in pipeline order
+STAGES = ("turn", "llm_call", "tool_call", "schema_retrieval", "embedding", "sql", "sql_preflight",
+          "json_serialize", "speculative_hit", "speculative_sql")
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+# === CORPUS ===
+def load_corpus(path: str = None) -> list:
+    """Questions from `path` (one per line, or a JSON list of strings / {"question": ...}),
+    default retrieval_eval.json plus the SQL templates' example questions."""
+    if path:
+        with open(path) as f:
+            text = f.read()
+        try:
+            items = json.loads(text)
+        except ValueError:
+            return [line.strip() for line in text.splitlines() if line.strip()]
+        return [i["question"] if isinstance(i, dict) else i for i in items]
+    with open(EVAL_PATH) as f:
+        questions = [c["question"] for c in json.load(f)]
+    return list(dict.fromkeys(questions + [e for t in TEMPLATES for e in t.examples]))
+
+
+def scripted_sql(questions) -> dict:
+    """question -> the SQL the stub "writes": the matching template's, else None."""
+    matcher = TemplateMatcher(sql_tool.get_connection())
+    sql = {}
+    for q in questions:
+        match = matcher.match(q)
+        sql[q] = match.sql if match else None
+    return sql
+
+
+def analyst_script(sql_for: dict):
+    """StubChain script: retrieve_schema on the question, execute_sql, then a fixed answer."""
+    def script(inputs: dict) -> str:
+        question, history = inputs["input"], inputs.get("history", "")
+        if "Tool retrieve_schema returned" not in history:
+            return f"TOOL: retrieve_schema\nARGS: {question}\n"
+        if "Tool execute_sql returned" not in history:
+            sql = sql_for.get(question)
+            if sql is None:
+                tables = schema_tables(history)
+                sql = FALLBACK_SQL.format(table=tables[0] if tables else "Invoice")
+            return f"TOOL: execute_sql\nARGS: {' '.join(sql.split())}\n"
+        return ("Stub answer: the figures above answer the question.\n"
+                "1. Keep doing what works\n2. Look at the outliers\n3. Check again next quarter")
+    return script
+
+
+# === MEASUREMENT ===
+class TimedSemaphore(asyncio.Semaphore):
+    """Semaphore that records how long each acquire waited as a `wait_<name>` span."""
+
+    def __init__(self, value: int, name: str):
+        super().__init__(value)
+        self.name = f"wait_{name}"
+
+    async def acquire(self):
+        start = time.perf_counter()
+        result = await super().acquire()
+        TRACER.record(self.name, time.perf_counter() - start)
+        return result
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux /proc), else the lifetime peak from getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except OSError:
+        scale = 1 if platform.system() == "Darwin" else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+async def sample_rss(peak: list, stop: asyncio.Event):
+    while not stop.is_set():
+        peak[0] = max(peak[0], rss_bytes())
+        try:
+            await asyncio.wait_for(stop.wait(), SAMPLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+# === RUN ===
+def make_retriever(kind: str):
+    if kind == "bm25":
+        from bench_llm import ChunkRetriever
+        return ChunkRetriever()
+    return REGISTRY.get("retriever")
+
+
+async def run_level(agent, questions, concurrency: int, requests: int, think: float) -> dict:
+    """`concurrency` closed-loop sessions sharing `requests` questions, round robin."""
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(questions[i % len(questions)])
+    turns, errors = [], []
+
+    def on_event(kind, **payload):
+        if kind == "error":
+            errors.append(payload["message"])
+
+    async def session():
+        while True:
+            try:
+                question = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            turn = await agent.run_turn(question, on_event=on_event)
+            turns.append(turn)
+            if think:
+                await asyncio.sleep(think)
+
+    peak, stop = [rss_bytes()], asyncio.Event()
+    sampler = asyncio.ensure_future(sample_rss(peak, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(session() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+    return {"elapsed_s": round(elapsed, 3), "turns": len(turns), "errors": len(errors),
+            "answered": sum(t.answer is not None for t in turns),
+            "qps": round(len(turns) / elapsed, 3) if elapsed else None,
+            "turn_latency": percentiles([t.elapsed for t in turns]),
+            "ttft": percentiles([t.ttft for t in turns if t.ttft is not None]),
+            "peak_rss_mb": round(peak[0] / 2 ** 20, 1)}
+
+
+def contention(summary: dict, baseline: dict) -> dict:
+    """Per backend: queueing on its limit, and how much its own stage slowed vs concurrency 1."""
+    report = {}
+    for backend, stage in (("llm", "llm_call"), ("sql", "sql"), ("embed", "schema_retrieval")):
+        wait = summary.get(f"wait_{backend}")
+        if wait is None:
+            continue
+        own, base = summary.get(stage, {}), baseline.get(stage, {})
+        stretch = (round(own["p50_ms"] / base["p50_ms"], 3)
+                   if own.get("p50_ms") and base.get("p50_ms") else None)
+        report[backend] = {"wait_p50_ms": wait["p50_ms"], "wait_p95_ms": wait["p95_ms"],
+                           "wait_p99_ms": wait["p99_ms"], "wait_total_s": round(wait["mean_ms"] * wait["n"] / 1e3, 3),
+                           f"{stage}_p50_stretch": stretch}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the agent loop with a stub LLM")
+    parser.add_argument("--questions", help="Question corpus (lines or JSON); default eval set + template examples")
+    parser.add_argument("--concurrency", default=",".join(map(str, CONCURRENCY)))
+    parser.add_argument("--requests", type=int, default=200, help="Turns per concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds to first chunk per LLM call")
+    parser.add_argument("--chunk-latency", type=float, default=0.0, help="Seconds per further streamed chunk")
+    parser.add_argument("--think", type=float, default=0.0, help="Seconds each session waits between questions")
+    parser.add_argument("--retriever", choices=("chroma", "bm25"), default="chroma")
+    parser.add_argument("--llm-limit", type=int, default=LLM_CONCURRENCY)
+    parser.add_argument("--sql-limit", type=int, default=SQL_CONCURRENCY)
+    parser.add_argument("--embed-limit", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--no-speculate", action="store_true")
+    parser.add_argument("--sql-cache", action="store_true", help="Keep run_sql's result cache from one level to the next")
+    parser.add_argument("--out", default=OUT_PATH)
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    questions = load_corpus(args.questions)
+    sql_for = scripted_sql(questions)
+    chain = StubChain(analyst_script(sql_for), latency=args.llm_latency, chunk_latency=args.chunk_latency)
+    retriever = make_retriever(args.retriever)
+    retriever.retrieve_many(questions[:1])  # Load the model / index outside the measurement
+
+    report = {"meta": {"questions": len(questions), "templated": sum(s is not None for s in sql_for.values()),
+                       "requests": args.requests, "llm_latency_s": args.llm_latency,
+                       "chunk_latency_s": args.chunk_latency, "think_s": args.think, "retriever": args.retriever,
+                       "limits": {"llm": args.llm_limit, "sql": args.sql_limit, "embed": args.embed_limit},
+                       "stream": not args.no_stream, "speculate": not args.no_speculate,
+                       "sql_cache": args.sql_cache, "cpus": os.cpu_count(), "python": platform.python_version(),
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "levels": {}}
+    baseline = None
+    for level in levels:
+        agent = Agent(chain, retriever, stream=not args.no_stream, speculate=not args.no_speculate,
+                      llm_concurrency=args.llm_limit, sql_concurrency=args.sql_limit,
+                      embed_concurrency=args.embed_limit)
+        agent.llm_limit = TimedSemaphore(args.llm_limit, "llm")
+        agent.sql_limit = TimedSemaphore(args.sql_limit, "sql")
+        agent.embed_limit = TimedSemaphore(args.embed_limit, "embed")
+        if agent.speculator is not None:
+            agent.speculator.history = SQLHistory(path=None)  # Don't touch sql_history.jsonl
+        if not args.sql_cache:
+            sql_tool.QUERY_CACHE.clear()
+        TRACER.reset()
+        try:
+            result = asyncio.run(run_level(agent, questions, level, args.requests, args.think))
+        finally:
+            agent.close()
+        summary = TRACER.summary()
+        baseline = baseline or summary
+        result["stages"] = {name: {k: v for k, v in summary[name].items() if k != "totals"}
+                            for name in STAGES if name in summary}
+        result["contention"] = contention(summary, baseline)
+        if agent.speculator is not None:
+            result["speculation"] = agent.speculator.stats()
+        result["sql_cache"] = sql_tool.QUERY_CACHE.stats()
+        report["levels"][str(level)] = result
+        print(f"👥 {level:>3} sessions: {result['qps']:>8.2f} QPS, turn p50 {result['turn_latency']['p50_ms']:.1f} ms "
+              f"/ p99 {result['turn_latency']['p99_ms']:.1f} ms, peak RSS {result['peak_rss_mb']} MB, "
+              f"{result['errors']} errors")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'sessions':>8} {'stage':<18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print("-" * 58)
+    for level, r in report["levels"].items():
+        for name, s in r["stages"].items():
+            print(f"{level:>8} {name:<18} {s['p50_ms']:>9.3f} {s['p95_ms']:>9.3f} {s['p99_ms']:>9.3f}")
+    print(f"\n{'sessions':>8} {'limit':<6} {'wait p50':>9} {'wait p95':>9} {'wait s':>8} {'stretch':>8}")
+    print("-" * 54)
+    for level, r in report["levels"].items():
+        for backend, c in r["contention"].items():
+            stretch = next(v for k, v in c.items() if k.endswith("_stretch"))
+            print(f"{level:>8} {backend:<6} {c['wait_p50_ms']:>9.3f} {c['wait_p95_ms']:>9.3f} "
+                  f"{c['wait_total_s']:>8.3f} {stretch if stretch is not None else '-':>8}")
+    print(f"\n✅ Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
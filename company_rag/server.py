@@ -0,0 +1,86 @@
+# company_rag/server.py
+# Multi-session asyncio front end for agent_2's tool loop.
+# Run from company_rag/:  python server.py [--host 127.0.0.1] [--port 8765]
+#
+# Protocol (JSON Lines over TCP): each connection is one analyst session.
+# The client sends one question per line; the server streams events back as
+# {"type": ..., ...} objects and ends every turn with {"type": "done", ...}.
+import argparse
+import asyncio
+import itertools
+import json
+
+from agent_core import (build_agent, EMBED_CONCURRENCY, LLM_CONCURRENCY, MAX_ROWS, SQL_CONCURRENCY)
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+_session_ids = itertools.count(1)
+
+
+def encode_event(kind, **payload) -> bytes:
+    if kind == "cache_hit":
+        entry = payload.pop("entry")
+        payload.update(question=entry.question, sql=entry.sql)
+    return (json.dumps({"type": kind, **payload}, default=str) + "\n").encode("utf-8")
+
+
+async def handle_session(agent, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    session = next(_session_ids)
+    peer = writer.get_extra_info("peername")
+    print(f"🔌 [SESSION {session}] connected from {peer}")
+    writer.write(encode_event("hello", session=session))
+    await writer.drain()
+
+    def on_event(kind, **payload):
+        # StreamWriter.write only buffers; drain() below applies back-pressure
+        writer.write(encode_event(kind, **payload))
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            question = line.decode("utf-8", errors="replace").strip()
+            if question.lower() in ["quit", "exit", "bye"]:
+                break
+            if not question:
+                continue
+
+            turn = await agent.run_turn(question, on_event=on_event)
+            on_event("done", answer=turn.answer, sql=turn.sql, cached=turn.cached,
+                     iterations=turn.iterations, elapsed=round(turn.elapsed, 3))
+            await writer.drain()
+    except (ConnectionResetError, BrokenPipeError):
+        pass
+    finally:
+        print(f"👋 [SESSION {session}] closed")
+        writer.close()
+
+
+async def serve(host: str, port: int, **limits):
+    agent = build_agent(**limits)
+    server = await asyncio.start_server(lambda r, w: handle_session(agent, r, w), host, port)
+    print(f"🤖 Agent server listening on {host}:{port} {limits or ''}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        agent.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the analyst agent to many sessions at once")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY)
+    parser.add_argument("--sql-concurrency", type=int, default=SQL_CONCURRENCY)
+    parser.add_argument("--embed-concurrency", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--max-rows", type=int, default=MAX_ROWS, help="Rows of each SQL result sent to the model")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, llm_concurrency=args.llm_concurrency,
+                          sql_concurrency=args.sql_concurrency, embed_concurrency=args.embed_concurrency,
+                          max_rows=args.max_rows))
+    except KeyboardInterrupt:
+        print("\n🤖 Server stopped.")
@@ -0,0 +1,47 @@
+# company_rag/stub_llm.py
+# Deterministic stand-in for build_chain()'s OllamaChain, so the agent loop
+# can be benchmarked offline without Ollama (stub_ollama.py serves the same
+# script over HTTP when the client layer itself is under test).
+import asyncio
+
+
+def lookup_then_answer(inputs: dict) -> str:
+    """Default script: retrieve_schema on the question, then a fixed answer."""
+    if "Tool retrieve_schema returned" not in inputs.get("history", ""):
+        return f"TOOL: retrieve_schema\nARGS: {inputs['input']}\n"
+    return "Stub answer: the schema above covers this question."
+
+
+class StubChain:
+    """Answers through `script(inputs) -> str` with the chain's ainvoke/astream API.
+
+    `latency` is slept once before the first chunk (time to first token),
+    `chunk_size` characters are yielded per chunk, like a streamed completion,
+    and `chunk_latency` is slept before each chunk after the first (decode).
+    """
+
+    def __init__(self, script=lookup_then_answer, latency: float = 0.0, chunk_size: int = 8,
+                 chunk_latency: float = 0.0):
+        self.script = script
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_latency = chunk_latency
+        self.calls = 0
+
+    async def ainvoke(self, inputs: dict) -> str:
+        self.calls += 1
+        text = self.script(inputs)
+        delay = self.latency + self.chunk_latency * max(0, -(-len(text) // self.chunk_size) - 1)
+        if delay:
+            await asyncio.sleep(delay)
+        return text
+
+    async def astream(self, inputs: dict):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self.script(inputs)
+        for i in range(0, len(text), self.chunk_size):
+            if i and self.chunk_latency:
+                await asyncio.sleep(self.chunk_latency)
+            yield text[i:i + self.chunk_size]
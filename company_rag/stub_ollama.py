@@ -0,0 +1,207 @@
+# company_rag/stub_ollama.py
+# Local stand-in for Ollama's HTTP API (/api/chat, /api/tags) for exercising
+# tools/llm_client.py offline. It simulates what matters for latency: a model
+# load when keep_alive has lapsed, a per-model prefix (KV) cache so only the
+# prompt tokens after the longest shared prefix are prefilled, and per-token
+# decode time. Replies come from stub_llm's script, so agent_2 runs end to end.
+# Run from company_rag/:  python stub_ollama.py [--port 11435] [--prefill-ms 0.5] [--decode-ms 5] [--load-s 1]
+#   then: OLLAMA_HOST=http://127.0.0.1:11435 python agent_2.py
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from stub_llm import lookup_then_answer
+
+PORT = 11435  # Next to Ollama's 11434, so both can run
+PREFILL_MS = 0.5  # Per prompt token not already in the cache
+DECODE_MS = 5.0  # Per generated token
+LOAD_S = 1.0
+DEFAULT_KEEP_ALIVE = 300.0  # Ollama's 5m
+CHUNK_TOKENS = 2  # Tokens per streamed chunk
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_DURATION_RE = re.compile(r"^(\d+(?:\.\d+)?)(ms|s|m|h)?$")
+_UNITS = {"ms": 1e-3, "s": 1.0, "m": 60.0, "h": 3600.0, None: 1.0}
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text)
+
+
+def keep_alive_seconds(value) -> float:
+    """Ollama's keep_alive: seconds as a number, a duration like "30m", negative = forever."""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    if value.startswith("-"):
+        return float("inf")
+    m = _DURATION_RE.match(value)
+    return float(m.group(1)) * _UNITS[m.group(2)] if m else DEFAULT_KEEP_ALIVE
+
+
+def render(messages) -> str:
+    """The prompt a chat template would build; the prefix cache works on its tokens."""
+    return "".join(f"<|{m['role']}|>\n{m['content']}\n" for m in messages)
+
+
+def chat_script(messages) -> str:
+    """stub_llm's default script over agent_core's system / user / assistant-history layout."""
+    user = next((m["content"] for m in messages if m["role"] == "user"), "")
+    history = messages[-1]["content"] if messages and messages[-1]["role"] == "assistant" else ""
+    return lookup_then_answer({"input": user, "history": history})
+
+
+class StubOllama:
+    """Per-model state: resident until its keep_alive lapses, plus the tokens in its KV cache."""
+
+    def __init__(self, prefill_ms: float = PREFILL_MS, decode_ms: float = DECODE_MS, load_s: float = LOAD_S,
+                 script=chat_script):
+        self.prefill_ms = prefill_ms
+        self.decode_ms = decode_ms
+        self.load_s = load_s
+        self.script = script
+        self._models = {}  # name -> {"until": monotonic deadline, "cache": [tokens]}
+        self._lock = threading.Lock()  # One sequence at a time, like a single Ollama slot
+        self.requests = 0
+
+    def _load(self, model: str) -> float:
+        state = self._models.get(model)
+        if state is not None and time.monotonic() < state["until"]:
+            return 0.0
+        time.sleep(self.load_s)
+        self._models[model] = {"until": float("inf"), "cache": []}
+        return self.load_s
+
+    def _keep(self, model: str, keep_alive):
+        seconds = keep_alive_seconds(keep_alive)
+        if seconds == 0:
+            self._models.pop(model, None)
+        else:
+            self._models[model]["until"] = time.monotonic() + seconds
+
+    def chat(self, body: dict):
+        """Yield (content chunk, final stats or None); the last item carries the stats."""
+        model, messages = body["model"], body.get("messages", [])
+        options = body.get("options", {})
+        with self._lock:
+            self.requests += 1
+            if not messages:  # Load / unload request
+                load = 0.0 if keep_alive_seconds(body.get("keep_alive")) == 0 else self._load(model)
+                if model in self._models:
+                    self._keep(model, body.get("keep_alive"))
+                yield "", {"done_reason": "unload" if model not in self._models else "load",
+                           "load_duration": int(load * 1e9)}
+                return
+            start = time.perf_counter()
+            load = self._load(model)
+            state = self._models[model]
+            tokens = tokenize(render(messages))
+            shared = 0
+            for a, b in zip(tokens, state["cache"]):
+                if a != b:
+                    break
+                shared += 1
+            shared = min(shared, len(tokens) - 1)  # The last prompt token is always evaluated
+            evaluated = len(tokens) - shared
+            prefill = evaluated * self.prefill_ms / 1e3
+            time.sleep(prefill)
+            state["cache"] = tokens
+
+            text = self.script(messages)
+            out = tokenize(text)
+            if options.get("num_predict", -1) >= 0:
+                out = out[:options["num_predict"]]
+                text = " ".join(out)
+            decode_start = time.perf_counter()
+            for i in range(0, len(out), CHUNK_TOKENS):
+                time.sleep(self.decode_ms * len(out[i:i + CHUNK_TOKENS]) / 1e3)
+                # Whole text in proportion; the exact split doesn't matter to clients
+                lo, hi = len(text) * i // max(len(out), 1), len(text) * min(i + CHUNK_TOKENS, len(out)) // max(len(out), 1)
+                yield text[lo:hi], None
+            self._keep(model, body.get("keep_alive"))
+            yield "", {"done_reason": "stop", "total_duration": int((time.perf_counter() - start) * 1e9),
+                       "load_duration": int(load * 1e9), "prompt_eval_count": evaluated,
+                       "prompt_eval_duration": int(prefill * 1e9), "eval_count": len(out),
+                       "eval_duration": int((time.perf_counter() - decode_start) * 1e9)}
+
+
+def make_handler(stub: StubOllama):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, payload, status=200):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._json({"models": [{"name": name} for name in stub._models]})
+            else:
+                self._json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if self.path != "/api/chat":
+                self._json({"error": "not found"}, 404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model = body.get("model", "")
+            if not body.get("stream", True):
+                parts, final = [], {}
+                for chunk, stats in stub.chat(body):
+                    parts.append(chunk)
+                    final = stats or final
+                self._json({"model": model, "message": {"role": "assistant", "content": "".join(parts)},
+                            "done": True, **final})
+                return
+            # Newline-delimited JSON, closed when done (HTTP/1.0, no Content-Length)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                for chunk, stats in stub.chat(body):
+                    event = {"model": model, "message": {"role": "assistant", "content": chunk},
+                             "done": stats is not None, **(stats or {})}
+                    self.wfile.write((json.dumps(event) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Client stopped the stream; so does the "model"
+
+    return Handler
+
+
+def serve(port: int = PORT, host: str = "127.0.0.1", **kwargs):
+    """(server, base URL) with the server running on a daemon thread; port 0 picks a free one."""
+    stub = StubOllama(**kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(stub))
+    server.stub = stub
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server with a simulated prefix cache")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--prefill-ms", type=float, default=PREFILL_MS)
+    parser.add_argument("--decode-ms", type=float, default=DECODE_MS)
+    parser.add_argument("--load-s", type=float, default=LOAD_S)
+    args = parser.parse_args()
+    server, url = serve(args.port, prefill_ms=args.prefill_ms, decode_ms=args.decode_ms, load_s=args.load_s)
+    print(f"🧪 Stub Ollama on {url} (prefill {args.prefill_ms} ms/token, decode {args.decode_ms} ms/token, "
+          f"load {args.load_s}s). Ctrl-C to stop.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# company_rag/synth_data.py
+# Chinook-shaped synthetic databases at a chosen scale, for bench_scale.py.
+# Rows: every table except the small lookup tables is copied `scale` times with
+# its integer keys shifted per copy, and copy c of a child points at copy
+# c % copies(parent) of each parent, so every foreign key still resolves and
+# invoice totals still match their lines. Tables: whole Chinook schemas are
+# cloned under department prefixes (Finance_Invoice -> Finance_Customer, ...)
+# until the database has `tables` tables.
+# Run from company_rag/:  python synth_data.py OUT.db [--scale 10] [--tables 110] [--clone-scale 1]
+import argparse
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from tools.sql_guard import quote
+
+DB_PATH = "../data/Chinook.db"
+DIMENSIONS = {"Genre", "MediaType", "Employee"}  # Lookup tables; never copied
+PREFIXES = ("Finance", "Marketing", "Support", "Warehouse", "Partner", "Archive", "Retail", "Wholesale",
+            "Licensing", "Events", "Studio", "Regional", "Legacy", "Mobile", "Streaming", "Physical")
+PRAGMAS = {"journal_mode": "OFF", "synchronous": "OFF", "cache_size": -262144}  # Bulk load; 256 MiB cache
+
+
+def source_schema(conn) -> list:
+    """[(table, create sql, [index sql], columns, integer pk or None, {column: parent})] parents first."""
+    tables = {}
+    for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' "
+                                  "AND name NOT LIKE 'sqlite_%' ORDER BY name"):
+        info = list(conn.execute(f"PRAGMA table_info({quote(name)})"))
+        pks = [row for row in info if row[5]]
+        int_pk = pks[0][1] if len(pks) == 1 and "INT" in pks[0][2].upper() else None
+        fks = {fk[3]: fk[2] for fk in conn.execute(f"PRAGMA foreign_key_list({quote(name)})")}
+        indexes = [r[0] for r in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' "
+                                              "AND tbl_name = ? AND sql IS NOT NULL", (name,))]
+        tables[name] = (name, sql, indexes, [row[1] for row in info], int_pk, fks)
+
+    ordered, seen = [], set()
+
+    def visit(name):
+        if name in seen:
+            return
+        seen.add(name)
+        for parent in tables[name][5].values():
+            if parent != name and parent in tables:
+                visit(parent)
+        ordered.append(tables[name])
+
+    for name in tables:
+        visit(name)
+    return ordered
+
+
+def rename(sql: str, names, prefix: str) -> str:
+    """`sql` with each bracketed/quoted table name (and index name) given `prefix`."""
+    if not prefix:
+        return sql
+    pattern = re.compile(r'([\["`])(%s|IFK_\w+)([\]"`])' % "|".join(map(re.escape, names)))
+    return pattern.sub(lambda m: f"{m.group(1)}{prefix}_{m.group(2)}{m.group(3)}", sql)
+
+
+def generate(out_path: str, scale: int = 1, tables: int = None, clone_scale: int = 1, src: str = DB_PATH) -> dict:
+    """Write a synthetic database to `out_path` (replaced if it exists); returns its stats."""
+    start = time.perf_counter()
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    src_uri = Path(src).resolve().as_uri() + "?mode=ro"
+    src_conn = sqlite3.connect(src_uri, uri=True)
+    try:
+        schema = source_schema(src_conn)
+    finally:
+        src_conn.close()
+    # uri=True so the ATTACH below may open the source with mode=ro
+    conn = sqlite3.connect(Path(out_path).resolve().as_uri(), uri=True)
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    conn.execute("ATTACH DATABASE ? AS src", (src_uri,))
+    names = [t[0] for t in schema]
+    spans = {name: conn.execute(f"SELECT COALESCE(MAX({quote(pk)}), 0) FROM src.{quote(name)}").fetchone()[0]
+             for name, _, _, _, pk, _ in schema if pk}
+
+    # Prefix "" is the Chinook schema itself; each further prefix adds one full clone family
+    target = tables or len(schema)
+    families = [""] + list(PREFIXES) + [f"{p}{n}" for n in range(2, 1000) for p in PREFIXES]
+    plan, n_tables = [], 0
+    for prefix in families:
+        if n_tables >= target:
+            break
+        # Parents come first, so cutting the last family short never leaves a dangling foreign key
+        family = schema[:target - n_tables]
+        plan.append((prefix, family))
+        n_tables += len(family)
+
+    rows = defaultdict(int)
+    indexes = []
+    with conn:
+        for prefix, family in plan:
+            copies_of = {name: 1 if name in DIMENSIONS else (scale if not prefix else clone_scale)
+                         for name in names}
+            for name, create, index_sql, columns, pk, fks in family:
+                table = f"{prefix}_{name}" if prefix else name
+                conn.execute(rename(create, names, prefix))
+                indexes += [rename(sql, names, prefix) for sql in index_sql]
+                copies = copies_of[name]
+                for c in range(copies):
+                    exprs = []
+                    for col in columns:
+                        if col == pk:
+                            exprs.append(f"{quote(col)} + {c * spans[name]}")
+                        elif col in fks and fks[col] in spans:
+                            parent = fks[col]
+                            exprs.append(f"{quote(col)} + {(c % copies_of[parent]) * spans[parent]}")
+                        else:
+                            exprs.append(quote(col))
+                    cur = conn.execute(f"INSERT INTO {quote(table)} ({', '.join(map(quote, columns))}) "
+                                       f"SELECT {', '.join(exprs)} FROM src.{quote(name)}")
+                    rows[table] += cur.rowcount
+        # Indexes after the data: one sorted build instead of row-by-row maintenance
+        for sql in indexes:
+            conn.execute(sql)
+    conn.execute("DETACH DATABASE src")
+    conn.execute("ANALYZE")  # extract.estimate_rows reads sqlite_stat1
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    return {"path": out_path, "scale": scale, "clone_scale": clone_scale, "tables": len(rows),
+            "rows": sum(rows.values()), "invoice_lines": rows.get("InvoiceLine", 0),
+            "bytes": os.path.getsize(out_path), "seconds": round(time.perf_counter() - start, 3)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a Chinook-shaped database at a larger scale")
+    parser.add_argument("out")
+    parser.add_argument("--src", default=DB_PATH)
+    parser.add_argument("--scale", type=int, default=10, help="Copies of every non-lookup Chinook table")
+    parser.add_argument("--tables", type=int, help="Total tables, cloning the schema under department prefixes")
+    parser.add_argument("--clone-scale", type=int, default=1, help="Copies of each cloned table's rows")
+    args = parser.parse_args()
+    stats = generate(args.out, args.scale, args.tables, args.clone_scale, args.src)
+    print(f"✅ {stats['tables']} tables, {stats['rows']:,} rows ({stats['invoice_lines']:,} invoice lines), "
+          f"{stats['bytes'] / 2 ** 20:.1f} MiB in {stats['seconds']:.2f}s → {stats['path']}")
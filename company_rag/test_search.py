@@ -1,11 +1,8 @@
 # company_rag/test_search.py
-import chromadb
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from tools.registry import REGISTRY
 
-# Load our vector DB
-ef = SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-client = chromadb.PersistentClient(path="chroma_db")
-collection = client.get_collection(name="company_schema", embedding_function=ef)
+# Load our vector DB (shared client + embedding service)
+retriever = REGISTRY.get("retriever")
 
 # Test searches
 test_questions = [
@@ -15,13 +12,11 @@ test_questions = [
     "products and inventory"
 ]
 
-for question in test_questions:
+# All questions in one embedding pass and one top-k
+batch = retriever.query_many(test_questions, n_results=2)  # Top 2 matches each
+
+for question, results in zip(test_questions, batch):
     print(f"\n🔍 Searching for: '{question}'")
-    results = collection.query(
-        query_texts=[question],
-        n_results=2  # Top 2 matches
-    )
-    
     for i, (doc, metadata) in enumerate(zip(results['documents'][0], results['metadatas'][0])):
         print(f"   {i+1}. Table: {metadata['table']}")
         print(f"      Preview: {doc[:100]}...")
\ No newline at end of file
@@ -0,0 +1,175 @@
+# company_rag/tools/answer_cache.py
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from tools.sql_templates import SLOT_SOURCES, value_pattern, vocabulary
+
+THRESHOLD = 0.92  # Cosine similarity needed to reuse an answer
+MAX_ENTRIES = 256
+TTL = 3600.0  # Seconds
+
+# Numbers and quoted strings must match exactly: "sales in 2023" and
+# "sales in 2024" embed almost identically but need different answers.
+_LITERAL_RE = re.compile(r"\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"")
+# So must named database values: "sales in Germany" and "sales in France"
+# embed just as closely. Slot -> (SQL listing its values, aliases)
+ENTITY_SOURCES = {**SLOT_SOURCES, "artist": ("SELECT Name FROM Artist", None)}
+
+
+def literals(question: str) -> frozenset:
+    return frozenset(_LITERAL_RE.findall(question.lower()))
+
+
+class EntityExtractor:
+    """Database values a question names (countries, genres, artists), as sql_templates spots its slots."""
+
+    def __init__(self, conn, sources=ENTITY_SOURCES):
+        # Artist names are not split into parts: "Earth, Wind & Fire" is not "fire"
+        self.vocab = {slot: vocabulary(conn, sql, aliases, parts=slot != "artist")
+                      for slot, (sql, aliases) in sources.items()}
+        self._patterns = {slot: value_pattern(values) for slot, values in self.vocab.items() if values}
+
+    def __call__(self, question: str) -> frozenset:
+        q = question.lower()
+        return frozenset((slot, self.vocab[slot][m.group()])
+                         for slot, pattern in self._patterns.items() for m in pattern.finditer(q))
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    sql: str
+    data: str
+    latency: float  # Seconds the original turn took
+    created: float
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    """LRU cache of final agent answers, looked up by question embedding.
+
+    A hit needs cosine >= threshold, identical literals and, with
+    `entities_fn` (an EntityExtractor), the same named database values. The
+    whole cache is dropped when `stamp_fn` (tools.sql_tool.data_stamp)
+    reports that the database changed.
+    """
+
+    def __init__(self, embedder, threshold: float = THRESHOLD, max_entries: int = MAX_ENTRIES,
+                 ttl: float = TTL, stamp_fn=None, entities_fn=None):
+        self.embedder = embedder
+        self.entities_fn = entities_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stamp_fn = stamp_fn
+        self._entries = OrderedDict()  # key -> CachedAnswer
+        self._vectors = {}  # key -> unit vector
+        self._guards = {}  # key -> literals and entities that must match exactly
+        self._matrix = None  # (keys, matrix) snapshot, rebuilt after writes
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._next_key = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.latency_saved = 0.0
+        self.lookup_time = 0.0
+
+    def _check_stamp(self, stamp):
+        if stamp != self._stamp:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+                self._vectors.clear()
+                self._guards.clear()
+                self._matrix = None
+            self._stamp = stamp
+
+    def _snapshot(self):
+        if self._matrix is None and self._entries:
+            keys = list(self._entries)
+            self._matrix = (keys, np.stack([self._vectors[k] for k in keys]))
+        return self._matrix
+
+    def guard(self, question: str) -> frozenset:
+        """What must be identical for two questions to share an answer."""
+        entities = self.entities_fn(question) if self.entities_fn else frozenset()
+        return literals(question) | entities
+
+    def lookup(self, question: str):
+        """Return (CachedAnswer, similarity) for a close enough prior question, else None."""
+        start = time.perf_counter()
+        stamp = self.stamp_fn() if self.stamp_fn else None
+        vec = self.embedder.embed_one(question)
+        wanted = self.guard(question)
+        now = time.time()
+        with self._lock:
+            self._check_stamp(stamp)
+            snapshot = self._snapshot()
+            best = None
+            if snapshot is not None:
+                keys, matrix = snapshot
+                scores = matrix @ vec
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    entry = self._entries[keys[i]]
+                    if now - entry.created > self.ttl or self._guards[keys[i]] != wanted:
+                        continue
+                    best = (keys[i], entry, float(scores[i]))
+                    break
+            self.lookup_time += time.perf_counter() - start
+            if best is None:
+                self.misses += 1
+                return None
+            key, entry, score = best
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self.hits += 1
+            self.latency_saved += entry.latency
+            return entry, score
+
+    def store(self, question: str, answer: str, sql: str = None, data: str = None,
+              latency: float = 0.0, stamp=None):
+        """Remember a final answer. Pass the stamp taken before the turn ran SQL."""
+        vec = self.embedder.embed_one(question)
+        guard = self.guard(question)
+        current = self.current_stamp()
+        with self._lock:
+            self._check_stamp(current)
+            if self.stamp_fn is not None and stamp != current:
+                return  # Data changed while the turn was running
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = CachedAnswer(question, answer, sql, data, latency, time.time())
+            self._vectors[key] = np.asarray(vec, dtype=np.float32)
+            self._guards[key] = guard
+            while len(self._entries) > self.max_entries:
+                old, _ = self._entries.popitem(last=False)
+                del self._vectors[old]
+                del self._guards[old]
+                self.evictions += 1
+            self._matrix = None
+
+    def current_stamp(self):
+        return self.stamp_fn() if self.stamp_fn else None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "latency_saved_s": round(self.latency_saved, 3),
+            "avg_lookup_ms": round(self.lookup_time / lookups * 1e3, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,225 @@
+# company_rag/tools/embeddings.py
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from tools.tracing import span
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+BATCH_SIZE = 64
+CACHE_DIR = ".embedding_cache"  # Relative to company_rag/, like chroma_db/
+
+
+# === ON-DISK CACHE ===
+class EmbeddingStore:
+    """Append-only float32 vectors on disk, keyed by (model, text hash).
+
+    Vectors live in one flat `vectors.f32` file read through np.memmap; the
+    key -> row map lives in SQLite so several processes can share the store.
+    Appends take SQLite's write lock (BEGIN IMMEDIATE), which also serializes
+    writes to the vector file.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dim: int = None):
+        safe_model = model_name.replace("/", "__")
+        self.dir = os.path.join(cache_dir, safe_model)
+        os.makedirs(self.dir, exist_ok=True)
+        self.vec_path = os.path.join(self.dir, "vectors.f32")
+        self.index = sqlite3.connect(os.path.join(self.dir, "index.sqlite3"),
+                                     check_same_thread=False, isolation_level=None)
+        self.index.execute("PRAGMA journal_mode = WAL")
+        self.index.execute("CREATE TABLE IF NOT EXISTS vec (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self.index.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        row = self.index.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        if row is None:
+            if dim is None:
+                raise LookupError(f"No embedding store for {model_name} in {cache_dir}")
+            self.index.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dim', ?)", (dim,))
+            row = (dim,)
+        self.dim = row[0]
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._mmap_rows = 0
+
+    def _rows_on_disk(self) -> int:
+        try:
+            return os.path.getsize(self.vec_path) // (4 * self.dim)
+        except OSError:
+            return 0
+
+    def _view(self, needed_row: int):
+        # Remap only when another writer (or we) grew the file past the current map
+        if self._mmap is None or needed_row >= self._mmap_rows:
+            rows = self._rows_on_disk()
+            self._mmap = np.memmap(self.vec_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) \
+                if rows else None
+            self._mmap_rows = rows
+        return self._mmap
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys already stored."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):  # SQLite host-parameter limit
+                batch = keys[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self.index.execute(f"SELECT key, row FROM vec WHERE key IN ({marks})", batch).fetchall()
+                if not rows:
+                    continue
+                view = self._view(max(r for _, r in rows))
+                for key, row in rows:
+                    found[key] = np.array(view[row])
+        return found
+
+    def put_many(self, items):
+        """Append (key, vector) pairs; keys stored concurrently elsewhere are skipped."""
+        if not items:
+            return
+        with self._lock:
+            self.index.execute("BEGIN IMMEDIATE")
+            try:
+                keys = [k for k, _ in items]
+                have = set()
+                for start in range(0, len(keys), 500):
+                    batch = keys[start:start + 500]
+                    marks = ",".join("?" * len(batch))
+                    have.update(k for (k,) in self.index.execute(
+                        f"SELECT key FROM vec WHERE key IN ({marks})", batch))
+                fresh = [(k, v) for k, v in items if k not in have]
+                if fresh:
+                    first = self._rows_on_disk()
+                    if os.path.exists(self.vec_path):
+                        # Drop any torn tail left by a crashed writer so rows stay aligned
+                        os.truncate(self.vec_path, first * 4 * self.dim)
+                    with open(self.vec_path, "ab") as f:
+                        f.write(np.stack([v for _, v in fresh]).astype(np.float32).tobytes())
+                    self.index.executemany("INSERT INTO vec (key, row) VALUES (?, ?)",
+                                           [(k, first + i) for i, (k, _) in enumerate(fresh)])
+                self.index.execute("COMMIT")
+            except Exception:
+                self.index.execute("ROLLBACK")
+                raise
+
+    def __len__(self):
+        return self.index.execute("SELECT COUNT(*) FROM vec").fetchone()[0]
+
+
+# === SERVICE ===
+class EmbeddingService:
+    """One shared MiniLM encoder with batching, normalization and a persistent cache."""
+
+    def __init__(self, model_name: str = MODEL_NAME, batch_size: int = BATCH_SIZE,
+                 cache_dir: str = CACHE_DIR):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_dir = cache_dir
+        self._model = None
+        self._store = None
+        self._lock = threading.RLock()
+        self.encoded = 0
+        self.cache_hits = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def store(self) -> EmbeddingStore:
+        if self._store is None and self.cache_dir:
+            with self._lock:
+                if self._store is None:
+                    try:
+                        # Reuse an existing store without loading the model just for its dim
+                        self._store = EmbeddingStore(self.cache_dir, self.model_name)
+                    except LookupError:
+                        dim = self.model.get_sentence_embedding_dimension()
+                        self._store = EmbeddingStore(self.cache_dir, self.model_name, dim)
+        return self._store
+
+    @property
+    def dim(self) -> int:
+        if self.store is not None:
+            return self.store.dim
+        return self.model.get_sentence_embedding_dimension()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _encode(self, texts):
+        vecs = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                 normalize_embeddings=True, show_progress_bar=False)
+        self.encoded += len(texts)
+        return vecs.astype(np.float32, copy=False)
+
+    def embed(self, texts) -> np.ndarray:
+        """Embed `texts` as an (n, dim) float32 matrix of unit vectors.
+
+        Duplicates within the call and texts seen before (in any process
+        sharing the cache dir) are never re-encoded.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        with span("embedding", texts=len(texts)) as sp:
+            keys = [self.key(t) for t in texts]
+            cached = self.store.get_many(list(set(keys))) if self.store is not None else {}
+            hits = sum(1 for k in keys if k in cached)
+            self.cache_hits += hits
+
+            missing = {}
+            for k, t in zip(keys, texts):
+                if k not in cached and k not in missing:
+                    missing[k] = t
+            if missing:
+                miss_keys = list(missing)
+                vecs = self._encode([missing[k] for k in miss_keys])
+                new = list(zip(miss_keys, vecs))
+                if self.store is not None:
+                    self.store.put_many(new)
+                cached.update(new)
+            sp.set(cache_hits=hits, encoded=len(missing))
+            return np.stack([cached[k] for k in keys])
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    def stats(self) -> dict:
+        return {"model": self.model_name, "encoded": self.encoded, "cache_hits": self.cache_hits,
+                "stored": len(self.store) if self.store is not None else 0}
+
+
+# === ADAPTERS ===
+class ChromaEmbeddingFunction:
+    """Chroma `embedding_function` backed by the shared service."""
+
+    def __init__(self, service: "EmbeddingService" = None):
+        self.service = service or get_service()
+
+    def __call__(self, input):
+        return [v.tolist() for v in self.service.embed(input)]
+
+    def name(self) -> str:
+        return "sentence_transformer"  # Same vectors as Chroma's own MiniLM function
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> EmbeddingService:
+    """Process-wide embedding service (the model is loaded on first embed)."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = EmbeddingService(
+                    batch_size=int(os.environ.get("EMBED_BATCH_SIZE", BATCH_SIZE)))
+    return _service
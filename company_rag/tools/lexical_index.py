@@ -0,0 +1,128 @@
+# company_rag/tools/lexical_index.py
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+from collections import Counter
+
+INDEX_PATH = "schema_bm25.idx"
+MAGIC = b"BM25IDX1"
+K1 = 1.2
+B = 0.75
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9]*|\d+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_POSTING = struct.Struct("<II")  # (doc, term frequency)
+
+
+def tokenize(text: str):
+    """Lowercased words; CamelCase identifiers also yield their parts (InvoiceDate -> invoicedate, invoice, date)."""
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        lower = word.lower()
+        tokens.append(lower)
+        parts = _CAMEL_RE.findall(word)
+        if len(parts) > 1:
+            tokens.extend(p.lower() for p in parts)
+    return tokens
+
+
+def build(chunks, path: str = INDEX_PATH) -> int:
+    """Write a BM25 index over table names, column names and sample values.
+
+    Layout: MAGIC, u32 header length, JSON header (docs, lengths, vocabulary
+    with posting offsets), then fixed-width (doc, tf) postings that search()
+    reads straight out of the mmap.
+    """
+    docs, lengths, postings = [], [], {}
+    for doc, chunk in enumerate(chunks):
+        counts = Counter(tokenize(chunk["text"]))
+        docs.append({"table": chunk["table"]})
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    vocab, blob, offset = {}, bytearray(), 0
+    for term in sorted(postings):
+        entries = postings[term]
+        vocab[term] = [offset, len(entries)]
+        for doc, tf in entries:
+            blob += _POSTING.pack(doc, tf)
+        offset += len(entries) * _POSTING.size
+
+    header = json.dumps({
+        "docs": docs,
+        "lengths": lengths,
+        "avgdl": sum(lengths) / len(lengths) if lengths else 0.0,
+        "vocab": vocab,
+    }).encode("utf-8")
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        f.write(blob)
+    os.replace(path + ".tmp", path)
+    return len(docs)
+
+
+class LexicalIndex:
+    """Read-only BM25 index over schema chunks, postings served from an mmap."""
+
+    def __init__(self, path: str = INDEX_PATH, k1: float = K1, b: float = B):
+        self.k1, self.b = k1, b
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a BM25 index")
+        (header_len,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mm[start:start + header_len])
+        self._base = start + header_len
+        self.tables = [d["table"] for d in header["docs"]]
+        self.lengths = header["lengths"]
+        self.avgdl = header["avgdl"] or 1.0
+        self.vocab = header["vocab"]
+        n = len(self.tables)
+        self.idf = {t: math.log((n - df + 0.5) / (df + 0.5) + 1.0) for t, (_, df) in self.vocab.items()}
+
+    def __len__(self):
+        return len(self.tables)
+
+    def search(self, query: str, k: int = 3):
+        """[(table, score), ...] best first."""
+        scores = {}
+        k1, b, avgdl = self.k1, self.b, self.avgdl
+        for term in set(tokenize(query)):
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            idf = self.idf[term]
+            start = self._base + offset
+            for doc, tf in _POSTING.iter_unpack(self._mm[start:start + df * _POSTING.size]):
+                norm = tf + k1 * (1 - b + b * self.lengths[doc] / avgdl)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / norm
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.tables[doc], score) for doc, score in best]
+
+    def close(self):
+        self._mm.close()
+
+
+def load_index(path: str = INDEX_PATH):
+    """The saved index, or None if extract.py has not produced one yet."""
+    if not os.path.exists(path):
+        return None
+    return LexicalIndex(path)
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """Fuse several best-first lists of keys: score = sum of 1 / (k + rank)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=fused.get, reverse=True)
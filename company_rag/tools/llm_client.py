@@ -0,0 +1,352 @@
+# company_rag/tools/llm_client.py
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from dataclasses import asdict, dataclass
+
+from tools.tracing import TRACER
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")  # Keep the model (and its KV cache) resident between calls
+CACHE_PATH = ".llm_cache.db"  # Relative to the working directory, like .embedding_cache/
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_MAX_ENTRIES = 10_000
+TIMEOUT = 300.0
+CHARS_PER_TOKEN = 4  # Same rough estimate as agent_context
+MIN_RATE_TOKENS = 32  # Calls prefilling fewer tokens say little about the per-token prefill rate
+MIN_LOAD_S = 0.05  # Shorter load_durations are a model that was already resident
+
+_DONE = object()
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    cached: bool = False  # Served from the on-disk response cache
+    prompt_tokens: int = 0  # Whole prompt (estimated from its length)
+    evaluated_tokens: int = 0  # Tokens Ollama actually prefilled; the rest came from its prefix cache
+    prefill_s: float = 0.0
+    prefill_saved_s: float = 0.0  # Estimated prefill avoided, by the prefix cache or a cached response
+    load_s: float = 0.0  # Model (re)load; nonzero means keep_alive lapsed
+    eval_tokens: int = 0
+    eval_s: float = 0.0
+    total_s: float = 0.0
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def chat_messages(system: str, user: str, history: str = "") -> list:
+    """Messages in prefix-stable order: static system block, then the question, then history.
+
+    Nothing per-call (timestamps, ids, counters) may go in `system`, and
+    history should only grow at the end, so consecutive calls share the
+    longest possible byte-identical prefix and Ollama can reuse its KV cache.
+    """
+    messages = [{"role": "system", "content": system}, {"role": "user", "content": user}]
+    if history:
+        messages.append({"role": "assistant", "content": history})
+    return messages
+
+
+def cache_key(model: str, messages: list, options: dict) -> str:
+    payload = json.dumps({"model": model, "messages": messages, "options": options},
+                         sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# === RESPONSE CACHE ===
+class ResponseCache:
+    """Completed temperature-0 responses in SQLite, evicted least recently used first.
+
+    Bounded both by entry count and by total response bytes; safe to share
+    between threads and processes (SQLite does the locking).
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES,
+                 max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        conn = self._conn()
+        conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, model TEXT, response TEXT, meta TEXT,
+            size INTEGER, created REAL, used REAL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_used ON responses (used)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def get(self, key: str):
+        """(text, meta dict) or None."""
+        conn = self._conn()
+        row = conn.execute("SELECT response, meta FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        conn.execute("UPDATE responses SET used = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def put(self, key: str, model: str, text: str, meta: dict):
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, model, text, json.dumps(meta), len(text.encode("utf-8")), now, now))
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            while count > self.max_entries or size > self.max_bytes:
+                row = conn.execute("SELECT key, size FROM responses ORDER BY used LIMIT 1").fetchone()
+                if row is None or row[0] == key:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+                count, size = count - 1, size - row[1]
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        count, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {"entries": count, "bytes": size, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0, "evictions": self.evictions}
+
+
+# === CLIENT ===
+class LLMClient:
+    """Ollama /api/chat over plain HTTP, with keep_alive on every call and a response cache.
+
+    Responses are cached only when the call is deterministic (temperature 0)
+    and only once Ollama reports the generation finished, so a stream the
+    caller stopped early is never stored. Ollama's prompt_eval_count counts
+    only the tokens it had to prefill; the difference from the prompt's
+    length, times the per-token prefill rate seen on uncached calls, is
+    reported as prefill time saved.
+    """
+
+    def __init__(self, model: str, host: str = OLLAMA_HOST, keep_alive=KEEP_ALIVE, temperature: float = 0.0,
+                 options: dict = None, cache: ResponseCache = None, use_cache: bool = True,
+                 timeout: float = TIMEOUT):
+        self.model = model
+        self.host = host.rstrip("/")
+        self.keep_alive = keep_alive
+        self.options = {"temperature": temperature, **(options or {})}
+        self.use_cache = use_cache
+        self._cache = cache
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._rate = None  # Seconds per prefilled token (moving average)
+        self.totals = {"calls": 0, "cached": 0, "prompt_tokens": 0, "evaluated_tokens": 0,
+                       "prefill_s": 0.0, "prefill_saved_s": 0.0, "load_s": 0.0, "loads": 0}
+
+    @property
+    def cache(self) -> ResponseCache:
+        if self._cache is None and self.use_cache:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = ResponseCache()
+        return self._cache
+
+    # === HTTP ===
+    def _post(self, path: str, body: dict):
+        request = urllib.request.Request(f"{self.host}{path}", data=json.dumps(body).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def _body(self, messages, options, stream: bool) -> dict:
+        return {"model": self.model, "messages": messages, "stream": stream,
+                "keep_alive": self.keep_alive, "options": options}
+
+    def _cacheable(self, options) -> bool:
+        return self.use_cache and options.get("temperature", 0.8) == 0  # Ollama's default is 0.8
+
+    # === ACCOUNTING ===
+    def _account(self, text: str, messages, final: dict, started: float, streamed: bool,
+                 cached: bool = False, saved_total: float = 0.0):
+        """LLMResponse for a finished call, added to the totals and traced as an "ollama" span."""
+        prompt_tokens = estimate_tokens("".join(m["content"] for m in messages))
+        response = LLMResponse(text, cached=cached, prompt_tokens=prompt_tokens)
+        if cached:
+            # The whole original call is saved, prefill included
+            response.prefill_saved_s = saved_total
+        else:
+            ns = 1e-9
+            response.evaluated_tokens = final.get("prompt_eval_count", 0)  # Absent when fully cached
+            response.prefill_s = final.get("prompt_eval_duration", 0) * ns
+            response.load_s = final.get("load_duration", 0) * ns
+            response.eval_tokens = final.get("eval_count", 0)
+            response.eval_s = final.get("eval_duration", 0) * ns
+            response.total_s = final.get("total_duration", 0) * ns
+            with self._lock:
+                if response.evaluated_tokens >= MIN_RATE_TOKENS and response.prefill_s:
+                    rate = response.prefill_s / response.evaluated_tokens
+                    self._rate = rate if self._rate is None else 0.8 * self._rate + 0.2 * rate
+                reused = max(prompt_tokens - response.evaluated_tokens, 0)
+                response.prefill_saved_s = reused * (self._rate or 0.0)
+        with self._lock:
+            t = self.totals
+            t["calls"] += 1
+            t["cached"] += cached
+            t["prompt_tokens"] += response.prompt_tokens
+            t["evaluated_tokens"] += response.evaluated_tokens
+            t["prefill_s"] += response.prefill_s
+            t["prefill_saved_s"] += response.prefill_saved_s
+            t["load_s"] += response.load_s
+            t["loads"] += response.load_s >= MIN_LOAD_S
+        TRACER.record("ollama", time.perf_counter() - started, streamed=streamed, cached=response.cached,
+                      prompt_tokens=response.prompt_tokens, evaluated_tokens=response.evaluated_tokens,
+                      prefill_ms=round(response.prefill_s * 1e3, 3),
+                      prefill_saved_ms=round(response.prefill_saved_s * 1e3, 3),
+                      load_ms=round(response.load_s * 1e3, 3))
+        return response
+
+    # === CALLS ===
+    def chat(self, messages: list, use_cache: bool = True, **options) -> LLMResponse:
+        """One non-streamed completion."""
+        options = {**self.options, **options}
+        started = time.perf_counter()
+        key = cache_key(self.model, messages, options) if use_cache and self._cacheable(options) else None
+        hit = self.cache.get(key) if key else None
+        if hit is not None:
+            return self._account(hit[0], messages, {}, started, False, cached=True,
+                                 saved_total=hit[1].get("total_s", 0.0))
+        with self._post("/api/chat", self._body(messages, options, stream=False)) as http:
+            final = json.loads(http.read())
+        response = self._account(final["message"]["content"], messages, final, started, False)
+        if key and final.get("done", True):
+            self.cache.put(key, self.model, response.text, asdict(response))
+        return response
+
+    def stream(self, messages: list, stop: threading.Event = None, on_done=None, **options):
+        """Yield content chunks as Ollama generates them.
+
+        Set `stop` to abandon the generation (the HTTP response is closed,
+        which makes Ollama stop); `on_done(LLMResponse)` is called only if the
+        stream ran to completion.
+        """
+        options = {**self.options, **options}
+        started = time.perf_counter()
+        key = cache_key(self.model, messages, options) if self._cacheable(options) else None
+        hit = self.cache.get(key) if key else None
+        if hit is not None:
+            yield hit[0]
+            response = self._account(hit[0], messages, {}, started, True, cached=True,
+                                     saved_total=hit[1].get("total_s", 0.0))
+            if on_done:
+                on_done(response)
+            return
+        parts = []
+        with self._post("/api/chat", self._body(messages, options, stream=True)) as http:
+            for line in http:
+                if stop is not None and stop.is_set():
+                    return
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if "error" in event:
+                    raise RuntimeError(f"Ollama: {event['error']}")
+                chunk = event.get("message", {}).get("content", "")
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+                if event.get("done"):
+                    response = self._account("".join(parts), messages, event, started, True)
+                    if key:
+                        self.cache.put(key, self.model, response.text, asdict(response))
+                    if on_done:
+                        on_done(response)
+                    return
+
+    def warm(self, system: str = None) -> LLMResponse:
+        """Load the model for `keep_alive` and, given the static system block, prefill it
+        so the first real call only evaluates what follows."""
+        if system is None:
+            with self._post("/api/chat", {"model": self.model, "messages": [], "keep_alive": self.keep_alive}) as http:
+                http.read()
+            return None
+        return self.chat([{"role": "system", "content": system}], use_cache=False, num_predict=1)
+
+    def unload(self):
+        with self._post("/api/chat", {"model": self.model, "messages": [], "keep_alive": 0}) as http:
+            http.read()
+
+    def stats(self) -> dict:
+        with self._lock:
+            t = dict(self.totals)
+        calls = t["calls"]
+        t["prefill_saved_ms_per_call"] = round(t["prefill_saved_s"] / calls * 1e3, 3) if calls else 0.0
+        # prompt_tokens is an estimate, so clamp: tiny prompts can evaluate more than estimated
+        reuse = 1 - t["evaluated_tokens"] / t["prompt_tokens"] if t["prompt_tokens"] else 0.0
+        t["prefix_reuse"] = round(max(reuse, 0.0), 4)
+        t["ms_per_prefill_token"] = round(self._rate * 1e3, 4) if self._rate else None
+        if self._cache is not None:
+            t["response_cache"] = self._cache.stats()
+        return t
+
+
+# === CHAIN ADAPTER ===
+class OllamaChain:
+    """The {"input", "history"} -> text chain agent_core expects (ainvoke/astream),
+    laid out with chat_messages() around a fixed system prompt."""
+
+    def __init__(self, client: LLMClient, system: str):
+        self.client = client
+        self.system = system
+
+    def messages(self, inputs: dict) -> list:
+        return chat_messages(self.system, inputs["input"], inputs.get("history", ""))
+
+    async def ainvoke(self, inputs: dict) -> str:
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()  # The "ollama" span nests under the caller's llm_call
+        response = await loop.run_in_executor(None, ctx.run, self.client.chat, self.messages(inputs))
+        return response.text
+
+    async def astream(self, inputs: dict):
+        """Chunks from a worker thread; closing the generator stops the HTTP stream."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        messages = self.messages(inputs)
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                stop.set()  # Event loop already closed
+
+        def produce():
+            try:
+                for chunk in self.client.stream(messages, stop=stop):
+                    put(chunk)
+            except Exception as e:
+                put(e)
+            finally:
+                put(_DONE)
+
+        loop.run_in_executor(None, contextvars.copy_context().run, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
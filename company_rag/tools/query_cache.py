@@ -0,0 +1,196 @@
+# company_rag/tools/query_cache.py
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# === SQL CANONICALIZATION ===
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<ident>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<param>[?:@$][A-Za-z0-9_]*)
+  | (?P<op><=|>=|<>|!=|==|\|\||<<|>>|.)
+""", re.VERBOSE | re.DOTALL)
+
+# Words that end a select list when no FROM follows
+_SELECT_LIST_END = {"FROM", "WHERE", "GROUP", "HAVING", "WINDOW", "ORDER", "LIMIT",
+                    "UNION", "INTERSECT", "EXCEPT"}
+
+# SQLite keywords; only these are case-folded. Identifiers keep their case, since
+# some of them name result columns (WITH t(Name) AS ...).
+KEYWORDS = set("""
+ABORT ACTION ADD AFTER ALL ALTER ALWAYS ANALYZE AND AS ASC ATTACH AUTOINCREMENT BEFORE BEGIN BETWEEN BY
+CASCADE CASE CAST CHECK COLLATE COLUMN COMMIT CONFLICT CONSTRAINT CREATE CROSS CURRENT CURRENT_DATE
+CURRENT_TIME CURRENT_TIMESTAMP DATABASE DEFAULT DEFERRABLE DEFERRED DELETE DESC DETACH DISTINCT DO DROP
+EACH ELSE END ESCAPE EXCEPT EXCLUDE EXCLUSIVE EXISTS EXPLAIN FAIL FILTER FIRST FOLLOWING FOR FOREIGN FROM
+FULL GENERATED GLOB GROUP GROUPS HAVING IF IGNORE IMMEDIATE IN INDEX INDEXED INITIALLY INNER INSERT
+INSTEAD INTERSECT INTO IS ISNULL JOIN KEY LAST LEFT LIKE LIMIT MATCH MATERIALIZED NATURAL NO NOT NOTHING
+NOTNULL NULL NULLS OF OFFSET ON OR ORDER OTHERS OUTER OVER PARTITION PLAN PRAGMA PRECEDING PRIMARY QUERY
+RAISE RANGE RECURSIVE REFERENCES REGEXP REINDEX RELEASE RENAME REPLACE RESTRICT RETURNING RIGHT ROLLBACK
+ROW ROWS SAVEPOINT SELECT SET TABLE TEMP TEMPORARY THEN TIES TO TRANSACTION TRIGGER UNBOUNDED UNION
+UNIQUE UPDATE USING VACUUM VALUES VIEW VIRTUAL WHEN WHERE WINDOW WITH WITHOUT
+""".split())
+
+
+def tokenize(sql: str):
+    """Yield (kind, text, start, end) for every SQL token, skipping whitespace and comments."""
+    for m in _TOKEN_RE.finditer(sql):
+        kind = m.lastgroup
+        if kind in ("ws", "comment"):
+            continue
+        yield kind, m.group(), m.start(), m.end()
+
+
+def _canonical_number(text: str) -> str:
+    # INTEGER and REAL stay distinct (5/2 != 5/2.0 in SQLite)
+    if text[:2] in ("0x", "0X"):
+        return str(int(text, 16))
+    if any(c in text for c in ".eE"):
+        return repr(float(text))
+    return str(int(text))
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonical cache key for `sql`.
+
+    Whitespace and comments are dropped, keywords are case-folded and
+    numeric literals are rewritten in one canonical form. String literals and
+    identifiers keep their case. The items of every select list, top-level or
+    in a CTE or subquery, are kept as their exact source text, because SQLite
+    names unaliased result columns after that text (`SUM(Total)` and
+    `sum( Total )` return different keys) and outer queries pass those names
+    on (`SELECT * FROM (SELECT Name ...)`).
+    """
+    tokens = list(tokenize(sql))
+    while tokens and tokens[-1][1] == ";":
+        tokens.pop()
+
+    out = []
+    depth = 0
+    select_depth = None  # Paren depth of the select list being read
+    item_start = item_end = None
+
+    for kind, text, start, end in tokens:
+        upper = text.upper() if kind == "word" else None
+
+        if select_depth is not None:
+            if depth == select_depth and (upper in _SELECT_LIST_END or text in (",", ")")):
+                if item_start is not None:
+                    out.append(sql[item_start:item_end])
+                item_start = item_end = None
+                if text == ",":
+                    out.append(",")
+                    continue
+                select_depth = None  # Falls through: FROM, ")" ... are ordinary tokens
+            else:
+                # Scalar subqueries inside an item are part of its verbatim text
+                if text == "(":
+                    depth += 1
+                elif text == ")":
+                    depth -= 1
+                if item_start is None and upper in ("DISTINCT", "ALL"):
+                    out.append(upper.lower())
+                else:
+                    if item_start is None:
+                        item_start = start
+                    item_end = end
+                continue
+
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+
+        if kind == "word":
+            out.append(text.lower() if upper in KEYWORDS else text)
+            if upper == "SELECT":
+                select_depth = depth
+        elif kind == "number":
+            out.append(_canonical_number(text))
+        else:
+            out.append(text)
+
+    if select_depth is not None and item_start is not None:
+        out.append(sql[item_start:item_end])
+    return " ".join(out)
+
+
+# === RESULT CACHE ===
+class QueryCache:
+    """Bounded LRU + TTL cache for query results.
+
+    `stamp_fn` returns a value that changes whenever the underlying data may
+    have changed; the whole cache is dropped the first time a new stamp is seen.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0, stamp_fn=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stamp_fn = stamp_fn
+        self._entries = OrderedDict()
+        self._stamp = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_stamp(self, stamp):
+        # Caller holds the lock
+        if stamp != self._stamp:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._stamp = stamp
+
+    def get(self, key):
+        """Return the cached value or None, plus the data stamp seen by this lookup."""
+        stamp = self.stamp_fn() if self.stamp_fn else None
+        with self._lock:
+            self._check_stamp(stamp)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, stamp
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None, stamp
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value, stamp
+
+    def put(self, key, value, stamp=None):
+        """Store `value`; pass the stamp returned by get() so results computed
+        against data that changed in the meantime are dropped."""
+        with self._lock:
+            if self.stamp_fn is not None and stamp != self._stamp:
+                return
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
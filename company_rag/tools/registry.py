@@ -0,0 +1,136 @@
+# company_rag/tools/registry.py
+import threading
+import time
+
+from tools.tracing import span
+
+CHROMA_PATH = "chroma_db"
+COLLECTION = "company_schema"
+
+_MISSING = object()
+
+
+class Registry:
+    """Named, process-wide resources built on first use.
+
+    Each factory runs once, on the first get() or in a prewarm() thread,
+    under a per-name lock, so a caller that arrives mid-load waits for that
+    instance instead of loading a second copy. Factories may get() other
+    resources (the collection needs the embedding service, and so on).
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._values = {}
+        self._locks = {}
+        self.timings = {}  # name -> seconds its factory took
+        self.errors = {}  # name -> last prewarm failure
+
+    def register(self, name: str, factory):
+        """Add or replace a factory. An already built value is kept."""
+        self._factories[name] = factory
+        self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str):
+        value = self._values.get(name, _MISSING)
+        if value is not _MISSING:
+            return value
+        if name not in self._factories:
+            raise KeyError(f"No resource registered as {name!r}")
+        with self._locks[name]:
+            value = self._values.get(name, _MISSING)
+            if value is not _MISSING:
+                return value
+            start = time.perf_counter()
+            with span("registry_init", resource=name):
+                value = self._factories[name]()
+            self.timings[name] = time.perf_counter() - start
+            self._values[name] = value
+            self.errors.pop(name, None)
+            return value
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._factories
+
+    def ready(self, name: str) -> bool:
+        return name in self._values
+
+    def lazy(self, name: str) -> "LazyResource":
+        return LazyResource(self, name)
+
+    def prewarm(self, *names) -> threading.Thread:
+        """Build `names` in order on a daemon thread; failures land in `errors` and retry on get()."""
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    self.errors[name] = f"{type(e).__name__}: {e}"
+
+        thread = threading.Thread(target=run, name="prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def reset(self, name: str = None):
+        """Forget built values (all, or one) so the next get() rebuilds them."""
+        if name is None:
+            self._values.clear()
+        else:
+            self._values.pop(name, None)
+
+
+class LazyResource:
+    """Stand-in for a registry resource; the first attribute access builds it."""
+
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry: Registry, name: str):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self):
+        state = "ready" if self._registry.ready(self._name) else "not loaded"
+        return f"<LazyResource {self._name!r} ({state})>"
+
+
+# === DEFAULT RESOURCES ===
+# Heavy imports (sentence-transformers, chromadb) happen inside the factories,
+# so importing this module costs nothing until a resource is actually used.
+def _embeddings():
+    from tools.embeddings import get_service
+    return get_service()
+
+
+def _embedding_model():
+    return REGISTRY.get("embeddings").model
+
+
+def _chroma_client():
+    import chromadb
+    return chromadb.PersistentClient(path=CHROMA_PATH)
+
+
+def _schema_collection():
+    from tools.embeddings import ChromaEmbeddingFunction
+    return REGISTRY.get("chroma_client").get_collection(
+        COLLECTION, embedding_function=ChromaEmbeddingFunction(REGISTRY.get("embeddings")))
+
+
+def _retriever():
+    from tools.lexical_index import load_index
+    from tools.schema_graph import load_graph
+    from tools.schema_tool import SchemaRetriever
+    # NumPy fast path, Chroma fallback; join paths and BM25 fusion when extract.py saved them
+    return SchemaRetriever(REGISTRY.get("schema_collection"), REGISTRY.get("embeddings"),
+                           graph=load_graph(), lexical=load_index())
+
+
+REGISTRY = Registry()
+REGISTRY.register("embeddings", _embeddings)
+REGISTRY.register("embedding_model", _embedding_model)
+REGISTRY.register("chroma_client", _chroma_client)
+REGISTRY.register("schema_collection", _schema_collection)
+REGISTRY.register("retriever", _retriever)
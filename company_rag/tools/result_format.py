@@ -0,0 +1,120 @@
+# company_rag/tools/result_format.py
+import json
+from dataclasses import dataclass
+
+from tools.query_cache import tokenize
+
+MAX_ROWS = 20  # Row cap per result
+MAX_BYTES = 16 * 1024  # Encoded-size budget per result; whichever limit hits first truncates
+BATCH_SIZE = 256  # Rows per fetchmany() when streaming
+FORMATS = ("columnar", "compact", "rows", "jsonl")  # jsonl streams: see iter_json
+
+_COMPACT = (",", ":")
+
+
+def _jsonable(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"  # BLOB columns
+    return str(value)
+
+
+def _dumps(obj, indent=None) -> str:
+    return json.dumps(obj, default=_jsonable, indent=indent,
+                      separators=None if indent else _COMPACT, ensure_ascii=False)
+
+
+@dataclass
+class ResultSet:
+    columns: list
+    rows: list  # Tuples, at most the row cap
+    truncated: bool  # More rows exist than were kept
+    total: int = None  # Exact row count of the whole result, when known
+    nbytes: int = 0  # Compact-JSON size of the kept rows
+
+    def records(self) -> list:
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+
+def fetch(cur, max_rows: int = MAX_ROWS, max_bytes: int = MAX_BYTES) -> ResultSet:
+    """Read an executed cursor up to `max_rows` rows or `max_bytes` of encoded rows.
+
+    Reads one row past the cap to learn whether there are more, never the
+    rest, so memory is bounded by the limits rather than the table size.
+    """
+    columns = [d[0] for d in cur.description] if cur.description else []
+    rows, nbytes, truncated = [], 0, False
+    for row in cur.fetchmany(max_rows + 1):
+        if len(rows) == max_rows:
+            truncated = True
+            break
+        size = len(_dumps(list(row))) + 1
+        if max_bytes is not None and rows and nbytes + size > max_bytes:
+            truncated = True
+            break
+        rows.append(row)
+        nbytes += size
+    return ResultSet(columns, rows, truncated, None if truncated else len(rows), nbytes)
+
+
+def count_total(conn, sql: str):
+    """Exact row count of `sql` via COUNT(*) in SQLite (nothing comes back to Python), or None."""
+    tokens = list(tokenize(sql))
+    while tokens and tokens[-1][1] == ";":
+        tokens.pop()
+    if not tokens:
+        return None
+    body = sql[:tokens[-1][3]]  # A trailing "-- comment" would swallow the closing parenthesis
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM ({body})").fetchone()[0]
+    except Exception:
+        return None  # PRAGMAs and other statements that cannot be a subquery
+
+
+def to_json(result: ResultSet, fmt: str = "columnar") -> str:
+    """Encode a ResultSet.
+
+    columnar: {"columns": [...], "rows": [[...]], "count", "total", "truncated"}
+    compact:  {"data": [{col: value}], ...} without indentation
+    rows:     the original run_sql payload, row dicts with indent=2
+    """
+    meta = {"count": len(result.rows), "total": result.total, "truncated": result.truncated}
+    if fmt == "columnar":
+        return _dumps({"columns": result.columns, "rows": [list(r) for r in result.rows], **meta})
+    if fmt == "compact":
+        return _dumps({"data": result.records(), **meta})
+    if fmt == "rows":
+        return _dumps({"data": result.records(), "count": meta["count"], "truncated": meta["truncated"]}, indent=2)
+    raise ValueError(f"Unknown result format {fmt!r}; expected one of {FORMATS}")
+
+
+# === STREAMING ===
+def iter_json(cur, max_rows: int = None, max_bytes: int = None, batch_size: int = BATCH_SIZE):
+    """Stream an executed cursor as JSON lines: a {"columns"} header, one array per row, then trailer().
+
+    Holds at most `batch_size` rows at a time; limits are optional here since
+    the caller consumes rows as they come.
+    """
+    columns = [d[0] for d in cur.description] if cur.description else []
+    yield _dumps({"columns": columns}) + "\n"
+    count, nbytes, truncated = 0, 0, False
+    while not truncated:
+        batch = cur.fetchmany(batch_size)
+        if not batch:
+            break
+        for row in batch:
+            if max_rows is not None and count == max_rows:
+                truncated = True
+                break
+            line = _dumps(list(row)) + "\n"
+            if max_bytes is not None and count and nbytes + len(line) > max_bytes:
+                truncated = True
+                break
+            count += 1
+            nbytes += len(line)
+            yield line
+    yield trailer(count, truncated)
+
+
+def trailer(count: int, truncated: bool, total: int = None) -> str:
+    """Last line of a jsonl result; `total` is known without counting unless truncated."""
+    return _dumps({"count": count, "total": count if not truncated else total, "truncated": truncated}) + "\n"
@@ -0,0 +1,127 @@
+# company_rag/tools/schema_graph.py
+import json
+import os
+from collections import deque
+from itertools import combinations
+
+GRAPH_PATH = "schema_graph.json"
+MAX_HOPS = 4  # Longer join chains are rarely what a question needs; bounds the index size
+
+
+class SchemaGraph:
+    """Foreign-key graph over the schema with precomputed shortest join paths.
+
+    Edges come from the `foreign_keys` extract.py records per chunk (PRAGMA
+    foreign_key_list) and are walked in both directions. Shortest paths
+    between every pair of tables up to `max_hops` apart are computed once, at
+    extract time, by BFS from each table and saved next to chunks.jsonl.
+    """
+
+    def __init__(self, edges, paths=None, max_hops: int = MAX_HOPS):
+        # edges: {table: [{"table": other, "on": "a.x = b.y"}, ...]}
+        self.edges = edges
+        self.max_hops = max_hops
+        self.paths = paths if paths is not None else self._all_pairs()
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        edges = {}
+        for chunk in chunks:
+            edges.setdefault(chunk["table"], [])
+            for fk in chunk.get("foreign_keys", []):
+                a, b = chunk["table"], fk["table"]
+                on = f"{a}.{fk['from']} = {b}.{fk['to'] or fk['from']}"
+                edges.setdefault(b, [])
+                edges[a].append({"table": b, "on": on})
+                if b != a:  # A self-reference (Employee.ReportsTo) is one edge, not two
+                    edges[b].append({"table": a, "on": on})
+        return cls(edges)
+
+    def _bfs(self, start):
+        prev = {start: None}
+        queue = deque([(start, 0)])
+        while queue:
+            node, hops = queue.popleft()
+            if hops == self.max_hops:
+                continue
+            for edge in self.edges.get(node, []):
+                if edge["table"] not in prev:
+                    prev[edge["table"]] = (node, edge["on"])
+                    queue.append((edge["table"], hops + 1))
+        return prev
+
+    def _all_pairs(self):
+        paths = {}
+        for start in self.edges:
+            prev = self._bfs(start)
+            for end in prev:
+                if end <= start:
+                    continue
+                steps, node = [], end
+                while prev[node] is not None:
+                    parent, on = prev[node]
+                    steps.append(on)
+                    node = parent
+                paths[f"{start}|{end}"] = {"tables": self._path_tables(prev, end), "joins": steps[::-1]}
+        return paths
+
+    @staticmethod
+    def _path_tables(prev, end):
+        tables, node = [], end
+        while node is not None:
+            tables.append(node)
+            node = prev[node][0] if prev[node] else None
+        return tables[::-1]
+
+    # === PERSISTENCE ===
+    def save(self, path: str = GRAPH_PATH):
+        with open(path + ".tmp", "w") as f:
+            json.dump({"edges": self.edges, "paths": self.paths}, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str = GRAPH_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["edges"], data["paths"])
+
+    def __len__(self):
+        return len(self.edges)
+
+    # === QUERIES ===
+    def join_path(self, a: str, b: str):
+        """{"tables": [...], "joins": ["X.id = Y.x_id", ...]} between two tables, or None."""
+        if a == b:
+            return {"tables": [a], "joins": []}
+        key = f"{a}|{b}" if a < b else f"{b}|{a}"
+        path = self.paths.get(key)
+        if path is None or a < b:
+            return path
+        return {"tables": path["tables"][::-1], "joins": path["joins"][::-1]}
+
+    def connect(self, tables):
+        """Tables and join conditions needed to connect all of `tables`.
+
+        Unions the precomputed shortest paths between each pair, which is the
+        usual Steiner-tree approximation and exact for the common 2-3 table case.
+        """
+        tables = [t for t in dict.fromkeys(tables) if t in self.edges]
+        extra, joins = [], []
+        for a, b in combinations(tables, 2):
+            path = self.join_path(a, b)
+            if path is None:
+                continue
+            for t in path["tables"]:
+                if t not in tables and t not in extra:
+                    extra.append(t)
+            for on in path["joins"]:
+                if on not in joins:
+                    joins.append(on)
+        return extra, joins
+
+
+def load_graph(path: str = GRAPH_PATH):
+    """The saved graph, or None if extract.py has not produced one yet."""
+    if not os.path.exists(path):
+        return None
+    return SchemaGraph.load(path)
@@ -0,0 +1,173 @@
+# company_rag/tools/schema_tool.py
+import threading
+import time
+
+from tools.lexical_index import reciprocal_rank_fusion
+from tools.tracing import span
+from tools.vector_index import VectorIndex
+
+N_RESULTS = 3
+FUSION_DEPTH = 10  # Candidates taken from each ranking before reciprocal rank fusion
+SEPARATOR = "\n\n---\n\n"
+MAX_INDEX_BYTES = 256 * 1024 * 1024  # Use the in-memory index only below this size
+SYNC_INTERVAL = 30.0  # Seconds between checks that the index still matches Chroma
+
+
+class SchemaRetriever:
+    """retrieve_schema backend: in-process NumPy index with Chroma as the fallback.
+
+    The index is loaded from the collection on first use and reloaded when the
+    collection's ids change (build_db.py ids are content hashes, so an edited
+    chunk shows up as a changed id). Collections too large for MAX_INDEX_BYTES
+    are always served by `collection.query`.
+
+    With a SchemaGraph, retrieve() also returns the tables needed to join the
+    hits together and the join conditions, so the agent does not have to
+    spend another iteration looking for them.
+
+    With a LexicalIndex, query() fuses the vector ranking with a BM25 ranking
+    over table names, column names and sample values (reciprocal rank
+    fusion), so exact identifiers and values like "BillingCountry" or "Rock"
+    are found even when the embedding misses them.
+    """
+
+    def __init__(self, collection, embedder, graph=None, lexical=None,
+                 max_index_bytes: int = MAX_INDEX_BYTES):
+        self.collection = collection
+        self.embedder = embedder
+        self.graph = graph
+        self.lexical = lexical
+        self.max_index_bytes = max_index_bytes
+        self._index = None
+        self._ids = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fits(self) -> bool:
+        return self.collection.count() * self.embedder.dim * 4 <= self.max_index_bytes
+
+    def index(self):
+        """Current VectorIndex, or None when the collection should stay in Chroma."""
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < SYNC_INTERVAL:
+            return self._index
+        with self._lock:
+            if self._index is not None and now - self._checked_at < SYNC_INTERVAL:
+                return self._index
+            self._checked_at = now
+            if not self._fits():
+                self._index = self._ids = None
+                return None
+            ids = self.collection.get(include=[])["ids"]
+            if self._index is None or ids != self._ids:
+                self._index = VectorIndex.from_collection(self.collection)
+                self._ids = ids
+            return self._index
+
+    def query(self, query: str, n_results: int = N_RESULTS) -> dict:
+        """Chroma-shaped results for one query."""
+        return self.query_many([query], n_results)[0]
+
+    def query_many(self, queries, n_results: int = N_RESULTS) -> list:
+        """Chroma-shaped results for each query: one embedding pass and one top-k over the batch."""
+        queries = list(queries)
+        if not queries:
+            return []
+        depth = n_results if self.lexical is None else max(n_results, FUSION_DEPTH)
+        index = self.index()
+        if index is None:
+            batch = self.collection.query(query_texts=queries, n_results=depth)
+        else:
+            batch = index.query(self.embedder.embed(queries), depth)
+        keys = ("ids", "documents", "metadatas", "distances")
+        results = [{k: [batch[k][i]] for k in keys} for i in range(len(queries))]
+        if self.lexical is None:
+            return results
+        return [self._fuse(r, self.lexical.search(q, depth), n_results) for q, r in zip(queries, results)]
+
+    def _fuse(self, results, lexical_hits, n_results: int) -> dict:
+        """Reorder vector results by RRF with the BM25 hits; lexical-only tables get no distance."""
+        vector = {}
+        for id_, doc, meta, dist in zip(results["ids"][0], results["documents"][0],
+                                        results["metadatas"][0], results["distances"][0]):
+            if meta and "table" in meta:
+                vector.setdefault(meta["table"], (id_, doc, meta, dist))
+        ranked = reciprocal_rank_fusion([list(vector), [t for t, _ in lexical_hits]])
+        # All lexical-only candidates, so a stale one in the top n is backfilled from further down
+        missing = self.docs_for_tables([t for t in ranked if t not in vector])
+        fused = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        for table in ranked:
+            if len(fused["ids"][0]) == n_results:
+                break
+            if table in vector:
+                id_, doc, meta, dist = vector[table]
+            elif table in missing:
+                id_, doc, meta, dist = None, missing[table], {"table": table}, None
+            else:
+                continue  # In the lexical index but no longer in the collection
+            for key, value in zip(("ids", "documents", "metadatas", "distances"), (id_, doc, meta, dist)):
+                fused[key][0].append(value)
+        return fused
+
+    def docs_for_tables(self, tables) -> dict:
+        """{table: chunk text} for the given tables."""
+        if not tables:
+            return {}
+        index = self.index()
+        if index is not None:
+            wanted = set(tables)
+            return {m["table"]: d for d, m in zip(index.documents, index.metadatas)
+                    if m and m.get("table") in wanted}
+        found = self.collection.get(where={"table": {"$in": list(tables)}}, include=["documents", "metadatas"])
+        return {m["table"]: d for d, m in zip(found["documents"], found["metadatas"])}
+
+    def expand(self, tables):
+        """Connecting tables (as column-only chunks) and a JOIN PATHS section for `tables`."""
+        if self.graph is None or len(tables) < 2:
+            return []
+        extra, joins = self.graph.connect(tables)
+        sections = []
+        docs = self.docs_for_tables(extra)
+        for table in extra:
+            if table in docs:
+                # Columns are enough for a table that is only there to join through
+                sections.append(docs[table].split("\nSAMPLE ROWS:")[0])
+        if joins:
+            sections.append("JOIN PATHS:\n" + "\n".join(f"- {on}" for on in joins))
+        return sections
+
+    def _render(self, results) -> str:
+        docs = results["documents"][0]
+        tables = [m["table"] for m in results["metadatas"][0] if m and "table" in m]
+        return SEPARATOR.join(docs + self.expand(tables))
+
+    def retrieve(self, query: str, n_results: int = N_RESULTS) -> str:
+        return self.retrieve_many([query], n_results)[0]
+
+    def retrieve_many(self, queries, n_results: int = N_RESULTS) -> list:
+        """retrieve() for each of `queries`, batched through query_many()."""
+        queries = list(queries)
+        with span("schema_retrieval", queries=len(queries), hybrid=self.lexical is not None) as sp:
+            out = [self._render(r) for r in self.query_many(queries, n_results)]
+            sp.set(backend="numpy" if self._index is not None else "chroma")
+            return out
+
+    def retrieve_merged(self, queries, n_results: int = N_RESULTS) -> str:
+        """One schema string for several phrasings of the same need.
+
+        The per-query rankings are fused (reciprocal rank fusion) and each
+        table appears once, so rewrites of a question widen recall without
+        repeating chunks.
+        """
+        queries = list(queries)
+        with span("schema_retrieval", queries=len(queries), merged=True, hybrid=self.lexical is not None):
+            docs, rankings = {}, []
+            for results in self.query_many(queries, n_results):
+                ranking = []
+                for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
+                    if meta and "table" in meta:
+                        docs.setdefault(meta["table"], doc)
+                        ranking.append(meta["table"])
+                rankings.append(ranking)
+            top = reciprocal_rank_fusion(rankings)[:n_results]
+            return SEPARATOR.join([docs[t] for t in top] + self.expand(top))
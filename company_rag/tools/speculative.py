@@ -0,0 +1,298 @@
+# company_rag/tools/speculative.py
+import json
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from tools.query_cache import normalize_sql, tokenize
+from tools.sql_guard import quote
+from tools.tracing import span
+
+HISTORY_PATH = "sql_history.jsonl"  # Successful SQL, one JSON object per execution
+MAX_HISTORY = 500  # Distinct statements kept; the file is compacted past 4x this many lines
+TTL = 60.0  # Seconds a speculative result may be handed out
+MAX_ENTRIES = 64
+MAX_QUEUED = 16  # Speculative queries waiting or running; new triggers past this are skipped
+MAX_LIKELY = 3  # History queries run per trigger
+PROBE = "SELECT COUNT(*) FROM {table}"
+
+_TABLE_RE = re.compile(r"^TABLE: (\w+)", re.MULTILINE)
+
+
+def schema_tables(schema: str) -> list:
+    """Tables named in a retrieve_schema result ("TABLE: X" headers)."""
+    return list(dict.fromkeys(_TABLE_RE.findall(schema)))
+
+
+def tables_in(sql: str, known) -> set:
+    """Known table names referenced by `sql`, in their canonical spelling."""
+    by_lower = {t.lower(): t for t in known}
+    found = set()
+    for kind, text, _, _ in tokenize(sql):
+        name = text.strip('"`[]').lower() if kind in ("word", "ident") else None
+        if name in by_lower:
+            found.add(by_lower[name])
+    return found
+
+
+# === HISTORY ===
+class SQLHistory:
+    """Past successful SQL and the tables it touched, persisted as JSON Lines."""
+
+    def __init__(self, path: str = HISTORY_PATH, max_entries: int = MAX_HISTORY):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # normalized sql -> {"sql", "tables", "uses", "last"}
+        self._lines = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        self._add(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue  # Torn last line after a crash
+                    self._lines += 1
+
+    def _add(self, item):
+        key = normalize_sql(item["sql"])
+        entry = self._entries.pop(key, None) or {"sql": item["sql"], "tables": item["tables"], "uses": 0}
+        entry["uses"] += 1
+        entry["last"] = item["at"]
+        self._entries[key] = entry  # Most recent last
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record(self, sql: str, tables):
+        if not tables:
+            return
+        item = {"sql": sql.strip(), "tables": sorted(tables), "at": time.time()}
+        with self._lock:
+            self._add(item)
+            if not self.path:
+                return
+            self._lines += 1
+            if self._lines > 4 * self.max_entries:
+                self._compact()
+            else:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(item) + "\n")
+
+    def _compact(self):
+        # Caller holds the lock; one line per use keeps counts exact after reload
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for e in self._entries.values():
+                for _ in range(e["uses"]):
+                    f.write(json.dumps({"sql": e["sql"], "tables": e["tables"], "at": e["last"]}) + "\n")
+        os.replace(tmp, self.path)
+        self._lines = sum(e["uses"] for e in self._entries.values())
+
+    def likely(self, tables, k: int = MAX_LIKELY) -> list:
+        """Up to `k` past statements that only touch `tables`, most used (then most recent) first."""
+        tables = set(tables)
+        with self._lock:
+            fits = [e for e in self._entries.values() if set(e["tables"]) <= tables]
+        fits.sort(key=lambda e: (e["uses"], e["last"]), reverse=True)
+        return [e["sql"] for e in fits[:k]]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# === PAGE CACHE ===
+def table_pages(conn, tables) -> list:
+    """Sorted page numbers of `tables` and their indexes, from the dbstat virtual table."""
+    names = list(tables)
+    if not names:
+        return []
+    marks = ",".join("?" * len(names))
+    btrees = [r[0] for r in conn.execute(
+        f"SELECT name FROM sqlite_master WHERE tbl_name IN ({marks}) AND type IN ('table', 'index')", names)]
+    marks = ",".join("?" * len(btrees))
+    return sorted(r[0] for r in conn.execute(f"SELECT pageno FROM dbstat WHERE name IN ({marks})", btrees))
+
+
+def warm_pages(path: str, pages, page_size: int) -> int:
+    """Ask the kernel to read `pages` of the database file ahead (madvise WILLNEED on a
+    read-only mmap), so the first real query finds them in the page cache. Returns
+    the number of contiguous runs advised."""
+    if not pages or not hasattr(mmap, "MADV_WILLNEED"):
+        return 0
+    runs = []
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for first, last in runs:
+                # madvise wants offsets aligned to the OS page, which may be larger than the db page
+                start = (first - 1) * page_size // mmap.PAGESIZE * mmap.PAGESIZE
+                length = min(last * page_size, size) - start
+                if length > 0:
+                    mm.madvise(mmap.MADV_WILLNEED, start, length)
+    return len(runs)
+
+
+# === SPECULATOR ===
+class Speculator:
+    """Runs likely SQL for a set of tables before anyone asks for it.
+
+    When schema retrieval has named the tables a question is about, and
+    while the LLM is still writing its query, speculate() warms those
+    tables' pages and queues, on one background thread, the most used past
+    statements over the same tables (from SQLHistory) plus a COUNT(*)
+    probe per table. Results are kept, keyed by normalized SQL, for `ttl`
+    seconds and only while `stamp_fn` reports the same data; pending()
+    hands a matching run (finished or still in flight) to the real
+    execution so it is not run twice.
+
+    `run_fn(sql)` must return exactly what the real executor would, so a
+    hit is indistinguishable from running the statement.
+    """
+
+    def __init__(self, run_fn, db_path: str, history: SQLHistory = None, stamp_fn=None, ttl: float = TTL,
+                 max_entries: int = MAX_ENTRIES, max_likely: int = MAX_LIKELY, probes: bool = True):
+        self.run_fn = run_fn
+        self.db_path = os.path.abspath(db_path)
+        self.history = history if history is not None else SQLHistory()
+        self.stamp_fn = stamp_fn
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_likely = max_likely
+        self.probes = probes
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculate")
+        self._entries = OrderedDict()  # normalized sql -> (future, created, stamp)
+        self._lock = threading.Lock()
+        self._conn = None  # Worker thread only
+        self._pages = {}  # table -> page numbers, for the data version in _pages_stamp
+        self._pages_stamp = None
+        self._known = None
+        self.triggers = 0
+        self.launched = 0
+        self.skipped = 0
+        self.hits = 0
+        self.misses = 0
+        self.warmed_runs = 0
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(Path(self.db_path).as_uri() + "?mode=ro", uri=True)
+        return self._conn
+
+    def known_tables(self) -> set:
+        if self._known is None:
+            conn = sqlite3.connect(Path(self.db_path).as_uri() + "?mode=ro", uri=True)
+            try:
+                self._known = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            finally:
+                conn.close()
+        return self._known
+
+    def _stamp(self):
+        return self.stamp_fn() if self.stamp_fn else None
+
+    def _queued(self) -> int:
+        return sum(1 for f, _, _ in self._entries.values() if not f.done())
+
+    # === TRIGGER ===
+    def speculate(self, tables) -> list:
+        """Warm `tables` and queue likely statements over them; returns the SQL queued."""
+        tables = [t for t in tables if t in self.known_tables()]
+        if not tables:
+            return []
+        self.triggers += 1
+        stamp = self._stamp()
+        statements = self.history.likely(tables, self.max_likely)
+        if self.probes:
+            statements += [PROBE.format(table=quote(t)) for t in tables]
+        self._pool.submit(self._warm, tables, stamp)
+        queued = []
+        with self._lock:
+            self._expire(stamp)
+            for sql in statements:
+                key = normalize_sql(sql)
+                if key in self._entries:
+                    continue
+                if self._queued() >= MAX_QUEUED:
+                    self.skipped += 1
+                    continue
+                self._entries[key] = (self._pool.submit(self._run, sql), time.monotonic(), stamp)
+                queued.append(sql)
+            self.launched += len(queued)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return queued
+
+    def _warm(self, tables, stamp):
+        with span("speculative_warm", tables=len(tables)) as sp:
+            try:
+                conn = self._connection()
+                if stamp != self._pages_stamp:
+                    self._pages = {}  # Pages move when the data changes; drop the old version's
+                    self._pages_stamp = stamp
+                pages = []
+                for table in tables:
+                    if table not in self._pages:
+                        self._pages[table] = table_pages(conn, [table])
+                    pages.extend(self._pages[table])
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                runs = warm_pages(self.db_path, sorted(set(pages)), page_size)
+                self.warmed_runs += runs
+                sp.set(pages=len(pages), runs=runs)
+            except (sqlite3.Error, OSError, ValueError) as e:
+                sp.set(error=type(e).__name__)  # No dbstat in this SQLite build, file gone, ...
+
+    def _run(self, sql):
+        with span("speculative_sql"):
+            return self.run_fn(sql)
+
+    def _expire(self, stamp):
+        # Caller holds the lock
+        now = time.monotonic()
+        for key in [k for k, (f, created, s) in self._entries.items()
+                    if s != stamp or (f.done() and now - created > self.ttl)]:
+            del self._entries[key]
+
+    # === LOOKUP ===
+    def pending(self, sql: str):
+        """concurrent.futures.Future of a speculative run of `sql` against the current data, or None."""
+        key = normalize_sql(sql)
+        stamp = self._stamp()
+        with self._lock:
+            self._expire(stamp)
+            entry = self._entries.get(key)
+            if entry is None or entry[0].cancelled():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def take(self, sql: str, timeout: float = None):
+        """Result of a speculative run of `sql` (waiting if it is still running), or None."""
+        future = self.pending(sql)
+        return future.result(timeout) if future is not None else None
+
+    def record(self, sql: str):
+        """Remember a statement that ran successfully, for future speculation."""
+        self.history.record(sql, tables_in(sql, self.known_tables()))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"triggers": self.triggers, "launched": self.launched, "skipped": self.skipped,
+                "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "warmed_runs": self.warmed_runs, "history": len(self.history)}
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
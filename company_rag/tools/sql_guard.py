@@ -0,0 +1,213 @@
+# company_rag/tools/sql_guard.py
+import re
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from tools.query_cache import tokenize
+
+TIMEOUT = 2.0  # Wall-clock seconds per statement
+MAX_INSTRUCTIONS = 200_000_000  # SQLite VM steps per statement
+PROGRESS_STEPS = 10_000  # VM steps between progress-handler checks
+MAX_PLAN_ROWS = 1_000_000  # Reject nested full scans estimated to visit more row combinations
+
+# Statement kinds the agent may run; anything else is rejected before SQLite sees it
+_READ_STARTS = {"SELECT", "WITH", "VALUES", "EXPLAIN", "PRAGMA"}
+_WRITE_WORDS = {"INSERT", "UPDATE", "DELETE", "REPLACE", "UPSERT", "CREATE", "DROP", "ALTER",
+                "ATTACH", "DETACH", "VACUUM", "REINDEX", "ANALYZE", "BEGIN", "COMMIT", "ROLLBACK",
+                "SAVEPOINT", "RELEASE"}
+_READ_PRAGMAS = {"table_info", "table_xinfo", "table_list", "index_list", "index_info", "index_xinfo",
+                 "foreign_key_list", "database_list", "collation_list", "function_list"}
+
+_SCAN_RE = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+_AUTO_INDEX_RE = re.compile(r"^SEARCH (\w+) USING AUTOMATIC (?:COVERING |PARTIAL )*INDEX \(([^)]*)\)")
+
+
+def quote(name: str) -> str:
+    """`name` as a double-quoted SQLite identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SQLRejected(ValueError):
+    """The statement failed pre-flight; the message says why, for the agent to fix."""
+
+
+@dataclass
+class Preflight:
+    sql: str  # What will actually run (LIMIT injected or tightened)
+    original: str
+    limit: int = None  # Row limit applied, if any
+    estimated_rows: int = None  # Rough row visits from the plan
+    warnings: list = field(default_factory=list)
+    plan: list = field(default_factory=list)  # EXPLAIN QUERY PLAN detail lines
+
+
+# === VALIDATION ===
+def check_read_only(sql: str):
+    """Tokens of a single read-only statement (trailing semicolons dropped), or SQLRejected."""
+    tokens = list(tokenize(sql))
+    while tokens and tokens[-1][1] == ";":
+        tokens.pop()
+    if not tokens:
+        raise SQLRejected("empty statement")
+    if any(t[1] == ";" for t in tokens):
+        raise SQLRejected("only one statement per call")
+    first = tokens[0][1].upper()
+    if tokens[0][0] != "word" or first not in _READ_STARTS:
+        raise SQLRejected(f"only SELECT queries are allowed, not {tokens[0][1]}")
+    # replace(...) and friends are functions, not statements
+    words = {t[1].upper() for i, t in enumerate(tokens) if t[0] == "word"
+             and (i + 1 == len(tokens) or tokens[i + 1][1] != "(")}
+    writes = words & _WRITE_WORDS
+    if writes:
+        raise SQLRejected(f"read-only access: {', '.join(sorted(writes))} is not allowed")
+    if first == "PRAGMA":
+        name = tokens[1][1].lower() if len(tokens) > 1 else ""
+        if name not in _READ_PRAGMAS or any(t[1] == "=" for t in tokens):
+            raise SQLRejected(f"PRAGMA {name} is not allowed; use table_info, index_list or foreign_key_list")
+    return tokens
+
+
+# === LIMIT ===
+def apply_limit(sql: str, tokens, limit: int):
+    """(sql, limit) with a top-level LIMIT of at most `limit` rows.
+
+    Appends one when missing and lowers a larger literal one; a LIMIT given
+    as an expression is left alone (the row cap in fetch() still applies).
+    """
+    if not tokens or tokens[0][1].upper() not in ("SELECT", "WITH", "VALUES"):
+        return sql, None
+    depth, limit_at = 0, None
+    for i, (kind, text, start, end) in enumerate(tokens):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and text.upper() == "LIMIT":
+            limit_at = i
+    body = sql[:tokens[-1][3]]  # Without trailing semicolons/comments
+    if limit_at is None:
+        return f"{body}\nLIMIT {limit}", limit
+
+    rest = tokens[limit_at + 1:]
+    # LIMIT n | LIMIT n OFFSET m | LIMIT m, n (count is the second number)
+    if len(rest) == 3 and rest[1][1] == ",":
+        count = rest[2]
+    elif len(rest) in (1, 3) and (len(rest) == 1 or rest[1][1].upper() == "OFFSET"):
+        count = rest[0]
+    else:
+        return sql, None
+    if count[0] != "number" or not count[1].isdigit():
+        return sql, None
+    if int(count[1]) <= limit:
+        return sql, int(count[1])
+    return body[:count[2]] + str(limit) + body[count[3]:], limit
+
+
+# === PLAN ===
+def _table_rows(conn, table: str):
+    try:
+        row = conn.execute(f"SELECT max(rowid) FROM {quote(table)}").fetchone()
+        return row[0] or 0
+    except Exception:
+        return None  # WITHOUT ROWID table, view or CTE
+
+
+def _resolve(name: str, sql: str, tables: dict):
+    """Table for a plan name, which may be an alias ("SCAN il" for InvoiceLine il)."""
+    if name.lower() in tables:
+        return tables[name.lower()]
+    for m in re.finditer(rf"\b(\w+)\s+(?:AS\s+)?{re.escape(name)}\b", sql, re.IGNORECASE):
+        if m.group(1).lower() in tables:
+            return tables[m.group(1).lower()]
+    return None
+
+
+def check_plan(conn, sql: str, max_plan_rows: int = MAX_PLAN_ROWS):
+    """(estimated row visits, warnings, plan lines) from EXPLAIN QUERY PLAN, or SQLRejected.
+
+    Full scans under the same parent are nested loops, so their row counts
+    multiply; separate subqueries add. Only plans with two or more nested
+    full scans are rejected, since a single scan is linear and the runtime
+    budget bounds it.
+    """
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    tables = {r[0].lower(): r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+    groups, warnings, plan = {}, [], []
+    for node, parent, _, detail in rows:
+        plan.append(detail)
+        scan = _SCAN_RE.match(detail)
+        if scan:
+            table = _resolve(scan.group(1), sql, tables)
+            n = _table_rows(conn, table) if table else None
+            if n is not None:
+                groups.setdefault(parent, []).append((table, n))
+                if not scan.group(2):
+                    warnings.append(f"full scan of {table} (~{n} rows)")
+            continue
+        auto = _AUTO_INDEX_RE.match(detail)
+        if auto:
+            table = _resolve(auto.group(1), sql, tables) or auto.group(1)
+            columns = auto.group(2).replace("=?", "").replace(" AND ", ", ")
+            warnings.append(f"no index on {table}({columns}); SQLite builds a temporary one per query")
+        elif detail.startswith("USE TEMP B-TREE"):
+            warnings.append(detail.lower())
+
+    estimated = 0
+    for scans in groups.values():
+        product = 1
+        for _, n in scans:
+            product *= max(n, 1)
+        estimated += product
+        if len(scans) > 1 and product > max_plan_rows:
+            names = " × ".join(f"{t} (~{n})" for t, n in scans)
+            raise SQLRejected(f"query plan nests full scans of {names}, about {product:,} row combinations; "
+                              f"add a join condition or filter")
+    return estimated, warnings, plan
+
+
+def preflight(conn, sql: str, limit: int = None, max_plan_rows: int = MAX_PLAN_ROWS) -> Preflight:
+    """Validate `sql` as a single read-only statement, check its plan and cap its LIMIT."""
+    tokens = check_read_only(sql)
+    check = Preflight(sql=sql, original=sql)
+    if limit is not None:
+        check.sql, check.limit = apply_limit(sql, tokens, limit)
+    if tokens[0][1].upper() in ("SELECT", "WITH", "VALUES"):
+        check.estimated_rows, check.warnings, check.plan = check_plan(conn, check.sql, max_plan_rows)
+    return check
+
+
+# === RUNTIME BUDGET ===
+@contextmanager
+def budget(conn, timeout: float = TIMEOUT, max_instructions: int = MAX_INSTRUCTIONS,
+           steps: int = PROGRESS_STEPS):
+    """Interrupt statements on `conn` that run past `timeout` seconds or `max_instructions` VM steps.
+
+    SQLite calls the progress handler every `steps` instructions; returning
+    true aborts the statement with OperationalError("interrupted"), which is
+    re-raised as SQLRejected naming the budget that ran out.
+    """
+    deadline = time.monotonic() + timeout
+    state = {"steps": 0, "reason": None}
+
+    def progress():
+        state["steps"] += steps
+        if state["steps"] > max_instructions:
+            state["reason"] = f"instruction budget ({max_instructions:,} steps)"
+            return 1
+        if time.monotonic() > deadline:
+            state["reason"] = f"time budget ({timeout:g}s)"
+            return 1
+        return 0
+
+    conn.set_progress_handler(progress, steps)
+    try:
+        yield state
+    except Exception as e:
+        if state["reason"] and "interrupt" in str(e).lower():
+            raise SQLRejected(f"query stopped after exceeding its {state['reason']}; "
+                              f"add filters, a join condition or a LIMIT") from e
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
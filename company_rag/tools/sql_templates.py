@@ -0,0 +1,454 @@
+# company_rag/tools/sql_templates.py
+import re
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from tools.tracing import span
+
+MIN_CONFIDENCE = 0.85  # Below this the question goes to the LLM
+MIN_MARGIN = 0.05  # Best template must beat the runner-up by this much
+SEMANTIC_WEIGHT = 0.3  # Share of confidence from embedding similarity (when an embedder is given)
+DEFAULT_N = 5
+MAX_N = 50
+
+# Words that carry no intent; everything else in a question must be explained
+# by the template's examples, its keywords or an extracted slot.
+COMMON = set("""
+a an the of in on for from to by at with and or is are was were be been do does did have has had
+what which who whom whose how many much show me list give tell find get display please i we us our
+my you your it its this that these those there their all any each every
+company store shop business data database chinook
+""".split())
+
+_WORD_RE = re.compile(r"[a-z]+|\d+")
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                 "eight": 8, "nine": 9, "ten": 10, "fifteen": 15, "twenty": 20}
+_N_RE = re.compile(r"\b(?:top|best|first|biggest|highest|leading)\s+(\d{1,3}|"
+                   + "|".join(_NUMBER_WORDS) + r")\b")
+# Intent words a slot must account for: ranking needs a ranked template, "by/per X"
+# a template that groups by X; the rest no template expresses, so they go to the LLM
+_RANK_RE = re.compile(r"\b(?:top|best|most|highest|biggest|largest|leading|popular)\b")
+_GROUP_RE = re.compile(r"\b(?:by|per|each|every|across)\s+([a-z]+)")
+GROUP_NOUNS = {"year", "month", "quarter", "week", "day", "country", "city", "state", "genre", "artist", "band",
+               "album", "track", "song", "customer", "client", "buyer", "employee", "rep", "representative",
+               "agent", "staff", "playlist", "media", "invoice"}
+_UNSUPPORTED_RE = re.compile(r"\b(?:lowest|least|worst|bottom|fewest|smallest|average|avg|mean|median|percent\w*|"
+                             r"ratio|growth|compar\w*|versus|vs)\b")
+# Spellings the data doesn't use -> value in the database
+COUNTRY_ALIASES = {"united states": "USA", "america": "USA", "u.s.": "USA", "u.s.a.": "USA",
+                   "uk": "United Kingdom", "u.k.": "United Kingdom", "britain": "United Kingdom",
+                   "great britain": "United Kingdom", "england": "United Kingdom",
+                   "czechia": "Czech Republic", "holland": "Netherlands"}
+GENRE_ALIASES = {"hip hop": "Hip Hop/Rap", "hip-hop": "Hip Hop/Rap", "r&b": "R&B/Soul",
+                 "rnb": "R&B/Soul", "electronic": "Electronica/Dance", "punk": "Alternative & Punk",
+                 "rock n roll": "Rock And Roll", "rock and roll": "Rock And Roll", "sci-fi": "Sci Fi & Fantasy"}
+# Slot -> (SQL listing its values, aliases)
+SLOT_SOURCES = {"country": ("SELECT BillingCountry FROM Invoice UNION SELECT Country FROM Customer", COUNTRY_ALIASES),
+                "genre": ("SELECT Name FROM Genre", GENRE_ALIASES)}
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def content_words(text: str) -> list:
+    """Stemmed words of `text` that are not in COMMON."""
+    return [_stem(w) for w in _WORD_RE.findall(text.lower()) if w not in COMMON]
+
+
+def vocabulary(conn, sql, aliases=None, parts: bool = True) -> dict:
+    """Lowercased spelling -> database value; with `parts`, parts of "Hip Hop/Rap" count too, unless taken."""
+    values = {v.lower(): v for (v,) in conn.execute(sql) if v}
+    if parts:
+        for v in list(values.values()):
+            for part in re.split(r"\s*[/&]\s*", v):
+                values.setdefault(part.lower(), v)
+    for alias, v in (aliases or {}).items():
+        if v in values.values():
+            values.setdefault(alias, v)
+    return values
+
+
+def value_pattern(values: dict):
+    """Regex matching any spelling in `values` as a whole word, longest first."""
+    spellings = sorted(values, key=len, reverse=True)  # "heavy metal" before "metal"
+    return re.compile(r"(?<![\w&/])(?:" + "|".join(map(re.escape, spellings)) + r")(?![\w&/])")
+
+
+def literal(value) -> str:
+    """SQL literal for a slot value (ints verbatim, strings quoted)."""
+    if isinstance(value, int):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# === TEMPLATES ===
+@dataclass
+class Template:
+    """One question shape and the SQL that answers it.
+
+    `sql` has a {where} placeholder for the filters actually extracted and,
+    for rankings, {n}. Every regex in `keywords` must match the question;
+    `entity` is the (singular, plural) noun that decides "top genre" (n=1)
+    versus "top genres" (n=DEFAULT_N). `groups` are extra nouns a "by/per X"
+    in the question may name (the entity itself always counts); "by X"
+    asks for the whole breakdown, not the top few.
+    """
+    name: str
+    sql: str
+    examples: list
+    keywords: list
+    filters: dict = field(default_factory=dict)  # slot -> SQL condition using {value}
+    required: tuple = ()
+    answer: str = ""  # Format for a single-row result, or the heading of a ranking
+    item: str = None  # Format for each row of a ranking
+    entity: tuple = None
+    vocabulary: str = ""  # Extra words this shape explains beyond its examples
+    groups: tuple = ()
+
+    def __post_init__(self):
+        self.keywords = [re.compile(k) for k in self.keywords]
+        self.ranked = "{n}" in self.sql
+        self.slots = set(self.filters) | ({"n"} if self.ranked else set())
+        self.groups = {_stem(w) for w in (*(self.entity or ()), *self.groups)}
+
+    def render(self, params: dict) -> str:
+        conditions = [self.filters[s].format(value=literal(params[s])) for s in self.filters if s in params]
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        return self.sql.format(where=where, n=params.get("n", DEFAULT_N)).strip()
+
+
+_YEAR = "strftime('%Y', i.InvoiceDate) = {value}"
+_GENRE = "g.Name = {value}"
+_SALES = r"\b(?:sales|sold|sell\w*|revenue|earn\w*|income|made|spen[dt]\w*|purchases?)\b"
+_TOP = r"\b(?:top|best|most|biggest|highest|leading|largest|popular|rank\w*)\b"
+_SALES_LINES = """
+    FROM InvoiceLine il
+    JOIN Invoice i ON i.InvoiceId = il.InvoiceId
+    JOIN Track t ON t.TrackId = il.TrackId"""
+
+TEMPLATES = [
+    Template(
+        name="total_sales",
+        sql="SELECT ROUND(SUM(i.Total), 2) AS sales, COUNT(*) AS invoices FROM Invoice i {where}",
+        examples=["Total sales in 2013", "How much revenue did we make in Germany?",
+                  "What were sales in the USA in 2011?", "total revenue", "how much did customers spend"],
+        keywords=[_SALES],
+        filters={"year": _YEAR, "country": "i.BillingCountry = {value}"},
+        answer="Total sales{scope}: ${sales:,.2f} across {invoices} invoices.",
+        vocabulary="overall sum amount",
+    ),
+    Template(
+        name="sales_by_year",
+        sql="""SELECT strftime('%Y', i.InvoiceDate) AS year, ROUND(SUM(i.Total), 2) AS sales
+    FROM Invoice i {where}
+    GROUP BY year ORDER BY year""",
+        examples=["Sales per year", "yearly revenue breakdown", "How did sales change over the years?",
+                  "annual sales in France"],
+        keywords=[_SALES, r"\b(?:per|by|each|every)\s+year\b|\byearly\b|\bannual\w*\b|\bover the years\b"],
+        filters={"country": "i.BillingCountry = {value}"},
+        answer="Sales by year{scope}:",
+        item="{year}: ${sales:,.2f}",
+        vocabulary="trend",
+        groups=("year",),
+    ),
+    Template(
+        name="sales_by_country",
+        sql="""SELECT i.BillingCountry AS country, ROUND(SUM(i.Total), 2) AS sales
+    FROM Invoice i {where}
+    GROUP BY country ORDER BY sales DESC LIMIT {n}""",
+        examples=["Top 5 countries by sales", "Which country brings in the most revenue?",
+                  "best selling countries in 2012", "sales by country"],
+        keywords=[_SALES, r"\bcountr(?:y|ies)\b"],
+        filters={"year": _YEAR},
+        answer="{top} by sales{scope}:",
+        item="{country}: ${sales:,.2f}",
+        entity=("country", "countries"),
+        vocabulary="per market",
+    ),
+    Template(
+        name="top_genres",
+        sql="""SELECT g.Name AS genre, ROUND(SUM(il.UnitPrice * il.Quantity), 2) AS revenue""" + _SALES_LINES + """
+    JOIN Genre g ON g.GenreId = t.GenreId {where}
+    GROUP BY g.GenreId ORDER BY revenue DESC LIMIT {n}""",
+        examples=["Top genre", "What are the top 5 genres by revenue?", "Which genre sells the most?",
+                  "most popular genres in Germany in 2013", "best selling genre"],
+        keywords=[r"\bgenres?\b", _TOP + "|" + _SALES],
+        filters={"year": _YEAR, "country": "i.BillingCountry = {value}"},
+        answer="{top} by revenue{scope}:",
+        item="{genre}: ${revenue:,.2f}",
+        entity=("genre", "genres"),
+        vocabulary="music style",
+    ),
+    Template(
+        name="top_artists",
+        sql="""SELECT ar.Name AS artist, ROUND(SUM(il.UnitPrice * il.Quantity), 2) AS revenue""" + _SALES_LINES + """
+    JOIN Album al ON al.AlbumId = t.AlbumId
+    JOIN Artist ar ON ar.ArtistId = al.ArtistId
+    JOIN Genre g ON g.GenreId = t.GenreId {where}
+    GROUP BY ar.ArtistId ORDER BY revenue DESC LIMIT {n}""",
+        examples=["Top 10 artists by revenue", "Which artist sold the most?", "best selling rock artists",
+                  "most popular artists in Brazil in 2010"],
+        keywords=[r"\b(?:artists?|bands?|musicians?)\b", _TOP + "|" + _SALES],
+        filters={"year": _YEAR, "country": "i.BillingCountry = {value}", "genre": _GENRE},
+        answer="{top} by revenue{scope}:",
+        item="{artist}: ${revenue:,.2f}",
+        entity=("artist", "artists"),
+        vocabulary="band musician",
+        groups=("band",),
+    ),
+    Template(
+        name="top_tracks",
+        sql="""SELECT t.Name AS track, SUM(il.Quantity) AS sold""" + _SALES_LINES + """
+    JOIN Genre g ON g.GenreId = t.GenreId {where}
+    GROUP BY t.TrackId ORDER BY sold DESC, t.Name LIMIT {n}""",
+        examples=["Top 10 tracks", "best selling songs", "Which track sold the most copies in 2013?",
+                  "most purchased jazz tracks"],
+        keywords=[r"\b(?:tracks?|songs?)\b", _TOP + "|" + _SALES],
+        filters={"year": _YEAR, "country": "i.BillingCountry = {value}", "genre": _GENRE},
+        answer="{top} by copies sold{scope}:",
+        item="{track}: {sold} sold",
+        entity=("track", "tracks"),
+        vocabulary="song purchased popular",
+        groups=("song",),
+    ),
+    Template(
+        name="top_customers",
+        sql="""SELECT c.FirstName || ' ' || c.LastName AS customer, c.Country AS country,
+           ROUND(SUM(i.Total), 2) AS spend
+    FROM Invoice i
+    JOIN Customer c ON c.CustomerId = i.CustomerId {where}
+    GROUP BY c.CustomerId ORDER BY spend DESC LIMIT {n}""",
+        examples=["Top customer", "Who are our top 5 customers?", "Which customers spent the most in 2012?",
+                  "biggest customers in Canada", "best customers by revenue"],
+        keywords=[r"\b(?:customers?|clients?|buyers?)\b", _TOP + "|" + _SALES],
+        filters={"year": _YEAR, "country": "c.Country = {value}"},
+        answer="{top} by spend{scope}:",
+        item="{customer} ({country}): ${spend:,.2f}",
+        entity=("customer", "customers"),
+        vocabulary="client buyer spending",
+        groups=("client", "buyer"),
+    ),
+    Template(
+        name="top_employees",
+        sql="""SELECT e.FirstName || ' ' || e.LastName AS employee, ROUND(SUM(i.Total), 2) AS sales
+    FROM Invoice i
+    JOIN Customer c ON c.CustomerId = i.CustomerId
+    JOIN Employee e ON e.EmployeeId = c.SupportRepId {where}
+    GROUP BY e.EmployeeId ORDER BY sales DESC LIMIT {n}""",
+        examples=["Top sales rep", "Which employee made the most sales?", "best support agents by revenue in 2011",
+                  "sales per employee"],
+        keywords=[r"\b(?:employees?|reps?|representatives?|agents?|staff)\b", _TOP + "|" + _SALES],
+        filters={"year": _YEAR, "country": "i.BillingCountry = {value}"},
+        answer="{top} by sales{scope}:",
+        item="{employee}: ${sales:,.2f}",
+        entity=("employee", "employees"),
+        vocabulary="representative staff support",
+        groups=("rep", "representative", "agent", "staff"),
+    ),
+    Template(
+        name="customer_count",
+        sql="SELECT COUNT(*) AS customers FROM Customer c {where}",
+        examples=["How many customers do we have?", "number of customers in Brazil", "count customers in France"],
+        keywords=[r"\bhow many\b|\bnumber of\b|\bcount\b", r"\b(?:customers?|clients?)\b"],
+        filters={"country": "c.Country = {value}"},
+        answer="{customers} customers{scope}.",
+        vocabulary="total",
+    ),
+    Template(
+        name="track_count",
+        sql="""SELECT COUNT(*) AS tracks FROM Track t
+    JOIN Genre g ON g.GenreId = t.GenreId {where}""",
+        examples=["How many tracks are there?", "number of rock songs", "How many tracks are in the Jazz genre?"],
+        keywords=[r"\bhow many\b|\bnumber of\b|\bcount\b", r"\b(?:tracks?|songs?)\b"],
+        filters={"genre": _GENRE},
+        answer="{tracks} tracks{scope}.",
+        vocabulary="total catalog genre",
+    ),
+]
+
+
+# === MATCHING ===
+@dataclass
+class Match:
+    template: Template
+    params: dict
+    sql: str
+    confidence: float
+    coverage: float  # Share of the question's content words the template explains
+    semantic: float = None  # Best cosine to the template's examples
+    breakdown: bool = False  # "by/per <entity>": every group, not a top-N
+
+    @property
+    def name(self) -> str:
+        return self.template.name
+
+    def scope(self) -> str:
+        parts = []
+        if "genre" in self.params:
+            parts.append(f" in the {self.params['genre']} genre")
+        if "country" in self.params:
+            parts.append(f" in {self.params['country']}")
+        if "year" in self.params:
+            parts.append(f" in {self.params['year']}")
+        return "".join(parts)
+
+    def answer(self, records: list) -> str:
+        """Plain-text answer from the rows the SQL returned."""
+        t = self.template
+        fields = {**self.params, "scope": self.scope()}
+        if t.item is None:
+            row = records[0] if records else {}
+            if not row or any(v is None for v in row.values()):  # SUM() over no rows is NULL
+                return f"No matching data{fields['scope']}."
+            return t.answer.format(**fields, **row)
+        if not records:
+            return f"No matching data{fields['scope']}."
+        if t.entity:
+            n = len(records)
+            if self.breakdown:
+                fields["top"] = t.entity[1].capitalize()
+            else:
+                fields["top"] = f"Top {t.entity[0]}" if n == 1 else f"Top {n} {t.entity[1]}"
+        heading = t.answer.format(**fields)
+        if len(records) == 1:
+            return f"{heading} {t.item.format(**records[0])}"
+        lines = [f"{i}. {t.item.format(**row)}" for i, row in enumerate(records, start=1)]
+        return "\n".join([heading, *lines])
+
+
+class TemplateMatcher:
+    """Answers common question shapes with parameterized SQL instead of an LLM call.
+
+    Slots (year, country, genre, top-N) are pulled out with regexes over the
+    values actually in the database, so filled SQL only ever contains known
+    literals. A template is a candidate only if every keyword rule matches,
+    its required slots were found and it supports every slot that was found;
+    candidates are scored on how much of the question they explain, blended
+    with embedding similarity to their examples when an embedder is given.
+    Anything below `min_confidence`, or too close to a second template, is
+    left to the LLM.
+    """
+
+    def __init__(self, conn, embedder=None, templates=None, min_confidence: float = MIN_CONFIDENCE,
+                 min_margin: float = MIN_MARGIN):
+        self.templates = templates or TEMPLATES
+        self.embedder = embedder
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.vocab = {slot: vocabulary(conn, sql, aliases) for slot, (sql, aliases) in SLOT_SOURCES.items()}
+        self._patterns = {slot: value_pattern(values) for slot, values in self.vocab.items()}
+        # Words each template explains: its examples minus their slot values ("Germany" in
+        # an example must not explain a second country in the question), plus its vocabulary
+        self._words = [set(content_words(self.extract(" ".join(t.examples))[1] + " " + t.vocabulary))
+                       for t in self.templates]
+        self._examples = None  # (template index per row, unit vectors) once embedded
+        self._lock = threading.Lock()
+        self.matched = 0
+        self.fallbacks = 0
+
+    # === SLOTS ===
+    def extract(self, question: str):
+        """(slots found, question with their text blanked out).
+
+        A slot naming several distinct values ("France and Germany") maps to a
+        tuple of them, which no template can fill.
+        """
+        q = question.lower()
+        slots = {}
+        for slot, pattern in (*self._patterns.items(), ("year", _YEAR_RE)):
+            vocab = self.vocab.get(slot)
+            values = list(dict.fromkeys(vocab[m.group()] if vocab else m.group() for m in pattern.finditer(q)))
+            if values:
+                slots[slot] = values[0] if len(values) == 1 else tuple(values)
+                q = pattern.sub(" ", q)
+        n = _N_RE.search(q)
+        if n:
+            value = n.group(1)
+            slots["n"] = min(int(value) if value.isdigit() else _NUMBER_WORDS[value], MAX_N)
+            q = q[:n.start(1)] + " " + q[n.end(1):]
+        return slots, q
+
+    # === SCORING ===
+    def _semantic(self, question: str):
+        """Best cosine per template, or None without an embedder."""
+        if self.embedder is None:
+            return None
+        with self._lock:
+            if self._examples is None:
+                owners = [i for i, t in enumerate(self.templates) for _ in t.examples]
+                texts = [e for t in self.templates for e in t.examples]
+                self._examples = (np.array(owners), self.embedder.embed(texts))
+        owners, vectors = self._examples
+        scores = vectors @ self.embedder.embed_one(question)
+        best = np.full(len(self.templates), -1.0, dtype=np.float32)
+        np.maximum.at(best, owners, scores)
+        return best
+
+    def rank(self, question: str) -> list:
+        """Every eligible template as a Match, best first."""
+        q = question.lower()
+        if _UNSUPPORTED_RE.search(q):
+            return []  # "lowest", "average", ...: no template computes that
+        slots, rest = self.extract(question)
+        if any(isinstance(v, tuple) for v in slots.values()):
+            return []  # "sales in France and Germany": one filter value per slot only
+        words = content_words(rest)
+        semantic = self._semantic(question)
+        found = set(slots) - {"n"}
+        ranking = "n" in slots or _RANK_RE.search(q) is not None
+        grouped = {_stem(g) for g in _GROUP_RE.findall(q)} & GROUP_NOUNS
+        candidates = []
+        for i, t in enumerate(self.templates):
+            if not found <= t.slots or (ranking and not t.ranked) or not grouped <= t.groups:
+                continue
+            if any(s not in slots for s in t.required) or not all(k.search(question.lower()) for k in t.keywords):
+                continue
+            coverage = sum(w in self._words[i] for w in words) / len(words) if words else 1.0
+            confidence = coverage
+            sim = None
+            if semantic is not None:
+                sim = float(semantic[i])
+                confidence = (1 - SEMANTIC_WEIGHT) * coverage + SEMANTIC_WEIGHT * max(sim, 0.0)
+            params = {s: v for s, v in slots.items() if s in t.slots}
+            breakdown = bool(grouped) and t.entity is not None
+            if t.ranked and "n" not in params:
+                singular, plural = t.entity
+                q_words = set(_WORD_RE.findall(q))
+                if breakdown:
+                    params["n"] = MAX_N
+                elif ranking and singular in q_words and plural not in q_words:
+                    params["n"] = 1  # "top genre", "which country sells the most"
+                else:
+                    params["n"] = DEFAULT_N
+            candidates.append(Match(t, params, t.render(params), round(confidence, 4), round(coverage, 4),
+                                    None if sim is None else round(sim, 4), breakdown))
+        return sorted(candidates, key=lambda m: m.confidence, reverse=True)
+
+    def match(self, question: str):
+        """The confident Match for `question`, or None to fall back to the LLM."""
+        with span("template_match") as sp:
+            ranked = self.rank(question)
+            best = ranked[0] if ranked else None
+            if best is not None and (best.confidence < self.min_confidence or
+                                     (len(ranked) > 1 and best.confidence - ranked[1].confidence < self.min_margin)):
+                best = None
+            sp.set(template=best.name if best else None, candidates=len(ranked),
+                   confidence=ranked[0].confidence if ranked else None)
+        if best is None:
+            self.fallbacks += 1
+        else:
+            self.matched += 1
+        return best
+
+    def stats(self) -> dict:
+        total = self.matched + self.fallbacks
+        return {"matched": self.matched, "fallbacks": self.fallbacks,
+                "match_rate": self.matched / total if total else 0.0}
@@ -1,23 +1,195 @@
 # company_rag/tools/sql_tool.py
-import sqlite3
 import json
+import sqlite3
+import os
+import threading
+from pathlib import Path
+
+from tools.query_cache import QueryCache, normalize_sql
+from tools.result_format import MAX_BYTES, count_total, fetch, iter_json, to_json, trailer
+from tools.sql_guard import SQLRejected, budget, preflight
+from tools.tracing import span
 
 DB_PATH = "../data/Chinook.db"  # ← Swap with real DB later
+MAX_ROWS = 20  # Cap output rows returned to the agent
+RESULT_FORMAT = "rows"  # tools.result_format: rows (the original indent=2 dicts, what agent.py expects), compact, columnar or jsonl
+CACHE_SIZE = 256  # Cached query results (LRU)
+CACHE_TTL = 300.0  # Seconds a cached result stays valid
+COUNT_TIMEOUT = 0.5  # Seconds the exact total of a truncated result may take; otherwise it is left out
+
+# Applied to every pooled connection. query_only is a second guard on top of
+# the mode=ro URI; mmap/cache sizes keep hot pages out of the read() path.
+PRAGMAS = {
+    "query_only": 1,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative = KiB
+    "temp_store": 2,  # MEMORY
+}
+
+
+# === CONNECTION POOL ===
+class ConnectionPool:
+    """Read-only connections to one SQLite file, one per thread, reused across calls."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.uri = Path(self.path).as_uri() + "?mode=ro"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []
+        self._generation = 0
+        self._file_stamp = None
+
+    def _open(self) -> sqlite3.Connection:
+        # check_same_thread=False only so close_all() can run from any thread;
+        # each connection is still used by the thread that opened it.
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        with self._lock:
+            self._conns.append(conn)
+        return conn
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def _stat(self):
+        stamp = []
+        # In WAL mode commits land in the -wal file, not the main file
+        for path in (self.path, self.path + "-wal"):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def generation(self) -> int:
+        """Counter bumped whenever PRAGMA data_version or the file stamp changes.
+
+        data_version is only comparable on the same connection, so each thread
+        tracks the last value its own connection reported.
+        """
+        version = self.get().execute("PRAGMA data_version").fetchone()[0]
+        stamp = self._stat()
+        with self._lock:
+            last = getattr(self._local, "data_version", None)
+            if (last is not None and last != version) or \
+                    (self._file_stamp is not None and stamp != self._file_stamp):
+                self._generation += 1
+            self._local.data_version = version
+            self._file_stamp = stamp
+            return self._generation
+
+    def close_all(self):
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: str = None) -> ConnectionPool:
+    """Return the shared pool for `path` (defaults to DB_PATH)."""
+    key = os.path.abspath(path or DB_PATH)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ConnectionPool(key))
+    return pool
+
+
+def get_connection(path: str = None) -> sqlite3.Connection:
+    return get_pool(path).get()
+
+
+def data_stamp(path: str = None):
+    """Hashable value that changes when the data behind `path` may have changed."""
+    pool = get_pool(path)
+    return pool.path, pool.generation()
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+# === RESULT CACHE ===
+QUERY_CACHE = QueryCache(max_entries=CACHE_SIZE, ttl=CACHE_TTL, stamp_fn=data_stamp)
+
+
+# === TOOL ===
+def run_sql(sql: str, use_cache: bool = True, fmt: str = RESULT_FORMAT, max_rows: int = MAX_ROWS,
+            max_bytes: int = MAX_BYTES, count: bool = True) -> str:
+    """Run `sql` and encode at most `max_rows` rows / `max_bytes` bytes (see tools.result_format).
+
+    The statement goes through tools.sql_guard first: it must be a single
+    read-only query, its plan must not nest large full scans, and its LIMIT
+    is capped just above `max_rows`; it then runs under a time and
+    instruction budget. With `count`, a truncated result also reports its
+    exact total row count (except in "rows", whose payload has no total).
 
-def run_sql(sql: str) -> str:
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        cur.execute(sql)
-        rows = cur.fetchall()
-        cols = [desc[0] for desc in cur.description]
-        result = [dict(zip(cols, row)) for row in rows][:20]  # Cap output
-        conn.close()
-        return json.dumps({
-            "data": result,
-            "count": len(result),
-            "truncated": len(result) == 20
-        }, indent=2)
-    except Exception as e:
-        return f"SQL ERROR: {str(e)}"
\ No newline at end of file
+    "jsonl" encodes rows as tools.result_format.iter_json reads them off the
+    cursor, never holding more than one fetchmany() batch of Python rows.
+    """
+    with span("sql", fmt=fmt) as sp:
+        try:
+            if use_cache:
+                key = (os.path.abspath(DB_PATH), fmt, max_rows, max_bytes, count, normalize_sql(sql))
+                cached, stamp = QUERY_CACHE.get(key)
+                if cached is not None:
+                    sp.set(cache_hit=True)
+                    return cached
+            conn = get_connection()
+            with span("sql_preflight") as pf:
+                check = preflight(conn, sql, limit=max_rows + 1)
+                pf.set(plan_rows=check.estimated_rows, warnings=len(check.warnings),
+                       limited=check.limit is not None)
+            cur = conn.cursor()
+            try:
+                with budget(conn):
+                    cur.execute(check.sql)
+                    if fmt == "jsonl":
+                        lines = list(iter_json(cur, max_rows, max_bytes))
+                        meta = json.loads(lines[-1])
+                    else:
+                        result = fetch(cur, max_rows, max_bytes)
+                        meta = {"count": len(result.rows), "truncated": result.truncated}
+            finally:
+                cur.close()
+            total = None
+            if meta["truncated"] and count and fmt != "rows":
+                with span("sql_count"), budget(conn, timeout=COUNT_TIMEOUT):
+                    total = count_total(conn, sql)  # The caller's query, not the capped one
+            with span("json_serialize", fmt=fmt) as js:
+                if fmt == "jsonl":
+                    lines[-1] = trailer(meta["count"], meta["truncated"], total)
+                    output = "".join(lines)
+                else:
+                    if meta["truncated"]:
+                        result.total = total
+                    output = to_json(result, fmt)
+                js.set(bytes=len(output))
+            sp.set(cache_hit=False, rows=meta["count"], truncated=meta["truncated"])
+            if use_cache:
+                QUERY_CACHE.put(key, output, stamp)
+            return output
+        except SQLRejected as e:
+            sp.set(error="rejected")
+            return f"SQL ERROR: rejected: {e}"
+        except Exception as e:
+            sp.set(error=type(e).__name__)
+            return f"SQL ERROR: {str(e)}"
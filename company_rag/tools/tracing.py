@@ -0,0 +1,187 @@
+# company_rag/tools/tracing.py
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+TRACE_PATH = os.environ.get("AGENT_TRACE")  # JSONL file for finished spans; unset = histograms only
+PROFILE = os.environ.get("AGENT_PROFILE")  # "cprofile" or "pyinstrument", per trace()
+PROFILE_DIR = os.environ.get("AGENT_PROFILE_DIR", "profiles")
+MAX_SAMPLES = 10000  # Durations kept per span name for the histogram summaries
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def percentiles(samples_s) -> dict:
+    """p50/p95/p99/mean in milliseconds (nearest rank)."""
+    if not samples_s:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "n": 0}
+    ordered = sorted(samples_s)
+
+    def rank(p):
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1e3
+
+    return {"p50_ms": round(rank(50), 4), "p95_ms": round(rank(95), 4), "p99_ms": round(rank(99), 4),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1e3, 4), "n": len(ordered)}
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "attrs")
+
+    def __init__(self, name, trace_id, span_id, parent_id, attrs):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration = None
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Attach counts discovered while the span runs (rows, tokens, cache_hit, ...)."""
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {"trace": self.trace_id, "span": self.span_id, "parent": self.parent_id, "name": self.name,
+                "start": round(self.start, 6), "ms": round(self.duration * 1e3, 4), **self.attrs}
+
+
+class Tracer:
+    """Nested timing spans for the agent pipeline.
+
+    The current span lives in a contextvar, so spans opened inside a tool
+    nest under the turn that called it, across `await`s and (with
+    `contextvars.copy_context().run`) thread-pool hops. Every finished span
+    feeds a per-name histogram; with `path` set it is also appended to a
+    JSONL file. trace() opens a root span and, with `profile` set, runs it
+    under cProfile or pyinstrument and saves one profile per trace.
+    """
+
+    def __init__(self, path: str = None, profile: str = None, profile_dir: str = PROFILE_DIR,
+                 max_samples: int = MAX_SAMPLES):
+        self.path = path
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.max_samples = max_samples
+        self._samples = {}  # name -> deque of durations
+        self._counts = {}  # name -> {attr: total} for numeric attrs
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1) if path else None
+
+    @staticmethod
+    def _new_id() -> str:
+        return os.urandom(8).hex()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        parent = _current.get()
+        span = Span(name, parent.trace_id if parent else self._new_id(), self._new_id(),
+                    parent.span_id if parent else None, attrs)
+        token = _current.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _current.reset(token)
+            self._finish(span)
+
+    def record(self, name: str, duration: float, **attrs):
+        """Add an already-measured span (e.g. parse time summed over stream chunks)."""
+        parent = _current.get()
+        span = Span(name, parent.trace_id if parent else self._new_id(), self._new_id(),
+                    parent.span_id if parent else None, attrs)
+        span.duration = duration
+        self._finish(span)
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """Root span for one request, profiled when `profile` is set."""
+        token = _current.set(None)
+        try:
+            with self.span(name, **attrs) as span:
+                if not self.profile:
+                    yield span
+                    return
+                with self._profiled(span):
+                    yield span
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def _profiled(self, span):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, f"{span.name}-{span.trace_id}")
+        if self.profile == "pyinstrument":
+            from pyinstrument import Profiler  # Optional dependency
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(base + ".html", "w") as f:
+                    f.write(profiler.output_html())
+                span.set(profile=base + ".html")
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(base + ".prof")
+                span.set(profile=base + ".prof")
+
+    def _finish(self, span):
+        with self._lock:
+            samples = self._samples.get(span.name)
+            if samples is None:
+                samples = self._samples[span.name] = deque(maxlen=self.max_samples)
+            samples.append(span.duration)
+            counts = self._counts.setdefault(span.name, {})
+            for key, value in span.attrs.items():
+                if isinstance(value, (bool, int, float)):
+                    counts[key] = counts.get(key, 0) + value
+            if self._file is not None:
+                self._file.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    # === EXPORT ===
+    def summary(self) -> dict:
+        """{span name: latency percentiles plus totals of its numeric attributes}."""
+        with self._lock:
+            return {name: {**percentiles(list(samples)), "totals": dict(self._counts[name])}
+                    for name, samples in self._samples.items()}
+
+    def format_summary(self) -> str:
+        lines = [f"{'stage':<18} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  totals"]
+        for name, s in sorted(self.summary().items()):
+            totals = ", ".join(f"{k}={round(v, 3)}" for k, v in s["totals"].items())
+            lines.append(f"{name:<18} {s['n']:>6} {s['p50_ms']:>9.3f} {s['p95_ms']:>9.3f} {s['p99_ms']:>9.3f}  {totals}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+TRACER = Tracer(TRACE_PATH, PROFILE)
+
+
+def span(name: str, **attrs):
+    """Span on the process-wide tracer: `with span("sql", rows=3): ...`."""
+    return TRACER.span(name, **attrs)
@@ -0,0 +1,69 @@
+# company_rag/tools/vector_index.py
+import numpy as np
+
+
+class VectorIndex:
+    """Exact cosine search over a contiguous, row-normalized float32 matrix.
+
+    Built for small collections (the schema has one vector per table) where a
+    single matrix product beats a round trip through Chroma's HNSW + SQLite.
+    """
+
+    def __init__(self, ids, vectors, documents=None, metadatas=None):
+        mat = np.ascontiguousarray(vectors, dtype=np.float32)
+        if mat.ndim != 2:
+            mat = mat.reshape(len(ids), -1)
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = mat / norms
+        self.ids = list(ids)
+        self.documents = list(documents) if documents is not None else [None] * len(self.ids)
+        self.metadatas = list(metadatas) if metadatas is not None else [None] * len(self.ids)
+
+    @classmethod
+    def from_collection(cls, collection):
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        return cls(data["ids"], np.asarray(data["embeddings"], dtype=np.float32),
+                   data["documents"], data["metadatas"])
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def search(self, query_vecs, k: int):
+        """Top-k rows for each query. Returns (indices, scores), both shaped (n_queries, k)."""
+        q = np.asarray(query_vecs, dtype=np.float32)
+        if q.ndim == 1:
+            q = q[None, :]
+        q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+        k = min(k, len(self.ids))
+        if k == 0:
+            empty = np.zeros((len(q), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        scores = q @ self.matrix.T  # (n_queries, n_rows) cosine similarities
+        if k < scores.shape[1]:
+            # O(n) selection of the k best, then sort only those k
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def query(self, query_vecs, n_results: int = 3) -> dict:
+        """Same result shape as Chroma's `collection.query`.
+
+        Distances are squared L2 between unit vectors (2 - 2·cos), which is
+        what Chroma reports for its default "l2" space.
+        """
+        indices, scores = self.search(query_vecs, n_results)
+        return {
+            "ids": [[self.ids[i] for i in row] for row in indices],
+            "documents": [[self.documents[i] for i in row] for row in indices],
+            "metadatas": [[self.metadatas[i] for i in row] for row in indices],
+            "distances": [[float(2 - 2 * s) for s in row] for row in scores],
+        }
@@ -0,0 +1,204 @@
+# rag/aggregates.py
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DB_PATH = "../data/Chinook.db"
+STORE_PATH = "summary_store.db"  # Side database holding the rollups
+TOP_N = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agg_meta (
+    key   TEXT PRIMARY KEY,
+    value
+);
+CREATE TABLE IF NOT EXISTS agg_yearly_sales (
+    year  TEXT PRIMARY KEY,
+    sales REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agg_genre_revenue (
+    genre_id INTEGER PRIMARY KEY,
+    name     TEXT,
+    revenue  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agg_customer_spend (
+    customer_id INTEGER PRIMARY KEY,
+    name        TEXT,
+    spend       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_agg_genre_revenue ON agg_genre_revenue (revenue DESC);
+CREATE INDEX IF NOT EXISTS idx_agg_customer_spend ON agg_customer_spend (spend DESC);
+"""
+
+# Each delta reads only invoices in (high-water mark, new max] and folds the
+# result into the rollup with an upsert.
+DELTAS = [
+    """
+    INSERT INTO agg_yearly_sales (year, sales)
+    SELECT strftime('%Y', InvoiceDate), SUM(Total)
+    FROM src.Invoice
+    WHERE InvoiceId > :lo AND InvoiceId <= :hi
+    GROUP BY 1
+    ON CONFLICT (year) DO UPDATE SET sales = sales + excluded.sales
+    """,
+    """
+    INSERT INTO agg_genre_revenue (genre_id, name, revenue)
+    SELECT g.GenreId, g.Name, SUM(il.Quantity * il.UnitPrice)
+    FROM src.InvoiceLine il
+    JOIN src.Track t ON t.TrackId = il.TrackId
+    JOIN src.Genre g ON g.GenreId = t.GenreId
+    WHERE il.InvoiceId > :lo AND il.InvoiceId <= :hi
+    GROUP BY g.GenreId
+    ON CONFLICT (genre_id) DO UPDATE SET revenue = revenue + excluded.revenue,
+                                         name = excluded.name
+    """,
+    """
+    INSERT INTO agg_customer_spend (customer_id, name, spend)
+    SELECT c.CustomerId, c.FirstName || ' ' || c.LastName, SUM(i.Total)
+    FROM src.Invoice i
+    JOIN src.Customer c ON c.CustomerId = i.CustomerId
+    WHERE i.InvoiceId > :lo AND i.InvoiceId <= :hi
+    GROUP BY c.CustomerId
+    ON CONFLICT (customer_id) DO UPDATE SET spend = spend + excluded.spend,
+                                            name = excluded.name
+    """,
+]
+
+
+class AggregateStore:
+    """Yearly sales, genre revenue and customer spend kept in SQLite side tables.
+
+    Rollups are advanced incrementally from a high-water mark on InvoiceId, so
+    a refresh only reads invoices added since the last one. This assumes
+    invoices are append-only and written together with their lines; call
+    rebuild() after back-dated edits or deletes.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, store_path: str = STORE_PATH):
+        self.db_path = db_path
+        self.store_path = store_path
+        # uri=True so the ATTACH below may open the source with mode=ro; transactions
+        # are explicit (see _write) rather than opened implicitly at the first DML
+        self.conn = sqlite3.connect(Path(store_path).resolve().as_uri(), uri=True, isolation_level=None)
+        self.conn.executescript(SCHEMA)
+        src_uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        self.conn.execute("ATTACH DATABASE ? AS src", (src_uri,))
+
+    # === META ===
+    def _meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM agg_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, **values):
+        self.conn.executemany(
+            "INSERT INTO agg_meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            values.items(),
+        )
+
+    @property
+    def high_water_mark(self) -> int:
+        return self._meta("high_water_mark", 0)
+
+    def source_max_id(self) -> int:
+        # Primary-key lookup, O(log n) regardless of table size
+        return self.conn.execute("SELECT MAX(InvoiceId) FROM src.Invoice").fetchone()[0] or 0
+
+    # === MAINTENANCE ===
+    @contextmanager
+    def _write(self):
+        """BEGIN IMMEDIATE: take the store's write lock before reading the high-water
+        mark, so two concurrent refreshes cannot both fold the same invoice range."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def _fold(self) -> int:
+        # Caller holds the write transaction: mark, upserts and new mark commit together
+        lo = self.high_water_mark
+        hi = self.source_max_id()
+        now = datetime.now().isoformat()
+        if hi <= lo:
+            self._set_meta(checked_at=now)
+            return 0
+        for sql in DELTAS:
+            self.conn.execute(sql, {"lo": lo, "hi": hi})
+        added = self.conn.execute(
+            "SELECT COUNT(*) FROM src.Invoice WHERE InvoiceId > ? AND InvoiceId <= ?", (lo, hi)
+        ).fetchone()[0]
+        self._set_meta(high_water_mark=hi, refreshed_at=now, checked_at=now,
+                       invoices_seen=self._meta("invoices_seen", 0) + added)
+        return added
+
+    def refresh(self) -> int:
+        """Fold invoices above the high-water mark into the rollups. Returns how many were added."""
+        with self._write():
+            return self._fold()
+
+    def rebuild(self) -> int:
+        """Drop every rollup and recompute from scratch, in one transaction (readers never see it empty)."""
+        with self._write():
+            for table in ("agg_yearly_sales", "agg_genre_revenue", "agg_customer_spend", "agg_meta"):
+                self.conn.execute(f"DELETE FROM {table}")
+            return self._fold()
+
+    def ensure_fresh(self) -> int:
+        """Refresh only if the source has invoices past the high-water mark."""
+        if self.source_max_id() > self.high_water_mark:
+            return self.refresh()
+        return 0
+
+    # === READ ===
+    def yearly_sales(self) -> dict:
+        rows = self.conn.execute("SELECT year, sales FROM agg_yearly_sales ORDER BY year")
+        return {year: round(sales, 2) for year, sales in rows}
+
+    def top_genres(self, n: int = TOP_N) -> list:
+        rows = self.conn.execute(
+            "SELECT name, revenue FROM agg_genre_revenue ORDER BY revenue DESC LIMIT ?", (n,))
+        return [(name, round(revenue, 2)) for name, revenue in rows]
+
+    def top_customers(self, n: int = TOP_N) -> list:
+        rows = self.conn.execute(
+            "SELECT name, spend FROM agg_customer_spend ORDER BY spend DESC LIMIT ?", (n,))
+        return [(name, round(spend, 2)) for name, spend in rows]
+
+    def freshness(self) -> dict:
+        refreshed_at = self._meta("refreshed_at")
+        hwm = self.high_water_mark
+        source_max = self.source_max_id()
+        pending = self.conn.execute(
+            "SELECT COUNT(*) FROM src.Invoice WHERE InvoiceId > ?", (hwm,)).fetchone()[0]
+        age = None
+        if refreshed_at:
+            age = time.time() - datetime.fromisoformat(refreshed_at).timestamp()
+        return {
+            "refreshed_at": refreshed_at,
+            "checked_at": self._meta("checked_at"),
+            "age_seconds": age,
+            "high_water_mark": hwm,
+            "source_max_id": source_max,
+            "pending_invoices": pending,
+            "invoices_seen": self._meta("invoices_seen", 0),
+        }
+
+    def snapshot(self) -> dict:
+        """All rollups in the shape the old summary_cache.json used."""
+        return {
+            "generated_at": self._meta("refreshed_at"),
+            "freshness": self.freshness(),
+            "data": {
+                "yearly_sales": self.yearly_sales(),
+                "top_genres": self.top_genres(),
+                "top_customers": self.top_customers(),
+            },
+        }
+
+    def close(self):
+        self.conn.close()
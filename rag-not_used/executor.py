@@ -1,34 +1,88 @@
 # rag/chatbot.py
 import json
-import sqlite3
-import ollama
-from ollama import Client  # optional, but cleaner
+import os
+import sys
+
+# Shared result formatting lives in company_rag/tools
+COMPANY_RAG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "company_rag")
+sys.path.insert(0, COMPANY_RAG)
+from tools.lexical_index import load_index
+from tools.llm_client import LLMClient
+from tools.result_format import count_total, fetch
+from tools.speculative import Speculator
+from tools.sql_guard import SQLRejected, budget, preflight
+from tools.sql_tool import COUNT_TIMEOUT, get_connection
 
 DB_PATH = "../data/Chinook.db"
 MODEL = "corpgpt-sales"
+MAX_ROWS = 50  # Rows kept per query; row_count is still the exact total (None if counting it failed)
+MAX_BYTES = 64 * 1024
+SPECULATE_TABLES = 4  # Tables guessed from the question while the LLM writes SQL
+# Static instructions go in the system message so every explain call shares the same prefix
+EXPLAIN_SYSTEM = ("You are a sales analyst. Be concise. Explain the query result you are given "
+                  "in 1-2 sentences. Business English. No jargon.")
+
+# keep_alive on every call, temperature 0 and an on-disk response cache (.llm_cache.db)
+LLM = LLMClient(MODEL)
 
 # === SQL EXECUTOR ===
-def execute_sql(sql):
+def _run_sql(sql):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        # Read-only connection from tools.sql_tool's pool: one per thread, reused across calls
+        conn = get_connection(DB_PATH)
+        # Read-only, plan-checked and LIMIT-capped before it runs; then time/instruction budgeted
+        check = preflight(conn, sql, limit=MAX_ROWS + 1)
         cur = conn.cursor()
-        cur.execute(sql)
-        rows = cur.fetchall()
-        cols = [desc[0] for desc in cur.description]
-        result = [dict(zip(cols, row)) for row in rows]
-        conn.close()
-        return {"data": result, "row_count": len(result)}
+        try:
+            with budget(conn):
+                cur.execute(check.sql)
+                # Bounded read: never more than MAX_ROWS rows in memory, whatever the table size
+                result = fetch(cur, MAX_ROWS, MAX_BYTES)
+        finally:
+            cur.close()
+        total = len(result.rows)
+        if result.truncated:
+            # None when the count fails or runs out of its budget; never the partial row count
+            with budget(conn, timeout=COUNT_TIMEOUT):
+                total = count_total(conn, sql)
+        return {"data": result.records(), "row_count": total, "truncated": result.truncated}
+    except SQLRejected as e:
+        return {"error": f"rejected: {e}"}
     except Exception as e:
         return {"error": str(e)}
 
+def _db_stamp():
+    st = os.stat(DB_PATH)
+    return st.st_mtime_ns, st.st_size
+
+# === SPECULATION ===
+# While generate_sql waits on the LLM, the tables the question is probably about
+# (BM25 over the schema chunks) are warmed and their usual queries run ahead
+SPECULATOR = Speculator(_run_sql, DB_PATH, stamp_fn=_db_stamp)
+LEXICAL = load_index(os.path.join(COMPANY_RAG, "schema_bm25.idx"))
+
+def speculate(query):
+    if LEXICAL is None:
+        return []
+    return SPECULATOR.speculate([table for table, _ in LEXICAL.search(query, SPECULATE_TABLES)])
+
+def execute_sql(sql):
+    result = SPECULATOR.take(sql)  # Ran (or is running) ahead of the LLM?
+    if result is None:
+        result = _run_sql(sql)
+    if "error" not in result:
+        SPECULATOR.record(sql)
+    return result
+
 # === LLM SQL GENERATOR ===
 def generate_sql(query):
-    response = ollama.chat(model=MODEL, messages=[
-        {'role': 'user', 'content': query}
-    ])
+    # The Modelfile's SYSTEM block is the fixed prefix; only the question follows it
     try:
-        return json.loads(response['message']['content'])
+        response = LLM.chat([{'role': 'user', 'content': query}])
+    except OSError as e:
+        return {"error": f"LLM unavailable: {e}"}
+    try:
+        return json.loads(response.text)
     except:
         return {"error": "LLM didn't return valid JSON"}
 
@@ -37,18 +91,17 @@ def explain_result(sql, result):
     if "error" in result:
         return f"SQL Error: {result['error']}"
 
-    prompt = f"""
-    SQL: {sql}
-    RESULT: {json.dumps(result['data'][:10], indent=2)}  # cap at 10 rows
-    ROWS: {result['row_count']}
-    
-    Explain in 1-2 sentences. Business English. No jargon.
-    """
-    resp = ollama.chat(model=MODEL, messages=[
-        {'role': 'system', 'content': 'You are a sales analyst. Be concise.'},
-        {'role': 'user', 'content': prompt}
-    ])
-    return resp['message']['content'].strip()
+    # Cap at 10 rows
+    rows = result['row_count'] if result['row_count'] is not None else f"more than {len(result['data'])}"
+    prompt = f"SQL: {sql}\nRESULT: {json.dumps(result['data'][:10], indent=2)}\nROWS: {rows}"
+    try:
+        response = LLM.chat([
+            {'role': 'system', 'content': EXPLAIN_SYSTEM},
+            {'role': 'user', 'content': prompt}
+        ])
+    except OSError as e:
+        return f"(No explanation: LLM unavailable: {e})"
+    return response.text.strip()
 
 # === MAIN CHAT LOOP ===
 def main():
@@ -58,11 +111,13 @@ def main():
     while True:
         user_query = input("You: ").strip()
         if user_query.lower() in ['quit', 'exit', 'bye']:
+            print(f"🧠 LLM: {LLM.stats()}")
             print("Logged out. Phase 3 active.")
             break
         if not user_query:
             continue
 
+        speculate(user_query)
         print("🤖 Generating SQL...")
         json_resp = generate_sql(user_query)
         
@@ -85,7 +140,9 @@ def main():
             print(f"❌ DB Error: {result['error']}")
         else:
             print(json.dumps(result["data"][:5], indent=2))  # show first 5
-            if result["row_count"] > 5:
+            if result["row_count"] is None:
+                print("... more rows (total not counted)")
+            elif result["row_count"] > 5:
                 print(f"... +{result['row_count'] - 5} more rows")
         
         print(f"\n💬 {explanation}")
@@ -1,61 +1,98 @@
 # rag/rag_chatbot.py
+import importlib.util
 import json
+import os
 import re
+import sqlite3
+import sys
+from pathlib import Path
 
-try:
-    import ollama
-    from ollama import Client
-    OLLAMA_AVAILABLE = True
-except ImportError:
-    OLLAMA_AVAILABLE = False
-    print("Warning: ollama module not available. LLM features disabled.")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "company_rag"))
+from tools.sql_templates import TemplateMatcher
+
+from aggregates import AggregateStore
+from executor import DB_PATH, LLM, execute_sql
 
 MODEL = "corpgpt-sales"
-SUMMARY_FILE = "summary_cache.json"  # Changed from "rag/summary_cache.json"
 
-# Load summaries
-try:
-    with open(SUMMARY_FILE) as f:
-        CACHE = json.load(f)["data"]
-except:
-    print("Run summaries.py first!")
-    exit(1)
+# Materialized rollups; built on first use and advanced incrementally afterwards
+STORE = AggregateStore()
+
+_matcher = None
+
+def _as_of():
+    fresh = STORE.freshness()
+    return f"[as of invoice #{fresh['high_water_mark']}, refreshed {fresh['refreshed_at']}]"
+
+def get_matcher():
+    """Template matcher over the live DB; adds embedding similarity when sentence-transformers is installed."""
+    global _matcher
+    if _matcher is None:
+        embedder = None
+        if importlib.util.find_spec("sentence_transformers") is not None:
+            from tools.embeddings import get_service
+            embedder = get_service()
+        conn = sqlite3.connect(Path(DB_PATH).resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            _matcher = TemplateMatcher(conn, embedder=embedder)
+        finally:
+            conn.close()
+    return _matcher
+
+def _from_rollups(match):
+    """Answer from the materialized aggregates when the template asks exactly what they hold."""
+    if match.name == "total_sales" and set(match.params) == {"year"}:
+        year = match.params["year"]
+        STORE.ensure_fresh()
+        sales = STORE.yearly_sales().get(year)
+        if sales is None:
+            return f"No sales recorded in {year}. {_as_of()}"
+        return f"Total sales in {year}: ${sales:.2f} {_as_of()}"
+
+    if match.name == "top_genres" and match.params == {"n": 1}:
+        STORE.ensure_fresh()
+        top = STORE.top_genres(1)
+        if not top:
+            return None  # Empty store (fresh, or no invoices yet): the SQL path answers
+        return f"Top genre: {top[0][0]} with ${top[0][1]:.2f} in revenue. {_as_of()}"
+
+    if match.name == "top_customers" and match.params == {"n": 1}:
+        STORE.ensure_fresh()
+        top = STORE.top_customers(1)
+        if not top:
+            return None
+        return f"Top customer: {top[0][0]} (${top[0][1]:.2f}) {_as_of()}"
+    return None
 
 def rag_answer(query):
-    if not OLLAMA_AVAILABLE:
-        return "LLM features disabled due to missing ollama module."
-    
-    q = query.lower()
-
-    # === FAST PATH: Direct from cache ===
-    if "2013" in q and "sales" in q:
-        return f"Total sales in 2013: ${CACHE['yearly_sales'].get('2013', 'N/A'):.2f}"
-    
-    if "top genre" in q:
-        top = CACHE["top_genres"][0]
-        return f"Top genre: {top[0]} with ${top[1]:.2f} in revenue."
-    
-    if "top customer" in q:
-        top = CACHE["top_customers"][0]
-        return f"Top customer: {top[0]} (${top[1]:.2f})"
+    # === FAST PATH: Templates (rollups, else filled SQL) ===
+    match = get_matcher().match(query)
+    if match is not None:
+        answer = _from_rollups(match)
+        if answer is not None:
+            return answer
+        result = execute_sql(match.sql)
+        if "error" not in result:
+            return match.answer(result["data"])
 
     # === SLOW PATH: LLM + SQL ===
-    response = ollama.chat(model=MODEL, messages=[
-        {'role': 'user', 'content': query}
-    ])
-    raw = response['message']['content'].strip()
+    try:
+        response = LLM.chat([{'role': 'user', 'content': query}])
+    except OSError as e:
+        return f"LLM unavailable ({e}). Try: 'sales in 2013', 'top 5 genres in Germany'"
+    raw = response.text.strip()
     raw = re.sub(r"^```json\n|```$", "", raw, flags=re.MULTILINE).strip()
 
     try:
         data = json.loads(raw)
         return f"SQL: {data['query']}\n→ {data['explanation']}"
     except:
-        return "Sorry, I couldn't process that. Try: 'sales in 2013', 'top genre'"
+        return "Sorry, I couldn't process that. Try: 'sales in 2013', 'top 5 genres in Germany'"
 
 # === LIVE CHAT ===
 def main():
     print("🚀 Merchantile RAG v2 – Fast + Smart")
-    print("Ask: 'sales 2013', 'top genre', or anything\n")
+    print("Ask: 'sales 2024', 'top genre', or anything\n")
 
     while True:
         q = input("You: ").strip()
@@ -1,51 +1,25 @@
 # rag/summaries.py
-import sqlite3
 import json
-from datetime import datetime
+import sys
 
-DB_PATH = "../data/Chinook.db"
+from aggregates import AggregateStore, DB_PATH
 
-def generate_summaries():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def generate_summaries(rebuild=False):
+    """Bring the materialized rollups in summary_store.db up to date.
 
-    summaries = {}
+    Only invoices added since the last run are read; pass rebuild=True to
+    recompute everything from scratch.
+    """
+    store = AggregateStore(DB_PATH)
+    added = store.rebuild() if rebuild else store.refresh()
+    snapshot = store.snapshot()
+    store.close()
 
-    # 1. Yearly sales
-    cur.execute("""
-        SELECT strftime('%Y', InvoiceDate) AS year, SUM(Total) AS sales
-        FROM Invoice GROUP BY year ORDER BY year
-    """)
-    summaries["yearly_sales"] = {row[0]: row[1] for row in cur.fetchall()}
-
-    # 2. Top genres
-    cur.execute("""
-        SELECT g.Name, SUM(il.Quantity * il.UnitPrice) AS revenue
-        FROM Genre g
-        JOIN Track t ON g.GenreId = t.GenreId
-        JOIN InvoiceLine il ON t.TrackId = il.TrackId
-        GROUP BY g.Name ORDER BY revenue DESC LIMIT 5
-    """)
-    summaries["top_genres"] = [(row[0], row[1]) for row in cur.fetchall()]
-
-    # 3. Top customers
-    cur.execute("""
-        SELECT c.FirstName || ' ' || c.LastName AS name, SUM(i.Total) AS spend
-        FROM Customer c JOIN Invoice i ON c.CustomerId = i.CustomerId
-        GROUP BY c.CustomerId ORDER BY spend DESC LIMIT 5
-    """)
-    summaries["top_customers"] = [(row[0], row[1]) for row in cur.fetchall()]
-
-    # Save
-    # Save
-    with open("summary_cache.json", "w") as f:  # Changed from "rag/summary_cache.json"
-        json.dump({
-            "generated_at": datetime.now().isoformat(),
-            "data": summaries
-        }, f, indent=2)
-    
-    print("Summaries cached: summary_cache.json")  # Updated message
-    conn.close()
+    fresh = snapshot["freshness"]
+    print(f"Summaries refreshed: +{added} invoices "
+          f"(high-water mark {fresh['high_water_mark']}, {fresh['invoices_seen']} total)")
+    return snapshot
 
 if __name__ == "__main__":
-    generate_summaries()
\ No newline at end of file
+    snapshot = generate_summaries(rebuild="--rebuild" in sys.argv)
+    print(json.dumps(snapshot["data"], indent=2))
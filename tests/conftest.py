@@ -0,0 +1,30 @@
+# tests/conftest.py
+# The code runs from its own directory (company_rag/ imports `tools.*`,
+# rag-not_used/ imports its siblings), so put both on sys.path.
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for sub in ("company_rag", "rag-not_used"):
+    path = os.path.join(ROOT, sub)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+CHINOOK = os.path.join(ROOT, "data", "Chinook.db")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def workdir(tmp_path_factory):
+    """Run from a scratch directory shaped like the repo: modules open "../data/Chinook.db"
+    relative to the working directory and drop side files (summary_store.db,
+    sql_history.jsonl, ...) next to it."""
+    root = tmp_path_factory.mktemp("repo")
+    (root / "data").mkdir()
+    (root / "data" / "Chinook.db").symlink_to(CHINOOK)
+    (root / "work").mkdir()
+    previous = os.getcwd()
+    os.chdir(root / "work")
+    yield root / "work"
+    os.chdir(previous)
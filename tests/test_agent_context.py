@@ -0,0 +1,45 @@
+# tests/test_agent_context.py
+from agent_context import SEPARATOR, AgentContext, estimate_tokens
+
+
+def chunk(table, n_rows=3):
+    rows = "\n".join(f"{i} | value {i} for {table}" for i in range(n_rows))
+    return f"TABLE: {table}\nCOLUMNS: {table}Id, Name\nSAMPLE ROWS:\n{rows}"
+
+
+def test_repeated_table_is_a_pointer():
+    ctx = AgentContext()
+    ctx.add("retrieve_schema", "artists", chunk("Artist"))
+    entry = ctx.add("retrieve_schema", "albums", SEPARATOR.join([chunk("Artist"), chunk("Album")]))
+    assert "TABLE: Artist (shown above)" in entry["text"]
+    assert ctx.render().count("SAMPLE ROWS") == 2
+
+
+def test_pointer_is_expanded_when_its_table_is_trimmed():
+    ctx = AgentContext(token_budget=10_000)
+    ctx.add("retrieve_schema", "artists", chunk("Artist", n_rows=40))
+    ctx.add("retrieve_schema", "albums", SEPARATOR.join([chunk("Artist"), chunk("Album")]))
+    ctx.add("retrieve_schema", "again", chunk("Artist"))
+    # Room for the two newest entries plus one expanded Artist table, not for the first entry
+    first, *rest = ctx.entries
+    ctx.token_budget = sum(estimate_tokens(e["text"]) for e in rest) + estimate_tokens(ctx.table_text["Artist"])
+    history = ctx.render()
+    assert "1 earlier tool result(s) omitted" in history
+    assert "value 39 for Artist" in history  # Full table is back
+    assert history.count("TABLE: Artist\nCOLUMNS") == 1  # Expanded once, at the first kept pointer
+    assert history.count("TABLE: Artist (shown above)") == 1
+    assert history.index("TABLE: Artist\nCOLUMNS") < history.index("TABLE: Artist (shown above)")
+
+
+def test_expansion_stays_within_budget():
+    ctx = AgentContext(token_budget=10_000)
+    ctx.add("retrieve_schema", "artists", chunk("Artist", n_rows=10))
+    for i in range(5):
+        ctx.add("retrieve_schema", f"q{i}", SEPARATOR.join([chunk("Artist"), chunk(f"T{i}")]))
+    # Fits the five pointer entries, but not those plus the expanded Artist table
+    ctx.token_budget = sum(estimate_tokens(e["text"]) for e in ctx.entries[1:])
+    history = ctx.render()
+    body = history.split("]\n", 1)[1]
+    assert estimate_tokens(body) <= ctx.token_budget
+    assert "value 9 for Artist" in history
+    assert "earlier tool result(s) omitted" in history and "TABLE: T0" not in history
@@ -0,0 +1,239 @@
+# tests/test_agent_core.py
+import asyncio
+import json
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from agent_core import Agent, ToolStreamParser, parse_tool_calls
+from tools.registry import Registry
+from tools.speculative import PROBE, SQLHistory, Speculator
+
+
+class Retriever:
+    def retrieve_many(self, queries):
+        return [f"TABLE: {q}" for q in queries]
+
+    def retrieve_merged(self, queries):
+        return " | ".join(queries)
+
+
+class AnswerCache:
+    def current_stamp(self):
+        return 1
+
+    def lookup(self, question):
+        return SimpleNamespace(answer="42", sql="SELECT 42", data="[]"), 1.0
+
+
+def lazy_agent():
+    """Agent over LazyResources that record which thread built them."""
+    registry, built = Registry(), {}
+
+    def factory(name, cls):
+        def build():
+            built[name] = threading.current_thread().name
+            return cls()
+        registry.register(name, build)
+        return registry.lazy(name)
+
+    agent = Agent(None, factory("retriever", Retriever), factory("answer_cache", AnswerCache), speculate=False)
+    return agent, built
+
+
+def test_lazy_resources_build_on_worker_threads():
+    agent, built = lazy_agent()
+
+    async def run():
+        turn = await agent.run_turn("what is the answer")
+        batched = await agent.retrieve_schema("artists")
+        merged = await agent.retrieve_schema("artists | bands")
+        return turn, batched, merged
+
+    try:
+        turn, batched, merged = asyncio.run(run())
+    finally:
+        agent.close()
+    assert turn.cached and turn.answer == "42"
+    assert batched == "TABLE: artists" and merged == "artists | bands"
+    assert built["retriever"].startswith("embed") and built["answer_cache"].startswith("embed")
+
+
+
+def speculating_agent(sql, **limits):
+    """Agent with a speculative run of `sql` already queued."""
+    agent = Agent(None, Retriever(), **limits)
+    agent.speculator.history = SQLHistory(path=None)
+    agent.speculator.record(sql)
+    assert sql in agent.speculator.speculate(["Artist"])
+    return agent
+
+
+def test_speculative_hit_matches_execute_sql():
+    sql = "SELECT Name FROM Artist ORDER BY ArtistId"
+    plain_agent = Agent(None, Retriever(), speculate=False, max_rows=3)
+    agent = speculating_agent(sql, max_rows=3)
+    try:
+        plain = asyncio.run(plain_agent.execute_sql(sql))
+        speculated = asyncio.run(agent.execute_sql(sql))
+    finally:
+        plain_agent.close()
+        agent.close()
+    assert agent.speculator.hits == 1
+    assert speculated == plain
+    assert json.loads(plain)["count"] == 3
+
+
+def test_speculative_hit_waits_for_sql_slot():
+    sql = "SELECT Name FROM Artist ORDER BY ArtistId"
+    agent = speculating_agent(sql, sql_concurrency=1)
+
+    async def run():
+        async with agent.sql_limit:
+            task = asyncio.ensure_future(agent.execute_sql(sql))
+            await asyncio.sleep(0.05)
+            blocked = not task.done()
+        return blocked, await task
+
+    try:
+        blocked, result = asyncio.run(run())
+    finally:
+        agent.close()
+    assert blocked and agent.speculator.hits == 1
+    assert not result.startswith("SQL ERROR")
+
+
+def test_probe_quotes_table_names():
+    spec = Speculator(lambda sql: sql, "../data/Chinook.db", history=SQLHistory(path=None))
+    spec._known = {"Order Details"}
+    try:
+        queued = spec.speculate(["Order Details"])
+    finally:
+        spec.close()
+    assert queued == [PROBE.format(table='"Order Details"')]
+
+
+def test_concurrent_retrievals_share_one_batch():
+    agent = Agent(None, Retriever(), speculate=False)
+
+    async def run():
+        return await asyncio.gather(*(agent.retrieve_schema(q) for q in ("a", "b", "a")))
+
+    try:
+        assert asyncio.run(run()) == ["TABLE: a", "TABLE: b", "TABLE: a"]
+    finally:
+        agent.close()
+    assert agent.retrieval.batches == 1 and agent.retrieval.queries == 3
+    assert not agent.retrieval._tasks
+
+
+def test_close_cancels_batches_in_flight():
+    release = threading.Event()
+
+    class SlowRetriever(Retriever):
+        def retrieve_many(self, queries):
+            release.wait(5)
+            return super().retrieve_many(queries)
+
+    agent = Agent(None, SlowRetriever(), speculate=False, embed_concurrency=1)
+
+    async def run():
+        waiting = [asyncio.ensure_future(agent.retrieve_schema(q)) for q in ("a", "b")]
+        await asyncio.sleep(0.05)
+        assert len(agent.retrieval._tasks) == 1  # The flush holds a reference to itself
+        agent.retrieval.close()
+        results = await asyncio.gather(*waiting, return_exceptions=True)
+        release.set()
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        agent.close()
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
+    assert not agent.retrieval._tasks
+
+
+class ScriptedChain:
+    """ainvoke() returns the scripted responses in order."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+
+    async def ainvoke(self, inputs):
+        return self.responses.pop(0)
+
+
+class BrokenCache:
+    def current_stamp(self):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    def lookup(self, question):
+        raise AssertionError("not reached")
+
+    def store(self, *args, **kwargs):
+        raise RuntimeError("embedding model failed to load")
+
+
+@pytest.mark.parametrize("cache", ["broken", "unbuildable"])
+def test_answer_cache_failure_is_a_miss(cache):
+    registry = Registry()
+    registry.register("answer_cache", lambda: (_ for _ in ()).throw(OSError("no model")))
+    answer_cache = BrokenCache() if cache == "broken" else registry.lazy("answer_cache")
+    chain = ScriptedChain("TOOL: execute_sql\nARGS: SELECT COUNT(*) AS n FROM Artist", "There are 275 artists.")
+    agent = Agent(chain, Retriever(), answer_cache, stream=False, speculate=False)
+    events = []
+    try:
+        turn = asyncio.run(agent.run_turn("how many artists", on_event=lambda kind, **p: events.append(kind)))
+    finally:
+        agent.close()
+    assert turn.answer == "There are 275 artists." and turn.sql and not turn.cached
+    assert "error" not in events
+
+
+def stream(response, size, max_calls=3):
+    """(text, tool blocks, done) from feeding `response` to a parser `size` characters at a time."""
+    parser, events = ToolStreamParser(max_calls), []
+    for i in range(0, len(response), size):
+        events += parser.feed(response[i:i + size])
+    events += parser.close()
+    text = "".join(e[1] for e in events if e[0] == "text")
+    return text, [e[1:] for e in events if e[0] == "tool"], parser.done
+
+
+PARSES = [
+    # Plain answer
+    ("There are 275 artists.\nMost have one album.", "There are 275 artists.\nMost have one album.", [], False),
+    # One block, then more generation that is never read
+    ("TOOL: execute_sql\nARGS: SELECT 1\n\nThe answer is", "", [("execute_sql", "SELECT 1")], True),
+    # Multiple blocks, with and without a blank line between them
+    ("TOOL: retrieve_schema\nARGS: albums\nTOOL: execute_sql\nARGS: SELECT 1\n\nTOOL: execute_sql\nARGS: SELECT 2",
+     "", [("retrieve_schema", "albums"), ("execute_sql", "SELECT 1"), ("execute_sql", "SELECT 2")], True),
+    # Prose before a block is streamed; args continue over several lines
+    ("Let me check.\nTOOL: execute_sql\nARGS: SELECT Name\n  FROM Artist\n",
+     "Let me check.\n", [("execute_sql", "SELECT Name FROM Artist")], False),
+    # Fenced args keep going over a blank line inside the fence
+    ("TOOL: execute_sql\nARGS: ```sql\nSELECT Name\n\nFROM Artist\n```\n\nprose",
+     "", [("execute_sql", "```sql SELECT Name FROM Artist ```")], True),
+    # TOOL without ARGS is prose, whatever follows it
+    ("TOOL: execute_sql\n\nI could not find that table.", "TOOL: execute_sql\n\nI could not find that table.", [], False),
+    ("TOOL: execute_sql\nI could not find that table.\n", "TOOL: execute_sql\nI could not find that table.\n", [], False),
+    ("The tool is called\nTOOL: execute_sql", "The tool is called\nTOOL: execute_sql", [], False),
+    # ARGS outside a block is prose
+    ("ARGS: none needed\nDone.", "ARGS: none needed\nDone.", [], False),
+]
+
+
+@pytest.mark.parametrize("size", [1, 3, 5, 10_000])
+@pytest.mark.parametrize("response, text, tools, done", PARSES)
+def test_tool_stream_parser(response, text, tools, done, size):
+    # Small chunk sizes split the TOOL:/ARGS: markers mid-word
+    assert stream(response, size) == (text, tools, done)
+    assert parse_tool_calls(response, max_calls=3) == tools
+
+
+def test_tool_stream_parser_stops_at_max_calls():
+    response = "TOOL: a\nARGS: 1\nTOOL: b\nARGS: 2\n"
+    assert stream(response, 3, max_calls=1) == ("", [("a", "1")], True)
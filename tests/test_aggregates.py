@@ -0,0 +1,83 @@
+# tests/test_aggregates.py
+import sqlite3
+import threading
+
+from aggregates import AggregateStore
+from conftest import CHINOOK
+
+
+def expected_yearly_sales():
+    conn = sqlite3.connect(CHINOOK)
+    try:
+        rows = conn.execute("SELECT strftime('%Y', InvoiceDate), SUM(Total) FROM Invoice GROUP BY 1")
+        return {year: round(sales, 2) for year, sales in rows}
+    finally:
+        conn.close()
+
+
+def test_refresh_matches_source(tmp_path):
+    store = AggregateStore(CHINOOK, str(tmp_path / "store.db"))
+    try:
+        assert store.refresh() > 0
+        assert store.yearly_sales() == expected_yearly_sales()
+        assert store.refresh() == 0  # Nothing new past the high-water mark
+        assert store.yearly_sales() == expected_yearly_sales()
+    finally:
+        store.close()
+
+
+def test_concurrent_refreshes_fold_each_invoice_once(tmp_path):
+    path = str(tmp_path / "store.db")
+    AggregateStore(CHINOOK, path).close()  # Create the schema up front
+    barrier = threading.Barrier(4)
+    added, errors = [], []
+
+    def refresh():
+        store = AggregateStore(CHINOOK, path)  # One connection per thread, like separate processes
+        try:
+            barrier.wait()
+            added.append(store.refresh())
+        except Exception as e:  # pragma: no cover - surfaced by the assert below
+            errors.append(e)
+        finally:
+            store.close()
+
+    threads = [threading.Thread(target=refresh) for _ in range(barrier.parties)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    invoices = sqlite3.connect(CHINOOK).execute("SELECT COUNT(*) FROM Invoice").fetchone()[0]
+    assert sorted(added) == [0, 0, 0, invoices]  # One refresh folded everything, the others found nothing
+    store = AggregateStore(CHINOOK, path)
+    try:
+        assert store.yearly_sales() == expected_yearly_sales()
+    finally:
+        store.close()
+
+
+def test_rebuild_recomputes_in_place(tmp_path):
+    store = AggregateStore(CHINOOK, str(tmp_path / "store.db"))
+    try:
+        store.refresh()
+        before = store.snapshot()["data"]
+        assert store.rebuild() > 0
+        assert store.snapshot()["data"] == before
+        assert store.high_water_mark == store.source_max_id()
+    finally:
+        store.close()
+
+
+def test_rebuild_is_invisible_to_readers(tmp_path):
+    path = str(tmp_path / "store.db")
+    writer, reader = AggregateStore(CHINOOK, path), AggregateStore(CHINOOK, path)
+    try:
+        writer.refresh()
+        writer.conn.execute("BEGIN IMMEDIATE")
+        writer.conn.execute("DELETE FROM agg_yearly_sales")  # As rebuild() does, mid-transaction
+        assert reader.yearly_sales() == expected_yearly_sales()
+        writer.conn.execute("ROLLBACK")
+    finally:
+        writer.close()
+        reader.close()
@@ -0,0 +1,62 @@
+# tests/test_answer_cache.py
+import sqlite3
+
+import numpy as np
+import pytest
+
+from conftest import CHINOOK
+from tools.answer_cache import EntityExtractor, SemanticAnswerCache
+
+
+class SameVector:
+    """Every question embeds identically, so only the guard can tell them apart."""
+
+    def embed_one(self, text):
+        return np.ones(4, dtype=np.float32) / 2
+
+
+@pytest.fixture(scope="module")
+def entities():
+    conn = sqlite3.connect(CHINOOK)
+    try:
+        return EntityExtractor(conn)
+    finally:
+        conn.close()
+
+
+def cache_with(entities, question):
+    cache = SemanticAnswerCache(SameVector(), entities_fn=entities)
+    cache.store(question, "answer", sql="SELECT 1")
+    return cache
+
+
+@pytest.mark.parametrize("first, second", [
+    ("total sales in Germany", "total sales in France"),
+    ("top rock tracks", "top jazz tracks"),
+    ("how many albums does Iron Maiden have", "how many albums does Metallica have"),
+    ("sales in 2012", "sales in 2013"),
+])
+def test_different_values_miss(entities, first, second):
+    assert cache_with(entities, first).lookup(second) is None
+
+
+@pytest.mark.parametrize("first, second", [
+    ("total sales in the UK", "total sales in United Kingdom"),
+    ("top hip hop tracks", "best Hip Hop/Rap tracks"),
+    ("what are the best selling tracks", "which tracks sell best"),
+])
+def test_same_values_hit(entities, first, second):
+    hit = cache_with(entities, first).lookup(second)
+    assert hit is not None and hit[0].question == first
+
+
+def test_extractor_names_values(entities):
+    assert entities("sales of Metallica in the USA") == {("artist", "Metallica"), ("country", "USA")}
+    assert entities("revenue by country and genre") == frozenset()
+
+
+def test_guard_is_literals_only_without_extractor():
+    cache = SemanticAnswerCache(SameVector())
+    cache.store("total sales in Germany", "answer")
+    assert cache.lookup("total sales in France") is not None
+    assert cache.lookup("total sales in 2013") is None
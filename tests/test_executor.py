@@ -0,0 +1,41 @@
+# tests/test_executor.py
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def executor():
+    import executor  # After the chdir: its Speculator resolves "../data/Chinook.db" at import
+    return executor
+
+
+def test_run_sql_reports_exact_totals(executor):
+    result = executor._run_sql("SELECT Name FROM Artist WHERE ArtistId <= 3")
+    assert result == {"data": [{"Name": "AC/DC"}, {"Name": "Accept"}, {"Name": "Aerosmith"}],
+                      "row_count": 3, "truncated": False}
+    result = executor._run_sql("SELECT Name FROM Artist")
+    assert result["truncated"] and len(result["data"]) == executor.MAX_ROWS and result["row_count"] == 275
+
+
+def test_run_sql_reuses_one_read_only_connection(executor, monkeypatch):
+    conns, real = [], executor.get_connection
+    monkeypatch.setattr(executor, "get_connection", lambda path: conns.append(real(path)) or conns[-1])
+    executor._run_sql("SELECT 1")
+    executor._run_sql("SELECT 2")
+    assert conns[0] is conns[1]
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        conns[0].execute("CREATE TABLE scratch (x)")
+
+
+def test_count_over_budget_reports_no_total(executor, monkeypatch):
+    monkeypatch.setattr(executor, "COUNT_TIMEOUT", 0.0)
+    result = executor._run_sql("SELECT t.Name, g.Name FROM Track t, Genre g")
+    assert result["truncated"] and len(result["data"]) == executor.MAX_ROWS
+    assert result["row_count"] is None  # Not the 50 rows that were read
+
+    prompts = []
+    monkeypatch.setattr(executor.LLM, "chat", lambda messages: prompts.append(messages) or SimpleNamespace(text="ok"))
+    executor.explain_result("SELECT ...", result)
+    assert prompts[0][-1]["content"].endswith("ROWS: more than 50")
@@ -0,0 +1,38 @@
+# tests/test_extract.py
+import sqlite3
+import time
+
+import pytest
+
+import extract
+from conftest import CHINOOK
+
+
+def test_chunks_are_written_in_table_order(tmp_path, monkeypatch):
+    tables = list(extract.iter_tables(CHINOOK))
+    describe = extract.describe_table
+
+    def slow_first(table, *args):
+        time.sleep(0.02 * (len(tables) - tables.index(table)) / len(tables))  # Earlier tables finish last
+        return describe(table, *args)
+
+    monkeypatch.setattr(extract, "describe_table", slow_first)
+    out = tmp_path / "chunks.jsonl"
+    assert extract.extract(CHINOOK, str(out), workers=4) == (len(tables), len(tables))
+    assert [chunk["table"] for chunk in extract.load_chunks(str(out))] == tables
+
+
+def test_worker_connections_are_closed(tmp_path, monkeypatch):
+    opened = []
+
+    class Pool(extract.ConnectionPool):
+        def _open(self):
+            opened.append(super()._open())
+            return opened[-1]
+
+    monkeypatch.setattr(extract, "ConnectionPool", Pool)
+    extract.extract(CHINOOK, str(tmp_path / "chunks.jsonl"), workers=4)
+    assert opened
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
@@ -0,0 +1,103 @@
+# tests/test_llm_client.py
+import asyncio
+
+import pytest
+
+import stub_ollama
+from tools.llm_client import LLMClient, OllamaChain, ResponseCache, chat_messages
+
+MODEL = "stub"
+QUESTION = [{"role": "user", "content": "how many artists are there"}]
+
+
+@pytest.fixture(scope="module")
+def server():
+    """Stub Ollama with no simulated latency; `bodies` records every /api/chat request."""
+    server, url = stub_ollama.serve(0, prefill_ms=0, decode_ms=0, load_s=0)
+    stub, chat = server.stub, server.stub.chat
+
+    def recording_chat(body):
+        stub.bodies.append(body)
+        return chat(body)
+
+    stub.chat = recording_chat
+    stub.url = url
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def ollama(server):
+    server.bodies, server.requests = [], 0
+    server._models.clear()
+    return server
+
+
+@pytest.fixture
+def client(ollama, tmp_path):
+    return LLMClient(MODEL, host=ollama.url, cache=ResponseCache(str(tmp_path / "llm_cache.db")))
+
+
+def test_messages_put_the_question_before_the_history():
+    # system and question are fixed for a turn; history only grows at the end
+    assert chat_messages("rules", "question", "TOOL: a\nARGS: b") == [
+        {"role": "system", "content": "rules"},
+        {"role": "user", "content": "question"},
+        {"role": "assistant", "content": "TOOL: a\nARGS: b"},
+    ]
+    assert chat_messages("rules", "question") == chat_messages("rules", "question", "")[:2]
+    chain = OllamaChain(None, "rules")
+    assert chain.messages({"input": "question", "history": "h"}) == chat_messages("rules", "question", "h")
+
+
+def test_repeated_call_is_served_from_the_cache(ollama, client):
+    first = client.chat(QUESTION)
+    second = client.chat(QUESTION)
+    assert not first.cached and second.cached and second.text == first.text
+    assert ollama.requests == 1
+    assert client.cache.stats()["hits"] == 1 and client.cache.stats()["misses"] == 1
+
+
+def test_other_prompts_and_sampled_calls_miss(ollama, client):
+    client.chat(QUESTION)
+    assert not client.chat([{"role": "user", "content": "list the genres"}]).cached
+    assert not client.chat(QUESTION, temperature=0.7).cached
+    assert not client.chat(QUESTION, temperature=0.7).cached  # Not stored either
+    assert ollama.requests == 4
+
+
+def test_stream_is_cached_only_when_it_ran_to_the_end(ollama, client):
+    stream = client.stream(QUESTION)
+    next(stream)
+    stream.close()  # Stopped early
+    assert client.cache.stats()["entries"] == 0
+    done = []
+    text = "".join(client.stream(QUESTION, on_done=done.append))
+    assert text and not done[0].cached
+    assert "".join(client.stream(QUESTION)) == text
+    assert ollama.requests == 2
+
+
+def test_keep_alive_goes_with_every_request(ollama):
+    client = LLMClient(MODEL, host=ollama.url, keep_alive="10m", use_cache=False)
+    client.warm()
+    client.warm("rules")
+    client.chat(QUESTION)
+    "".join(client.stream(QUESTION))
+    assert [body["keep_alive"] for body in ollama.bodies] == ["10m"] * 4
+    assert MODEL in ollama._models  # Still resident
+
+    client.unload()
+    assert ollama.bodies[-1]["keep_alive"] == 0 and MODEL not in ollama._models
+
+
+def test_chain_streams_through_the_client(ollama, client):
+    chain = OllamaChain(client, "rules")
+
+    async def run():
+        return [chunk async for chunk in chain.astream({"input": "how many artists are there"})]
+
+    chunks = asyncio.run(run())
+    assert "".join(chunks) == client.chat(chat_messages("rules", "how many artists are there")).text
+    assert ollama.bodies[0]["messages"][0] == {"role": "system", "content": "rules"}
@@ -0,0 +1,106 @@
+# tests/test_query_cache.py
+import json
+import sqlite3
+
+import pytest
+
+from tools import query_cache
+from tools.query_cache import QueryCache, normalize_sql
+from tools.sql_tool import ConnectionPool
+
+
+class Stamp:
+    def __init__(self):
+        self.value = 0
+
+    def __call__(self):
+        return self.value
+
+
+def test_new_stamp_drops_everything():
+    stamp = Stamp()
+    cache = QueryCache(stamp_fn=stamp)
+    _, seen = cache.get("a")
+    cache.put("a", 1, seen)
+    cache.put("b", 2, seen)
+    assert cache.get("a") == (1, 0)
+    stamp.value = 1
+    assert cache.get("b") == (None, 1)
+    assert cache.get("a") == (None, 1)
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_result_computed_before_a_change_is_not_stored():
+    stamp = Stamp()
+    cache = QueryCache(stamp_fn=stamp)
+    _, seen = cache.get("a")
+    stamp.value = 1
+    cache.get("other")  # Someone notices the change while "a" is still running
+    cache.put("a", "stale", seen)
+    assert cache.get("a") == (None, 1)
+
+
+def test_ttl_and_lru(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryCache(max_entries=2, ttl=10.0)
+    for key in "abc":
+        cache.put(key, key.upper())
+    assert cache.get("a") == (None, None)  # Evicted as least recently used
+    assert cache.get("b")[0] == "B"
+    now[0] += 11
+    assert cache.get("b") == (None, None)
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["expirations"] == 1
+
+
+@pytest.mark.parametrize("a, b", [
+    ("SELECT * FROM Artist", "select  *\nfrom Artist;"),
+    ("WITH t AS (SELECT Name FROM Artist) SELECT * FROM t", "with t as (select Name from Artist) select * from t"),
+    ("SELECT * FROM Artist WHERE ArtistId = 1", "SELECT * FROM Artist WHERE ArtistId = 1 -- first"),
+    ("SELECT * FROM Artist LIMIT 10", "SELECT * FROM Artist LIMIT 0x0A"),
+])
+def test_equivalent_sql_shares_a_key(a, b):
+    assert normalize_sql(a) == normalize_sql(b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("SELECT * FROM Artist WHERE Name = 'AC/DC'", "SELECT * FROM Artist WHERE Name = 'ac/dc'"),
+    ("SELECT SUM(Total) FROM Invoice", "SELECT sum( Total ) FROM Invoice"),  # Column names differ
+    ("SELECT 5 / 2", "SELECT 5 / 2.0"),
+    # Inner select lists and CTE column lists name the outer result's columns too
+    ("WITH t AS (SELECT Name FROM Artist) SELECT * FROM t", "WITH t AS (SELECT name FROM Artist) SELECT * FROM t"),
+    ("SELECT * FROM (SELECT Name FROM Artist)", "SELECT * FROM (SELECT name FROM Artist)"),
+    ("SELECT * FROM (SELECT SUM(Total) FROM Invoice)", "SELECT * FROM (SELECT sum( Total ) FROM Invoice)"),
+    ("WITH t(Name) AS (SELECT 1) SELECT * FROM t", "WITH t(name) AS (SELECT 1) SELECT * FROM t"),
+])
+def test_different_sql_gets_different_keys(a, b):
+    assert normalize_sql(a) != normalize_sql(b)
+
+
+def test_pool_generation_follows_writes(tmp_path):
+    path = str(tmp_path / "data.db")
+    writer = sqlite3.connect(path)
+    writer.execute("CREATE TABLE t (x)")
+    writer.commit()
+    pool = ConnectionPool(path)
+    cache = QueryCache(stamp_fn=pool.generation)
+    try:
+        _, seen = cache.get("count")
+        cache.put("count", 0, seen)
+        assert cache.get("count")[0] == 0
+        writer.execute("INSERT INTO t VALUES (1)")
+        writer.commit()
+        assert cache.get("count")[0] is None
+        assert cache.stats()["invalidations"] == 1
+    finally:
+        writer.close()
+        pool.close_all()
+
+
+def test_cached_result_keeps_the_callers_column_names():
+    from tools.sql_tool import run_sql
+    upper = "WITH t AS (SELECT Name FROM Artist LIMIT 1) SELECT * FROM t"
+    lower = upper.replace("SELECT Name", "SELECT name")
+    assert json.loads(run_sql(upper, fmt="columnar"))["columns"] == ["Name"]
+    assert json.loads(run_sql(lower, fmt="columnar"))["columns"] == ["name"]
@@ -0,0 +1,94 @@
+# tests/test_result_format.py
+import json
+import sqlite3
+
+import pytest
+
+from conftest import CHINOOK
+from tools.result_format import count_total, fetch, iter_json, to_json
+from tools.sql_tool import run_sql
+
+
+@pytest.fixture(scope="module")
+def conn():
+    conn = sqlite3.connect(CHINOOK)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM Artist",
+    "SELECT * FROM Artist;",
+    "SELECT * FROM Artist -- every artist",
+    "SELECT * FROM Artist; -- every artist",
+    "SELECT * FROM Artist /* every artist */ ;;",
+    "SELECT * -- all columns\nFROM Artist",
+])
+def test_count_total_ignores_comments(conn, sql):
+    assert count_total(conn, sql) == 275
+
+
+def test_count_total_of_non_query(conn):
+    assert count_total(conn, "PRAGMA table_info(Artist)") is None
+    assert count_total(conn, "-- nothing") is None
+
+
+def test_default_format_is_row_dicts():
+    payload = json.loads(run_sql("SELECT ArtistId, Name FROM Artist ORDER BY ArtistId LIMIT 2", use_cache=False))
+    assert payload["data"][0] == {"ArtistId": 1, "Name": "AC/DC"}
+    assert payload["count"] == 2
+
+
+def test_formats_carry_the_same_rows(conn):
+    result = fetch(conn.execute("SELECT ArtistId, Name FROM Artist ORDER BY ArtistId"), max_rows=3)
+    columnar, rows = json.loads(to_json(result, "columnar")), json.loads(to_json(result, "rows"))
+    assert [dict(zip(columnar["columns"], r)) for r in columnar["rows"]] == rows["data"]
+    assert columnar["truncated"] and rows["truncated"]
+
+
+class CountingCursor:
+    """Cursor wrapper recording the largest fetchmany() batch."""
+
+    def __init__(self, cur):
+        self.cur, self.description, self.largest = cur, cur.description, 0
+
+    def fetchmany(self, size):
+        rows = self.cur.fetchmany(size)
+        self.largest = max(self.largest, len(rows))
+        return rows
+
+
+def test_iter_json_streams_in_batches(conn):
+    cur = CountingCursor(conn.execute("SELECT TrackId, Name FROM Track ORDER BY TrackId"))
+    lines = list(iter_json(cur, batch_size=100))
+    assert json.loads(lines[0]) == {"columns": ["TrackId", "Name"]}
+    assert json.loads(lines[1])[0] == 1
+    assert json.loads(lines[-1]) == {"count": 3503, "total": 3503, "truncated": False}
+    assert len(lines) == 3503 + 2 and cur.largest == 100
+
+
+@pytest.mark.parametrize("limits, count", [({"max_rows": 7}, 7), ({"max_bytes": 200}, None)])
+def test_iter_json_limits(conn, limits, count):
+    lines = list(iter_json(conn.execute("SELECT Name FROM Track"), **limits))
+    meta = json.loads(lines[-1])
+    assert meta["truncated"] and meta["total"] is None and meta["count"] == len(lines) - 2
+    if count:
+        assert meta["count"] == count
+    else:
+        assert sum(map(len, lines[1:-1])) <= 200
+
+
+def test_run_sql_jsonl_reports_total():
+    lines = run_sql("SELECT Name FROM Artist -- all", use_cache=False, fmt="jsonl", max_rows=3).splitlines()
+    assert json.loads(lines[0]) == {"columns": ["Name"]}
+    assert json.loads(lines[-1]) == {"count": 3, "total": 275, "truncated": True}
+
+
+def test_rows_format_skips_the_count(monkeypatch):
+    import tools.sql_tool as sql_tool
+    counted = []
+    monkeypatch.setattr(sql_tool, "count_total", lambda conn, sql: counted.append(sql) or 0)
+    payload = json.loads(run_sql("SELECT Name FROM Artist", use_cache=False))
+    assert payload["truncated"] and "total" not in payload and not counted
+    assert json.loads(run_sql("SELECT Name FROM Artist", use_cache=False, fmt="columnar"))["total"] == 0
+    assert len(counted) == 1
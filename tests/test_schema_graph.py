@@ -0,0 +1,35 @@
+# tests/test_schema_graph.py
+import os
+
+from conftest import ROOT
+from tools.schema_graph import GRAPH_PATH, SchemaGraph
+
+CHUNKS = [
+    {"table": "Employee", "foreign_keys": [{"table": "Employee", "from": "ReportsTo", "to": "EmployeeId"}]},
+    {"table": "Customer", "foreign_keys": [{"table": "Employee", "from": "SupportRepId", "to": "EmployeeId"}]},
+    {"table": "Invoice", "foreign_keys": [{"table": "Customer", "from": "CustomerId", "to": "CustomerId"}]},
+]
+
+
+def test_self_reference_is_one_edge():
+    graph = SchemaGraph.from_chunks(CHUNKS)
+    assert graph.edges["Employee"] == [
+        {"table": "Employee", "on": "Employee.ReportsTo = Employee.EmployeeId"},
+        {"table": "Customer", "on": "Customer.SupportRepId = Employee.EmployeeId"},
+    ]
+    assert graph.join_path("Employee", "Employee") == {"tables": ["Employee"], "joins": []}
+
+
+def test_join_path_both_directions():
+    graph = SchemaGraph.from_chunks(CHUNKS)
+    forward = graph.join_path("Employee", "Invoice")
+    assert forward["tables"] == ["Employee", "Customer", "Invoice"]
+    backward = graph.join_path("Invoice", "Employee")
+    assert backward["tables"] == forward["tables"][::-1] and backward["joins"] == forward["joins"][::-1]
+
+
+def test_saved_graph_has_no_duplicate_edges():
+    graph = SchemaGraph.load(os.path.join(ROOT, "company_rag", GRAPH_PATH))
+    for table, edges in graph.edges.items():
+        pairs = [(e["table"], e["on"]) for e in edges]
+        assert len(pairs) == len(set(pairs)), table
@@ -0,0 +1,43 @@
+# tests/test_schema_tool.py
+from types import SimpleNamespace
+
+from tools.schema_tool import SchemaRetriever
+
+DOCS = {t: f"TABLE: {t}\nCOLUMNS: {t}Id" for t in ("Invoice", "Customer", "Track", "Album")}
+
+
+class Collection:
+    """Chroma collection stand-in holding DOCS (a "Stale" table is in BM25 only)."""
+
+    def count(self):
+        return len(DOCS)
+
+    def get(self, where, include):
+        tables = [t for t in where["table"]["$in"] if t in DOCS]
+        return {"documents": [DOCS[t] for t in tables], "metadatas": [{"table": t} for t in tables]}
+
+
+def retriever():
+    # max_index_bytes=0 keeps everything in the "collection"
+    return SchemaRetriever(Collection(), SimpleNamespace(dim=1), max_index_bytes=0)
+
+
+def vector_results(tables):
+    return {"ids": [list(tables)], "documents": [[DOCS[t] for t in tables]],
+            "metadatas": [[{"table": t} for t in tables]], "distances": [[0.1 * i for i in range(len(tables))]]}
+
+
+def test_fuse_backfills_past_stale_lexical_hits():
+    lexical = [("Stale", 9.0), ("Track", 8.0), ("Album", 7.0), ("Customer", 6.0)]
+    fused = retriever()._fuse(vector_results(["Invoice"]), lexical, 3)
+    tables = [m["table"] for m in fused["metadatas"][0]]
+    assert len(tables) == 3 and "Stale" not in tables
+    assert tables[0] == "Invoice"
+    assert fused["distances"][0][0] == 0.0 and fused["distances"][0][1:] == [None, None]
+
+
+def test_fuse_keeps_vector_hits_when_lexical_agrees():
+    lexical = [("Customer", 9.0), ("Invoice", 8.0)]
+    fused = retriever()._fuse(vector_results(["Invoice", "Customer"]), lexical, 2)
+    assert sorted(m["table"] for m in fused["metadatas"][0]) == ["Customer", "Invoice"]
+    assert None not in fused["distances"][0]
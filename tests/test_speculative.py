@@ -0,0 +1,25 @@
+# tests/test_speculative.py
+import os
+import subprocess
+import sys
+
+from conftest import CHINOOK, ROOT
+from tools.speculative import SQLHistory, Speculator
+
+
+def test_page_cache_keeps_one_data_version():
+    stamp = [0]
+    spec = Speculator(lambda sql: sql, CHINOOK, history=SQLHistory(path=None), stamp_fn=lambda: stamp[0])
+    try:
+        for version in range(5):
+            stamp[0] = version
+            spec._warm(["Artist", "Album"], spec._stamp())
+            assert set(spec._pages) == {"Artist", "Album"} and spec._pages_stamp == version
+    finally:
+        spec.close()
+
+
+def test_library_does_not_import_the_extract_script():
+    code = "import sys, tools.speculative; sys.exit('extract' in sys.modules)"
+    done = subprocess.run([sys.executable, "-c", code], cwd=os.path.join(ROOT, "company_rag"))
+    assert done.returncode == 0
@@ -0,0 +1,85 @@
+# tests/test_sql_guard.py
+import sqlite3
+
+import pytest
+
+from conftest import CHINOOK
+from tools.sql_guard import SQLRejected, apply_limit, budget, check_read_only, preflight
+from tools.sql_tool import run_sql
+
+
+@pytest.fixture(scope="module")
+def conn():
+    conn = sqlite3.connect(f"file:{CHINOOK}?mode=ro", uri=True)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("sql, reason", [
+    ("", "empty statement"),
+    (" ; ;", "empty statement"),
+    ("DELETE FROM Invoice", "only SELECT"),
+    ("UPDATE Track SET Name = 'x'", "only SELECT"),
+    ("DROP TABLE Artist", "only SELECT"),
+    ("ATTACH DATABASE 'x.db' AS x", "only SELECT"),
+    ("SELECT 1; DELETE FROM Invoice", "one statement"),
+    ("SELECT 1; SELECT 2", "one statement"),
+    ("WITH gone AS (DELETE FROM Invoice RETURNING *) SELECT * FROM gone", "DELETE"),
+    ("SELECT * FROM Artist /* ; */ ; INSERT INTO Artist VALUES (0, 'x')", "one statement"),
+    ("PRAGMA journal_mode", "PRAGMA journal_mode"),
+    ("PRAGMA table_info = 1", "PRAGMA table_info"),
+    ("PRAGMA writable_schema", "PRAGMA writable_schema"),
+])
+def test_rejects_non_read_statements(sql, reason):
+    with pytest.raises(SQLRejected, match=reason):
+        check_read_only(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT replace(Name, 'a', 'b') FROM Artist",  # A function, not REPLACE INTO
+    "select 1;;",
+    "WITH t AS (SELECT 1 AS x) SELECT x FROM t",
+    "VALUES (1), (2)",
+    "PRAGMA table_info(Invoice)",
+    "PRAGMA foreign_key_list('Track')",
+    "SELECT 'DELETE FROM Invoice' AS text",  # Keywords inside strings are data
+])
+def test_accepts_read_statements(sql):
+    assert check_read_only(sql)
+
+
+def test_rejects_nested_full_scans(conn):
+    with pytest.raises(SQLRejected, match="nests full scans"):
+        preflight(conn, "SELECT COUNT(*) FROM InvoiceLine, Track")
+    # The same tables joined on a key are fine
+    check = preflight(conn, "SELECT COUNT(*) FROM InvoiceLine il JOIN Track t ON t.TrackId = il.TrackId")
+    assert check.estimated_rows is not None
+
+
+@pytest.mark.parametrize("sql, expected, limit", [
+    ("SELECT * FROM Artist", "SELECT * FROM Artist\nLIMIT 21", 21),
+    ("SELECT * FROM Artist -- all of them;", "SELECT * FROM Artist\nLIMIT 21", 21),
+    ("SELECT * FROM Artist LIMIT 500", "SELECT * FROM Artist LIMIT 21", 21),
+    ("SELECT * FROM Artist LIMIT 5", "SELECT * FROM Artist LIMIT 5", 5),
+    ("SELECT * FROM Artist LIMIT 100 OFFSET 10", "SELECT * FROM Artist LIMIT 21 OFFSET 10", 21),
+    ("SELECT * FROM Artist LIMIT 10, 100", "SELECT * FROM Artist LIMIT 10, 21", 21),
+    ("SELECT * FROM (SELECT * FROM Artist LIMIT 100)", "SELECT * FROM (SELECT * FROM Artist LIMIT 100)\nLIMIT 21", 21),
+])
+def test_apply_limit(sql, expected, limit):
+    assert apply_limit(sql, check_read_only(sql), 21) == (expected, limit)
+
+
+def test_budget_stops_runaway_queries(conn):
+    runaway = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+    with pytest.raises(SQLRejected, match="instruction budget"):
+        with budget(conn, max_instructions=100_000, steps=1_000):
+            conn.execute(runaway).fetchone()
+    with pytest.raises(SQLRejected, match="time budget"):
+        with budget(conn, timeout=0.05):
+            conn.execute(runaway).fetchone()
+    assert conn.execute("SELECT 1").fetchone() == (1,)  # Handler removed afterwards
+
+
+def test_run_sql_reports_rejections():
+    assert run_sql("DELETE FROM Invoice", use_cache=False).startswith("SQL ERROR: rejected: ")
+    assert run_sql("SELECT 1; SELECT 2", use_cache=False).startswith("SQL ERROR: rejected: ")
@@ -0,0 +1,107 @@
+# tests/test_sql_templates.py
+import re
+import sqlite3
+
+import pytest
+
+from conftest import CHINOOK
+from tools.sql_templates import TEMPLATES, TemplateMatcher
+
+EXAMPLES = [(t.name, e) for t in TEMPLATES for e in t.examples]
+# Close to a template's shape, but asking something it does not compute
+NEAR_MISSES = [
+    "top genre by number of tracks",
+    "lowest selling genre",
+    "average invoice total",
+    "sales by month",
+    "sales in Narnia",
+    "which customers bought the most jazz",
+    "compare sales in 2012 versus 2013",
+    # Two values for one slot: a single-value filter would answer only the first
+    "total sales in France and Germany",
+    "top rock and jazz tracks",
+    "what were sales in Canada and the USA in 2011?",
+    "top customers in Brazil and Canada",
+    "sales in 2011 and 2012",
+]
+
+
+@pytest.fixture(scope="module")
+def chatbot():
+    import rag_chatbot
+    conn = sqlite3.connect(CHINOOK)
+    rag_chatbot._matcher = TemplateMatcher(conn)  # Lexical only, whatever is installed
+    conn.close()
+    return rag_chatbot
+
+
+@pytest.mark.parametrize("name, question", EXAMPLES)
+def test_examples_match_their_template(chatbot, name, question):
+    match = chatbot.get_matcher().match(question)
+    assert match is not None and match.name == name
+
+
+@pytest.mark.parametrize("name, question", EXAMPLES)
+def test_examples_answer_without_the_llm(chatbot, name, question):
+    answer = chatbot.rag_answer(question)
+    assert not answer.startswith(("LLM unavailable", "Sorry")), answer
+    if not re.search(r"\b\d{4}\b", question):
+        assert "No matching data" not in answer  # Dated examples may predate the data
+
+
+@pytest.mark.parametrize("question", NEAR_MISSES)
+def test_near_misses_fall_back_to_the_llm(chatbot, question):
+    assert chatbot.get_matcher().match(question) is None
+
+
+@pytest.mark.parametrize("question, year", [("sales by country", None), ("sales in 2024 per country", "2024")])
+def test_by_entity_is_a_full_breakdown(chatbot, question, year):
+    conn = sqlite3.connect(CHINOOK)
+    where = f"WHERE strftime('%Y', InvoiceDate) = '{year}'" if year else ""
+    countries = conn.execute(f"SELECT COUNT(DISTINCT BillingCountry) FROM Invoice {where}").fetchone()[0]
+    conn.close()
+    match = chatbot.get_matcher().match(question)
+    assert match.name == "sales_by_country" and match.breakdown
+    lines = chatbot.rag_answer(question).splitlines()
+    assert lines[0].startswith("Countries by sales")
+    assert len(lines) == 1 + countries
+
+
+@pytest.mark.parametrize("question, n", [("Top genre", 1), ("Which country brings in the most revenue?", 1),
+                                         ("best selling countries in 2012", 5), ("Top 10 tracks", 10)])
+def test_top_n(chatbot, question, n):
+    assert chatbot.get_matcher().match(question).params["n"] == n
+
+
+def test_empty_rollups_fall_through_to_sql(chatbot, tmp_path, monkeypatch):
+    from aggregates import AggregateStore
+    empty = tmp_path / "empty.db"
+    src, dst = sqlite3.connect(CHINOOK), sqlite3.connect(empty)
+    for (sql,) in src.execute("SELECT sql FROM sqlite_master WHERE type = 'table'"):
+        dst.execute(sql)
+    dst.commit()
+    src.close()
+    dst.close()
+    store = AggregateStore(str(empty), str(tmp_path / "store.db"))
+    monkeypatch.setattr(chatbot, "STORE", store)
+    try:
+        assert chatbot.rag_answer("Top genre").startswith("Top genre by revenue: ")  # Template SQL's wording
+        assert chatbot.rag_answer("Top customer").startswith("Top customer by spend: ")
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("question, slots", [
+    ("total sales in France and Germany", {"country": ("France", "Germany")}),
+    ("sales in the UK and United Kingdom", {"country": "United Kingdom"}),  # Same value twice
+    ("top rock and jazz tracks in 2012", {"genre": ("Rock", "Jazz"), "year": "2012"}),
+])
+def test_extract_keeps_every_value(chatbot, question, slots):
+    assert chatbot.get_matcher().extract(question)[0] == slots
+
+
+def test_example_slot_values_explain_nothing(chatbot):
+    matcher = chatbot.get_matcher()
+    values = {w for vocab in matcher.vocab.values() for w in vocab if w.isalpha()}
+    for template, words in zip(matcher.templates, matcher._words):
+        assert not words & values, template.name